@@ -1,4 +1,4 @@
-from treq.api import delete, get, head, patch, post, put, request
+from treq.api import delete, download, get, head, patch, post, put, request
 from treq.content import collect, content, json_content, text_content
 
 from ._version import __version__ as _version
@@ -13,6 +13,7 @@ __all__ = [
     "patch",
     "delete",
     "request",
+    "download",
     "collect",
     "content",
     "text_content",
@@ -1,8 +1,10 @@
 # Copyright (c) The treq Authors.
 # See LICENSE for details.
 import io
+import mmap
 from http.cookiejar import CookieJar
-from typing import Any, Dict, Iterable, List, Mapping, Tuple, Union
+from typing import (Any, AsyncGenerator, Dict, Generator, Iterable, List,
+                    Mapping, Tuple, Union)
 
 from hyperlink import DecodedURL, EncodedURL
 from twisted.internet.interfaces import (IReactorPluggableNameResolver,
@@ -54,6 +56,11 @@ _CookiesType = Union[
 
 _WholeBody = Union[
     bytes,
+    bytearray,
+    memoryview,
+    mmap.mmap,
+    Generator[bytes, None, None],
+    AsyncGenerator[bytes, None],
     io.BytesIO,
     io.BufferedReader,
     IBodyProducer,
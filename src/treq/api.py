@@ -59,6 +59,69 @@ def delete(url, **kwargs):
     return _client(kwargs).delete(url, _stacklevel=4, **kwargs)
 
 
+def download(url, path, **kwargs):
+    """
+    Make a ``GET`` request and save the response body to a file.
+
+    The body is written by a thread from the reactor's thread pool, so slow
+    storage doesn't block the reactor. Data waiting to be written is held in
+    memory, up to *max_queued* bytes, after which the connection is paused
+    until the writer catches up.
+
+    The body is written to a temporary file in the same directory as *path*,
+    which is renamed to *path* once the entire body has been received, so
+    *path* is never left partially written. If the request fails the
+    temporary file is removed.
+
+    :param url: The URL to download, as for :func:`treq.request()`.
+
+    :param path: Where to save the body.
+    :type path: `str` or :class:`os.PathLike`
+
+    :param bool fsync: Pass ``True`` to flush the file and the rename to disk
+        before the returned `Deferred` fires. Default: ``False``
+
+    :param int max_queued: The number of bytes which may wait to be written
+        before the transport is paused. Default: 1 MiB
+
+    :param threadpool: The :class:`~twisted.python.threadpool.ThreadPool` to
+        write from. Default: the reactor's thread pool.
+
+    :param int segments: The number of connections over which to download
+        the file in parallel, as byte ranges. The first request asks for
+        a range; if the server doesn't respond with one the body is streamed
+        over that single connection. Later ranges are conditional on the
+        entity tag or modification date of the first, so that pieces of
+        different versions of the file aren't combined. A segmented download
+        can't be combined with *digests*. Default: 1
+
+    :param int segment_size: The size of each range of a segmented
+        download. Once all ranges have been requested, a connection which
+        becomes idle takes over half of the range with the most left to
+        receive. Default: 8 MiB
+
+    :param int retries: How many times to request the file again after
+        a connection fails. Where the first response has an entity tag or
+        modification date, the retry asks for the rest of the file with
+        a Range and If-Range header, and the bytes already written are
+        kept. Each range of a segmented download is retried the same way.
+        Default: 0
+
+    :param float retry_delay: The number of seconds to wait before the
+        first retry. The delay doubles for each retry after that.
+        Default: 1.0
+
+    :param kwargs: Any other arguments accepted by :func:`treq.request()`,
+        except *unbuffered*, which is implied.
+
+    :rtype: Deferred that fires with the response once the file has been
+        saved, which for a segmented download is the response to the first
+        range request. It fails with :class:`twisted.web.error.Error` if the response
+        status isn't 2xx, in which case nothing is written.
+    """
+    return _client(kwargs).download(url, path, _stacklevel=4, **kwargs)
+
+
 def request(method, url, **kwargs):
     """
     Make an HTTP request.
@@ -92,9 +155,17 @@ def request(method, url, **kwargs):
 
         Otherwise, any non-``None`` value is passed to the client's
         *data_to_body_producer* callable (by default, :class:`IBodyProducer`),
-        which accepts :class:`bytes` and binary files like returned by
-        ``open(..., "rb")``.
-    :type data: `bytes`, `typing.BinaryIO`, `IBodyProducer`, or `None`
+        which accepts :class:`bytes`, buffers like :class:`bytearray`,
+        :class:`memoryview`, and :class:`mmap.mmap` (see
+        :class:`treq.producers.BufferProducer`), binary files like returned
+        by ``open(..., "rb")`` (or wrapped in
+        :class:`treq.producers.FileProducer` to be written from a memory map),
+        and generators and async generators of
+        :class:`bytes` (see :class:`treq.producers.IterableProducer` and
+        :class:`treq.producers.AsyncIterableProducer`), which are sent with
+        chunked transfer encoding.
+    :type data: `bytes`, buffer, `typing.BinaryIO`, generator, `IBodyProducer`,
+        or `None`
 
     :param files:
         Files to include in the request body, in any of the several formats:
@@ -123,8 +194,11 @@ def request(method, url, **kwargs):
         argument.
 
     :param json: Optional JSON-serializable content for the request body.
-        Mutually exclusive with *data* and *files*.
-    :type json: `dict`, `list`, `tuple`, `int`, `str`, `bool`, or `None`
+        Mutually exclusive with *data* and *files*. To encode a large body
+        incrementally, pass a :class:`treq.producers.JSONProducer`, or an
+        iterator (like a generator of records) to encode as an array.
+    :type json: `dict`, `list`, `tuple`, `int`, `str`, `bool`, `None`,
+        iterator, or `treq.producers.JSONProducer`
 
     :param auth: HTTP Basic Authentication information --- see
         :func:`treq.auth.add_auth`.
@@ -140,6 +214,12 @@ def request(method, url, **kwargs):
 
     :param bool allow_redirects: Follow HTTP redirects.  Default: ``True``
 
+        A 307 or 308 redirect of a request with a method other than GET or
+        HEAD is followed with the same body when it can be sent again: when
+        it is :class:`bytes`, a buffer, form data, a JSON value, or
+        a :class:`treq.producers.ReplayableProducer`, which can rewind or
+        spool files and other producers.
+
     :param bool browser_like_redirects: Follow redirects like a web browser:
         When a 301 or 302 redirect is received in response to a POST request
         convert the method to GET.
@@ -149,6 +229,53 @@ def request(method, url, **kwargs):
     :param bool unbuffered: Pass ``True`` to to disable response buffering.  By
         default treq buffers the entire response body in memory.
 
+        The body of an unbuffered response must be read, or discarded with
+        :meth:`~treq.response._Response.abort()`, for its connection to be
+        released. One that is garbage collected unread, or isn't read within
+        the client's *unconsumed_timeout*, is discarded like ``abort()``
+        does and a warning naming the call site of the request is logged.
+        Responses without a body (to a ``HEAD`` request, with status 204 or
+        304, or with a Content-Length of 0) need not be read.
+
+    :param digests: Names of hash algorithms, like ``"sha256"``, ``"md5"``,
+        or ``"crc32c"``, to compute over the response body as it is received.
+        Any :mod:`hashlib` algorithm may be used; ``"crc32c"`` requires the
+        `crc32c <https://pypi.org/project/crc32c/>`_ package. The results are
+        available from :meth:`~treq.response._Response.digests()`.
+
+        When digests are requested the body is also verified against any
+        Content-Digest (:rfc:`9530`) or Digest response headers, and reading
+        it fails with :exc:`~treq.digest.DigestMismatch` if they don't match.
+        Pass an empty list to only verify the headers.
+    :type digests: iterable of `str` or `None`
+
+    :param compress: A content coding, ``"gzip"``, ``"deflate"``, or
+        ``"zstd"``, with which to compress the request body as it is sent,
+        setting the Content-Encoding header. The compressed body is sent with
+        chunked transfer encoding. To compress in a thread pool, pass a
+        :class:`treq.producers.CompressingProducer` as *data* instead, without
+        *compress*.
+    :type compress: `str` or `None`
+
+    :param expect_continue: A body size in bytes. A request whose body is
+        at least this long, or of unknown length, is sent with an
+        ``Expect: 100-continue`` header, and its body held back for a second
+        (see :class:`treq.producers.ContinueProducer`) so that the server
+        may reject it, for instance with 413 (Content Too Large) or 401
+        (Unauthorized), before it is sent. If the response arrives first
+        the body isn't sent at all.
+
+        .. warning::
+
+            Twisted's HTTP client discards the server's 100 (Continue)
+            response, so the body can't be sent as soon as the server
+            accepts the request. *Every* such upload is delayed by the
+            full second, so this is only worthwhile for bodies large enough
+            (or connections slow enough) that a second is small next to the
+            time taken to send them. To wait for a different time, pass
+            a :class:`treq.producers.ContinueProducer` as *data* instead.
+    :type expect_continue: `int` or `None`
+
     :param reactor: Optional Twisted reactor.
 
     :param bool persistent: Use persistent HTTP connections.  Default: ``True``
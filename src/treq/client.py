@@ -1,32 +1,50 @@
+import array
 import io
 import mimetypes
+import mmap
+import sys
+import types
 import uuid
+import weakref
 from collections import abc
 from http.cookiejar import Cookie, CookieJar
-from json import dumps as json_dumps
 from typing import (Any, Callable, Iterable, Iterator, List, Mapping,
-                    Optional, Tuple, Union)
-from urllib.parse import quote_plus
+                    Optional, Set, Tuple, Union)
+from urllib.parse import quote_plus, urljoin
 from urllib.parse import urlencode as _urlencode
 
 from hyperlink import DecodedURL, EncodedURL
 from requests.cookies import merge_cookies
 from twisted.internet.defer import Deferred
 from twisted.internet.interfaces import IProtocol
+from twisted.logger import Logger
 from twisted.python.components import proxyForInterface, registerAdapter
+from twisted.python.failure import Failure
 from twisted.python.filepath import FilePath
+from twisted.python.threadpool import ThreadPool
+from twisted.web import http
 from twisted.web.client import (BrowserLikeRedirectAgent, ContentDecoderAgent,
                                 CookieAgent, FileBodyProducer, GzipDecoder,
-                                IAgent, RedirectAgent)
+                                IAgent, RedirectAgent, ResponseFailed, URI)
+from twisted.web.error import (InfiniteRedirection, PageRedirect,
+                               RedirectWithNoLocation)
 from twisted.web.http_headers import Headers
-from twisted.web.iweb import IBodyProducer, IResponse
+from twisted.web.iweb import UNKNOWN_LENGTH, IBodyProducer, IResponse
+from zope.interface import implementer
 
 from treq import multipart
 from treq._types import (_CookiesType, _DataType, _FilesType, _FileValue,
                          _HeadersType, _ITreqReactor, _JSONType, _ParamsType,
                          _URLType)
 from treq.auth import add_auth
-from treq.response import _Response
+from treq.codec import CodecRegistry, JSONCodec
+from treq.digest import _digesting
+from treq.download import _download, _PathType
+from treq.producers import (AsyncIterableProducer, BufferProducer,
+                            BytesProducer, CompressingProducer,
+                            ContinueProducer, IterableProducer,
+                            JSONProducer, ReplayableProducer)
+from treq.response import _Discard, _Response
 
 
 class _Nothing:
@@ -35,6 +53,8 @@ class _Nothing:
 
 _NOTHING = _Nothing()
 
+_json_codec = JSONCodec()
+
 
 def urlencode(query: _ParamsType, doseq: bool) -> bytes:
     s = _urlencode(query, doseq)
@@ -91,29 +111,259 @@ def _scoped_cookiejar_from_dict(
     return cookie_jar
 
 
+class BufferBudget:
+    """
+    A limit on the number of bytes held by buffered response bodies.
+
+    A single :class:`BufferBudget` may be shared by any number of
+    :class:`HTTPClient` instances to bound the memory used for response
+    buffering across all of them (or the whole process). While the budget is
+    exhausted, buffered responses which are still receiving their bodies pause
+    their transports, so the buffers stop growing until memory is released.
+    One body is always left to make progress, so a body larger than the
+    limit is still received in full. A body paused by the protocol reading
+    it, as :meth:`treq.response._Response.peek` does, isn't making progress,
+    and is never resumed for the budget.
+
+    Memory is released when a buffered response has received its entire
+    body, as it then belongs to the caller, or failing that when the
+    response is garbage collected.
+
+    :ivar limit: The maximum number of bytes to buffer before applying
+        backpressure.
+
+    :ivar used: The number of bytes currently held in response buffers.
+    """
+
+    def __init__(self, limit: int) -> None:
+        if limit <= 0:
+            raise ValueError("limit must be positive, not {!r}".format(limit))
+        self.limit = limit
+        self.used = 0
+        self._receiving = 0
+        self._paused: List["_BodyBufferingProtocol"] = []
+        self._held: Set["_BodyBufferingProtocol"] = set()
+
+    def __repr__(self) -> str:
+        return "<{} used={:,d} limit={:,d} paused={:d}>".format(
+            type(self).__name__, self.used, self.limit, self.paused
+        )
+
+    @property
+    def paused(self) -> int:
+        """
+        The number of responses whose transports are currently paused
+        waiting for buffer space.
+        """
+        return len(self._paused)
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        `True` when the bytes buffered have reached the limit.
+        """
+        return self.used >= self.limit
+
+    def _charge(self, size: int) -> None:
+        self.used += size
+
+    def _release(self, size: int) -> None:
+        self.used -= size
+        while self._paused and not self.exhausted:
+            self._paused.pop(0)._resume()
+
+    def _shouldPause(self) -> bool:
+        """
+        Should a body which is receiving data pause? Not unless another body
+        is still receiving, or the budget could be exhausted with nothing
+        left to release it. Bodies paused by the budget or by the protocols
+        reading them aren't receiving.
+        """
+        return (
+            self.exhausted
+            and self._receiving - len(self._paused) - len(self._held) > 1
+        )
+
+    def _progress(self) -> None:
+        """
+        Resume a body paused by the budget if no other body is receiving.
+        """
+        if self._paused and len(self._paused) + len(self._held) == self._receiving:
+            self._paused.pop(0)._resume()
+
+    def _start(self) -> None:
+        self._receiving += 1
+
+    def _finish(self, protocol: "_BodyBufferingProtocol") -> None:
+        self._receiving -= 1
+        self._cancelWait(protocol)
+        self._held.discard(protocol)
+        self._progress()
+
+    def _wait(self, protocol: "_BodyBufferingProtocol") -> None:
+        self._paused.append(protocol)
+
+    def _cancelWait(self, protocol: "_BodyBufferingProtocol") -> None:
+        if protocol in self._paused:
+            self._paused.remove(protocol)
+
+    def _hold(self, protocol: "_BodyBufferingProtocol") -> None:
+        """
+        Stop counting a body paused by the protocol reading it as receiving.
+        """
+        self._cancelWait(protocol)
+        self._held.add(protocol)
+        self._progress()
+
+    def _unhold(self, protocol: "_BodyBufferingProtocol") -> None:
+        self._held.discard(protocol)
+
+
+class _BudgetLease:
+    """
+    The share of a `BufferBudget` held by a single buffered response.
+
+    It is released once the body has been received. This is kept separate
+    from `_BufferedResponse` so that it can also be released by
+    a `weakref.finalize` callback without keeping the response alive, should
+    the body never complete.
+    """
+
+    def __init__(self, budget: BufferBudget, reactor: Any = None) -> None:
+        self.budget = budget
+        self.held = 0
+        self._reactor = reactor
+
+    def charge(self, size: int) -> None:
+        self.held += size
+        self.budget._charge(size)
+
+    def release(self) -> None:
+        held, self.held = self.held, 0
+        self.budget._release(held)
+
+    def collected(self) -> None:
+        # Garbage collection may happen in any thread, but the transports
+        # resumed on release must only be touched from the reactor thread.
+        callFromThread = getattr(self._reactor, "callFromThread", None)
+        if callFromThread is None:
+            self.release()
+        else:
+            callFromThread(self.release)
+
+
+class _ConsumerPauses:
+    """
+    The transport given to the protocol reading a body charged to
+    a `BufferBudget`, so that its pauses are combined with those for the
+    budget.
+    """
+
+    def __init__(self, buffering):
+        self._buffering = buffering
+
+    def pauseProducing(self):
+        self._buffering._consumerPause(True)
+
+    def resumeProducing(self):
+        self._buffering._consumerPause(False)
+
+    def stopProducing(self):
+        self._buffering.transport.stopProducing()
+
+
 class _BodyBufferingProtocol(proxyForInterface(IProtocol)):  # type: ignore
-    def __init__(self, original, buffer, finished):
+    """
+    :ivar _paused: Is the body paused waiting for the budget?
+    :ivar _consumerPaused: Is the body paused by the protocol reading it?
+    :ivar _transportPaused: Is the transport paused, for either reason?
+    """
+
+    def __init__(self, original, buffer, finished, lease=None):
         self.original = original
         self.buffer = buffer
         self.finished = finished
+        self.lease = lease
+        self.transport = None
+        self._paused = False
+        self._consumerPaused = False
+        self._transportPaused = False
+        if lease is not None:
+            lease.budget._start()
+
+    def makeConnection(self, transport):
+        self.transport = transport
+        if self.lease is not None:
+            transport = _ConsumerPauses(self)
+        self.original.makeConnection(transport)
 
     def dataReceived(self, data: bytes) -> None:
         self.buffer.append(data)
+        if self.lease is not None:
+            self.lease.charge(len(data))
+            if (
+                not self._paused
+                and not self._consumerPaused
+                and self.lease.budget._shouldPause()
+            ):
+                self._pause()
         self.original.dataReceived(data)
 
+    def _update(self):
+        pause = self._paused or self._consumerPaused
+        if pause and not self._transportPaused:
+            self._transportPaused = True
+            self.transport.pauseProducing()
+        elif not pause and self._transportPaused:
+            self._transportPaused = False
+            self.transport.resumeProducing()
+
+    def _pause(self):
+        if self.transport is None:
+            return
+        self._paused = True
+        self.lease.budget._wait(self)
+        self._update()
+
+    def _resume(self):
+        self._paused = False
+        self._update()
+
+    def _consumerPause(self, paused):
+        budget = self.lease.budget
+        self._consumerPaused = paused
+        if paused:
+            # A body waiting for the budget is now waiting for its reader
+            # instead, which the budget mustn't override.
+            self._paused = False
+            budget._hold(self)
+        else:
+            budget._unhold(self)
+            if not self._paused and budget._shouldPause():
+                self._paused = True
+                budget._wait(self)
+        self._update()
+
     def connectionLost(self, reason: Exception) -> None:
+        if self.lease is not None:
+            self.lease.release()
+            self.lease.budget._finish(self)
         self.original.connectionLost(reason)
         self.finished.errback(reason)
 
 
 class _BufferedResponse(proxyForInterface(IResponse)):  # type: ignore
-    def __init__(self, original):
+    def __init__(self, original, budget=None, reactor=None):
         self.original = original
         self._buffer = []
         self._waiters = []
         self._waiting = None
         self._finished = False
         self._reason = None
+        self._lease = None
+        if budget is not None:
+            self._lease = _BudgetLease(budget, reactor)
+            weakref.finalize(self, self._lease.collected)
 
     def _deliverWaiting(self, reason):
         self._reason = reason
@@ -123,12 +373,22 @@ class _BufferedResponse(proxyForInterface(IResponse)):  # type: ignore
                 waiter.dataReceived(segment)
             waiter.connectionLost(reason)
 
+    def _compact(self, body):
+        """
+        Replace the buffered segments with the complete body, once it has
+        been assembled by :func:`treq.content.content()`.
+        """
+        if len(self._buffer) > 1:
+            self._buffer[:] = [body]
+
     def deliverBody(self, protocol):
         if self._waiting is None and not self._finished:
             self._waiting = Deferred()
             self._waiting.addBoth(self._deliverWaiting)
             self.original.deliverBody(
-                _BodyBufferingProtocol(protocol, self._buffer, self._waiting)
+                _BodyBufferingProtocol(
+                    protocol, self._buffer, self._waiting, self._lease
+                )
             )
         elif self._finished:
             for segment in self._buffer:
@@ -138,18 +398,259 @@ class _BufferedResponse(proxyForInterface(IResponse)):  # type: ignore
             self._waiters.append(protocol)
 
 
+class _Unconsumed:
+    """
+    Release the connection of an unbuffered response whose body is never
+    read, once it is garbage collected or its deadline passes.
+
+    The body is drained if it is short, so that a persistent connection can
+    return to its pool, and the connection is closed otherwise.
+
+    This is kept separate from `_UnconsumedResponse` so that it can be
+    triggered by a `weakref.finalize` callback without keeping the response
+    alive.
+
+    :ivar response: The response, until its body is read or released.
+    """
+
+    _log = Logger()
+
+    def __init__(self, response, reactor, site, timeout):
+        self.response = response
+        self._reactor = reactor
+        self._site = site
+        self._delayedCall = None
+        if timeout is not None:
+            self._delayedCall = reactor.callLater(
+                timeout,
+                self.release,
+                "was not read within {} seconds".format(timeout),
+            )
+
+    def consumed(self):
+        self.response = None
+        if self._delayedCall is not None and self._delayedCall.active():
+            self._delayedCall.cancel()
+
+    def collected(self):
+        why = "was garbage collected without being read"
+        # Garbage collection may happen in any thread, but fake reactors
+        # like Clock can't be called from other threads anyway.
+        callFromThread = getattr(self._reactor, "callFromThread", None)
+        if callFromThread is None:
+            self.release(why)
+        else:
+            callFromThread(self.release, why)
+
+    def release(self, why):
+        if self.response is None:
+            return
+        response = self.response
+        self.consumed()
+        self._log.warn(
+            "Unbuffered response to request made at {site} {why};"
+            " discarding its body",
+            site=self._site,
+            why=why,
+        )
+        response.deliverBody(_Discard(response.length, 64 * 1024, Deferred()))
+
+
+class _UnconsumedResponse(proxyForInterface(IResponse)):  # type: ignore
+    def __init__(self, original, unconsumed):
+        self.original = original
+        self._unconsumed = unconsumed
+
+    def deliverBody(self, protocol):
+        self._unconsumed.consumed()
+        self.original.deliverBody(protocol)
+
+
+@implementer(IAgent)
+class _RequestBodyAgent:
+    """
+    Send each request with its body: the first as it is given, and any
+    repeated by a redirect agent with the body made again.
+
+    A body sent with ``Expect: 100-continue`` isn't sent once the response
+    has arrived, as Twisted doesn't stop it.
+    """
+
+    def __init__(
+        self, agent: IAgent, replay: Callable[[], Optional[IBodyProducer]]
+    ) -> None:
+        self._agent = agent
+        self._replay = replay
+        self._sent = False
+
+    def request(self, method, uri, headers=None, bodyProducer=None):
+        # A redirect agent only repeats a request with a method other than
+        # GET or HEAD, without its body, for a 307 or 308 response.
+        if self._sent and bodyProducer is None and method not in (b"GET", b"HEAD"):
+            bodyProducer = self._replay()
+        self._sent = True
+        d = self._agent.request(method, uri, headers, bodyProducer)
+        if isinstance(bodyProducer, ContinueProducer):
+            cancel = bodyProducer.cancel
+
+            def responded(result):
+                cancel()
+                return result
+
+            d.addBoth(responded)
+        return d
+
+
+# Headers which aren't sent when a request is redirected to another origin,
+# as by Twisted's redirect agents.
+_SENSITIVE_HEADERS = frozenset(
+    [
+        b"authorization",
+        b"cookie",
+        b"cookie2",
+        b"proxy-authorization",
+        b"www-authenticate",
+    ]
+)
+
+
+@implementer(IAgent)
+class _ReplayingRedirectAgent:
+    """
+    Follow 307 and 308 redirects of requests with methods other than GET
+    and HEAD, which Twisted's redirect agents refuse with
+    :class:`~twisted.web.error.PageRedirect`, when the request body can be
+    sent again.
+
+    The request is repeated through the wrapped redirect agent, so that it
+    follows any other redirects as usual. As that agent does, headers with
+    credentials aren't sent to another origin.
+    """
+
+    def __init__(
+        self,
+        agent: IAgent,
+        replayable: Callable[[], bool],
+        redirectLimit: int = 20,
+    ) -> None:
+        self._agent = agent
+        self._replayable = replayable
+        self._redirectLimit = redirectLimit
+
+    def request(self, method, uri, headers=None, bodyProducer=None):
+        return self._request(method, uri, headers, bodyProducer, 0)
+
+    def _request(self, method, uri, headers, bodyProducer, redirectCount):
+        d = self._agent.request(method, uri, headers, bodyProducer)
+
+        def refused(reason):
+            reason.trap(ResponseFailed)
+            response = reason.value.response
+            if not (
+                response is not None
+                and response.code
+                in (http.TEMPORARY_REDIRECT, http.PERMANENT_REDIRECT)
+                and any(r.check(PageRedirect) for r in reason.value.reasons)
+                and self._replayable()
+            ):
+                return reason
+            if redirectCount >= self._redirectLimit:
+                err = InfiniteRedirection(
+                    response.code, b"Infinite redirection detected", location=uri
+                )
+                raise ResponseFailed([Failure(err)], response)
+            locations = response.headers.getRawHeaders(b"location")
+            if not locations:
+                err = RedirectWithNoLocation(
+                    response.code, b"No location header field", uri
+                )
+                raise ResponseFailed([Failure(err)], response)
+            location = urljoin(uri, locations[0])
+            redirected = headers
+            if headers is not None and not _same_origin(uri, location):
+                redirected = Headers(
+                    {
+                        name: values
+                        for name, values in headers.getAllRawHeaders()
+                        if name.lower() not in _SENSITIVE_HEADERS
+                    }
+                )
+
+            def chain(newResponse):
+                newResponse.setPreviousResponse(response)
+                return newResponse
+
+            # The body is made again by _RequestBodyAgent.
+            return self._request(
+                method, location, redirected, None, redirectCount + 1
+            ).addCallback(chain)
+
+        return d.addErrback(refused)
+
+
+def _same_origin(uri: bytes, location: bytes) -> bool:
+    parsedURI = URI.fromBytes(uri)
+    parsedLocation = URI.fromBytes(location)
+    return (parsedURI.scheme, parsedURI.host, parsedURI.port) == (
+        parsedLocation.scheme,
+        parsedLocation.host,
+        parsedLocation.port,
+    )
+
+
+def _replayable(
+    data: Optional[_DataType],
+    files: Optional[_FilesType],
+    json: Union[_JSONType, _Nothing],
+) -> bool:
+    """
+    Can the body made from the *data*, *files*, and *json* arguments of a
+    request be made again to repeat it?
+    """
+    if files:
+        return False
+    if json is not _NOTHING:
+        return not isinstance(json, (abc.Iterator, JSONProducer))
+    replaying: object = data
+    if isinstance(replaying, ReplayableProducer):
+        return replaying.replayable
+    return data is None or isinstance(
+        data, (bytes, bytearray, memoryview, mmap.mmap, array.array, dict, list, tuple)
+    )
+
+
+def _call_site(stacklevel: int) -> str:
+    """
+    Describe the code that called a function, like `warnings.warn()` does
+    for the same *stacklevel*.
+    """
+    try:
+        frame = sys._getframe(stacklevel)
+    except ValueError:
+        return "<unknown>"
+    return "{}:{} in {}".format(
+        frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name
+    )
+
+
 class HTTPClient:
     def __init__(
         self,
         agent: IAgent,
         cookiejar: Optional[CookieJar] = None,
         data_to_body_producer: Callable[[Any], IBodyProducer] = IBodyProducer,
+        buffer_budget: Optional[BufferBudget] = None,
+        codecs: Optional[CodecRegistry] = None,
+        unconsumed_timeout: Optional[float] = None,
     ) -> None:
         self._agent = agent
         if cookiejar is None:
             cookiejar = CookieJar()
         self._cookiejar = cookiejar
         self._data_to_body_producer = data_to_body_producer
+        self._buffer_budget = buffer_budget
+        self._codecs = codecs
+        self._unconsumed_timeout = unconsumed_timeout
 
     def get(self, url: _URLType, **kwargs: Any) -> "Deferred[_Response]":
         """
@@ -199,6 +700,41 @@ class HTTPClient:
         kwargs.setdefault("_stacklevel", 3)
         return self.request("DELETE", url, **kwargs)
 
+    def download(
+        self,
+        url: _URLType,
+        path: _PathType,
+        *,
+        fsync: bool = False,
+        max_queued: int = 1024 * 1024,
+        threadpool: Optional[ThreadPool] = None,
+        segments: int = 1,
+        segment_size: int = 8 * 1024 * 1024,
+        retries: int = 0,
+        retry_delay: float = 1.0,
+        **kwargs: Any
+    ) -> "Deferred[_Response]":
+        """
+        See :func:`treq.download()`.
+        """
+        stacklevel = kwargs.pop("_stacklevel", 3)
+        kwargs["headers"] = self._request_headers(
+            kwargs.get("headers"), stacklevel + 1
+        )
+        return _download(
+            self.request,
+            url,
+            path,
+            fsync,
+            max_queued,
+            threadpool,
+            segments,
+            segment_size,
+            retries,
+            retry_delay,
+            kwargs,
+        )
+
     def request(
         self,
         method: str,
@@ -214,6 +750,9 @@ class HTTPClient:
         allow_redirects: bool = True,
         browser_like_redirects: bool = False,
         unbuffered: bool = False,
+        digests: Optional[Iterable[str]] = None,
+        compress: Optional[str] = None,
+        expect_continue: Optional[int] = None,
         reactor: Optional[_ITreqReactor] = None,
         timeout: Optional[float] = None,
         _stacklevel: int = 2,
@@ -246,22 +785,73 @@ class HTTPClient:
         headers = self._request_headers(headers, _stacklevel + 1)
 
         bodyProducer, contentType = self._request_body(
-            data, files, json, stacklevel=_stacklevel + 1
+            data, files, json, stacklevel=_stacklevel + 1, headers=headers
         )
         if contentType is not None:
             headers.setRawHeaders(b"Content-Type", [contentType])
 
+        compressing: object = data
+        if compress is not None and isinstance(compressing, CompressingProducer):
+            raise ValueError("A CompressingProducer body can't be compressed again")
+        if compress is not None and bodyProducer is not None:
+            bodyProducer = compressing = CompressingProducer(bodyProducer, compress)
+        if isinstance(compressing, CompressingProducer):
+            if headers.hasHeader(b"Content-Encoding"):
+                raise ValueError(
+                    "A compressed body can't be sent with a Content-Encoding header"
+                )
+            headers.setRawHeaders(
+                b"Content-Encoding", [compressing.encoding.encode("ascii")]
+            )
+
+        if reactor is None:
+            from twisted.internet import reactor  # type: ignore
+        assert reactor is not None
+
+        continuing: object = bodyProducer
+        if (
+            expect_continue is not None
+            and bodyProducer is not None
+            and not isinstance(continuing, ContinueProducer)
+            and (
+                bodyProducer.length is UNKNOWN_LENGTH
+                or bodyProducer.length >= expect_continue
+            )
+        ):
+            bodyProducer = continuing = ContinueProducer(bodyProducer, reactor=reactor)
+        if isinstance(continuing, ContinueProducer):
+            headers.setRawHeaders(b"Expect", [b"100-continue"])
+
+        def replay() -> Optional[IBodyProducer]:
+            producer, _ = self._request_body(
+                data, files, json, stacklevel=_stacklevel + 1, headers=headers
+            )
+            if compress is not None and producer is not None:
+                producer = CompressingProducer(producer, compress)
+            if isinstance(continuing, ContinueProducer) and producer is not None:
+                producer = ContinueProducer(producer, reactor=reactor)
+            return producer
+
+        if digests is not None:
+            digesting = _digesting(digests)
+
         if not isinstance(cookies, CookieJar):
             cookies = _scoped_cookiejar_from_dict(parsed_url, cookies)
 
         cookies = merge_cookies(self._cookiejar, cookies)
         wrapped_agent: IAgent = CookieAgent(self._agent, cookies)
+        wrapped_agent = _RequestBodyAgent(wrapped_agent, replay)
 
         if allow_redirects:
+
+            def replayable() -> bool:
+                return _replayable(data, files, json)
+
             if browser_like_redirects:
                 wrapped_agent = BrowserLikeRedirectAgent(wrapped_agent)
             else:
                 wrapped_agent = RedirectAgent(wrapped_agent)
+            wrapped_agent = _ReplayingRedirectAgent(wrapped_agent, replayable)
 
         wrapped_agent = ContentDecoderAgent(wrapped_agent, [(b"gzip", GzipDecoder)])
 
@@ -272,9 +862,15 @@ class HTTPClient:
             method_, url, headers=headers, bodyProducer=bodyProducer
         )
 
-        if reactor is None:
-            from twisted.internet import reactor  # type: ignore
-        assert reactor is not None
+        replaying: object = data
+        if isinstance(replaying, ReplayableProducer):
+            close = replaying.close
+
+            def responded(result):
+                close()
+                return result
+
+            d.addBoth(responded)
 
         if timeout:
             delayedCall = reactor.callLater(timeout, d.cancel)
@@ -286,10 +882,33 @@ class HTTPClient:
 
             d.addBoth(gotResult)
 
+        if digests is not None:
+            d.addCallback(digesting)
+
         if not unbuffered:
-            d.addCallback(_BufferedResponse)
+            d.addCallback(_BufferedResponse, self._buffer_budget, reactor)
+            return d.addCallback(_Response, cookies, self._codecs)
+
+        site = _call_site(_stacklevel)
+
+        def track(response):
+            if (
+                method_ == b"HEAD"
+                or response.code in (http.NO_CONTENT, http.NOT_MODIFIED)
+                or response.length == 0
+            ):
+                # There's no body to be left unread.
+                return _Response(response, cookies, self._codecs)
+            unconsumed = _Unconsumed(
+                response, reactor, site, self._unconsumed_timeout
+            )
+            tracked = _UnconsumedResponse(response, unconsumed)
+            # Not the _Response, which may be collected while a method
+            # proxied from the tracked response is running.
+            weakref.finalize(tracked, unconsumed.collected)
+            return _Response(tracked, cookies, self._codecs)
 
-        return d.addCallback(_Response, cookies)
+        return d.addCallback(track)
 
     def _request_headers(
         self, headers: Optional[_HeadersType], stacklevel: int
@@ -323,12 +942,27 @@ class HTTPClient:
             ).format(type(headers))
         )
 
+    def _codec_for(self, headers: Optional[Headers]) -> Any:
+        """
+        Select the codec that encodes the *json* argument.
+        """
+        if self._codecs is None:
+            return _json_codec
+        if headers is not None:
+            contentTypes = headers.getRawHeaders(b"Content-Type")
+            if contentTypes:
+                codec = self._codecs.for_content_type(contentTypes[-1])
+                if codec is not None:
+                    return codec
+        return self._codecs.json
+
     def _request_body(
         self,
         data: Optional[_DataType],
         files: Optional[_FilesType],
         json: Union[_JSONType, _Nothing],
         stacklevel: int,
+        headers: Optional[Headers] = None,
     ) -> Tuple[Optional[IBodyProducer], Optional[bytes]]:
         """
         Here we choose a right producer based on the parameters passed in.
@@ -356,6 +990,16 @@ class HTTPClient:
         :params json:
             JSON-encodable data, or the sentinel `_NOTHING`. The sentinel is
             necessary because ``None`` is a valid JSON value.
+
+            When the client has a codec registry and *headers* already has
+            a Content-Type, the codec for that media type is used instead of
+            the JSON codec (for example, to send MessagePack).
+
+            A :class:`~treq.producers.JSONProducer` is sent as it is, and an
+            iterator is encoded as a JSON array by one.
+
+        :params headers:
+            The request headers.
         """
         if json is not _NOTHING:
             if files or data:
@@ -364,11 +1008,14 @@ class HTTPClient:
                         "data" if data else "files"
                     )
                 )
+            if isinstance(json, abc.Iterator):
+                json = JSONProducer(json)
+            if isinstance(json, JSONProducer):
+                return json, JSONCodec.content_type
+            codec = self._codec_for(headers)
             return (
-                self._data_to_body_producer(
-                    json_dumps(json, separators=(",", ":")).encode("utf-8"),
-                ),
-                b"application/json; charset=UTF-8",
+                self._data_to_body_producer(codec.encode(json)),
+                codec.content_type,
             )
 
         if files:
@@ -520,7 +1167,19 @@ def _coerced_query_params(params: _ParamsType) -> Iterator[Tuple[str, str]]:
 
 
 def _from_bytes(orig_bytes: bytes) -> IBodyProducer:
-    return FileBodyProducer(io.BytesIO(orig_bytes))
+    return BytesProducer(orig_bytes)
+
+
+def _from_buffer(orig_buffer: Any) -> IBodyProducer:
+    return BufferProducer(orig_buffer)
+
+
+def _from_generator(orig_generator: Iterator[bytes]) -> IBodyProducer:
+    return IterableProducer(orig_generator)
+
+
+def _from_async_generator(orig_generator: Any) -> IBodyProducer:
+    return AsyncIterableProducer(orig_generator)
 
 
 def _from_file(orig_file: Union[io.BytesIO, io.BufferedReader]) -> IBodyProducer:
@@ -536,6 +1195,12 @@ def _guess_content_type(filename: str) -> Optional[str]:
 
 
 registerAdapter(_from_bytes, bytes, IBodyProducer)
+registerAdapter(_from_buffer, bytearray, IBodyProducer)
+registerAdapter(_from_buffer, memoryview, IBodyProducer)
+registerAdapter(_from_buffer, mmap.mmap, IBodyProducer)
+registerAdapter(_from_buffer, array.array, IBodyProducer)
+registerAdapter(_from_generator, types.GeneratorType, IBodyProducer)
+registerAdapter(_from_async_generator, types.AsyncGeneratorType, IBodyProducer)
 registerAdapter(_from_file, io.BytesIO, IBodyProducer)
 
 # file()/open() equiv
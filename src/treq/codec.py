@@ -0,0 +1,175 @@
+# Copyright (c) The treq Authors.
+# See LICENSE for details.
+"""
+Codecs which convert structured data to and from HTTP bodies.
+
+A :class:`CodecRegistry` may be passed to :class:`~treq.client.HTTPClient` to
+control how the *json* argument is encoded and how
+:meth:`~treq.response._Response.json()` and
+:meth:`~treq.response._Response.decode()` decode response bodies.
+"""
+import json
+from importlib import import_module
+from typing import Any, Dict, Iterable, Optional, Union
+
+import multipart  # type: ignore
+
+
+def _optional(name: str) -> Any:
+    """
+    Import an optional dependency.
+
+    :returns: The module, or `None` if it is not installed.
+    """
+    try:
+        return import_module(name)
+    except ImportError:
+        return None
+
+
+orjson = _optional("orjson")
+msgpack = _optional("msgpack")
+cbor2 = _optional("cbor2")
+
+
+class JSONCodec:
+    """
+    Encode and decode JSON with the standard library :mod:`json` module.
+
+    Decoding works directly on the body bytes, which may be UTF-8, UTF-16, or
+    UTF-32 per :rfc:`8259#section-8.1`.
+    """
+
+    media_type = "application/json"
+    content_type = b"application/json; charset=UTF-8"
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, data: bytes, **kwargs: Any) -> Any:
+        return json.loads(data, **kwargs)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    Encode and decode JSON with `orjson <https://pypi.org/project/orjson/>`_.
+
+    :raises ImportError: if orjson is not installed.
+    """
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ImportError("OrjsonCodec requires the orjson package")
+
+    def encode(self, value: Any) -> bytes:
+        encoded: bytes = orjson.dumps(value)
+        return encoded
+
+    def decode(self, data: bytes, **kwargs: Any) -> Any:
+        if kwargs:
+            raise TypeError("OrjsonCodec.decode() takes no keyword arguments")
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    """
+    Encode and decode `MessagePack <https://msgpack.org/>`_ with the
+    `msgpack <https://pypi.org/project/msgpack/>`_ package.
+
+    :raises ImportError: if msgpack is not installed.
+    """
+
+    media_type = "application/msgpack"
+    content_type = b"application/msgpack"
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise ImportError("MsgpackCodec requires the msgpack package")
+
+    def encode(self, value: Any) -> bytes:
+        encoded: bytes = msgpack.packb(value)
+        return encoded
+
+    def decode(self, data: bytes, **kwargs: Any) -> Any:
+        return msgpack.unpackb(data, **kwargs)
+
+
+class CBORCodec:
+    """
+    Encode and decode CBOR (:rfc:`8949`) with the
+    `cbor2 <https://pypi.org/project/cbor2/>`_ package.
+
+    :raises ImportError: if cbor2 is not installed.
+    """
+
+    media_type = "application/cbor"
+    content_type = b"application/cbor"
+
+    def __init__(self) -> None:
+        if cbor2 is None:
+            raise ImportError("CBORCodec requires the cbor2 package")
+
+    def encode(self, value: Any) -> bytes:
+        encoded: bytes = cbor2.dumps(value)
+        return encoded
+
+    def decode(self, data: bytes, **kwargs: Any) -> Any:
+        return cbor2.loads(data, **kwargs)
+
+
+class CodecRegistry:
+    """
+    A collection of codecs, keyed by the media type each handles.
+
+    A codec is any object with:
+
+    - a ``media_type`` attribute, like ``"application/json"``;
+    - a ``content_type`` attribute, the `bytes` value of the Content-Type
+      header sent with bodies it encodes;
+    - an ``encode(value)`` method which returns `bytes`; and
+    - a ``decode(data, **kwargs)`` method which accepts `bytes`.
+
+    :param codecs: The codecs to register. The standard library
+        :class:`JSONCodec` is registered first, so passing another codec for
+        ``application/json`` replaces it.
+    """
+
+    def __init__(self, codecs: Iterable[Any] = ()) -> None:
+        self._codecs: Dict[str, Any] = {}
+        self.register(JSONCodec())
+        for codec in codecs:
+            self.register(codec)
+
+    def register(self, codec: Any) -> None:
+        """
+        Add a codec, replacing any previously registered for the same media
+        type.
+        """
+        self._codecs[codec.media_type.lower()] = codec
+
+    @property
+    def json(self) -> Any:
+        """
+        The codec used for JSON, as for the *json* argument to
+        :meth:`~treq.client.HTTPClient.request()`.
+        """
+        return self._codecs[JSONCodec.media_type]
+
+    def for_content_type(self, content_type: Union[str, bytes]) -> Optional[Any]:
+        """
+        Find the codec for the media type of a Content-Type header value.
+
+        Structured syntax suffixes (:rfc:`6839`) are honored, so
+        ``application/problem+json`` is decoded with the JSON codec.
+
+        :returns: A codec, or `None` when no codec handles the media type.
+        """
+        if isinstance(content_type, bytes):
+            content_type = content_type.decode("latin-1")
+        media_type, _ = multipart.parse_options_header(content_type)
+        media_type = media_type.lower()
+        codec = self._codecs.get(media_type)
+        if codec is None and "+" in media_type:
+            _, suffix = media_type.rsplit("+", 1)
+            codec = self._codecs.get("application/" + suffix)
+        return codec
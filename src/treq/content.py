@@ -1,14 +1,22 @@
+import codecs
+import csv
 import json
-from typing import Any, Callable, FrozenSet, List, Optional, cast
+import re
+from collections import deque
+from typing import (Any, Callable, Deque, FrozenSet, Iterable, Iterator, List,
+                    Optional, cast)
+from weakref import WeakKeyDictionary
 
 import multipart  # type: ignore
 from twisted.internet.defer import Deferred, succeed
+from twisted.internet.interfaces import IConsumer, IPushProducer
 from twisted.internet.protocol import Protocol, connectionDone
 from twisted.python.failure import Failure
 from twisted.web.client import ResponseDone
 from twisted.web.http import PotentialDataLoss
 from twisted.web.http_headers import Headers
 from twisted.web.iweb import IResponse
+from zope.interface import implementer
 
 
 """Characters that are valid in a charset name per RFC 2978.
@@ -105,6 +113,13 @@ def collect(
     return d
 
 
+_content_cache: "WeakKeyDictionary[IResponse, bytes]" = WeakKeyDictionary()
+"""
+The complete body of each response read with `content()`, so that it is
+assembled only once however many times it is requested.
+"""
+
+
 def content(response: IResponse) -> "Deferred[bytes]":
     """
     Read the contents of an HTTP response.
@@ -116,12 +131,35 @@ def content(response: IResponse) -> "Deferred[bytes]":
 
     :rtype: Deferred that fires with the content as a str.
     """
+    from treq.response import _Response
+
+    if isinstance(response, _Response):
+        # Cache the body under the buffering response treq's wrapper
+        # proxies, so that it is found by either, and compacted.
+        response = response.original
+    try:
+        return succeed(_content_cache[response])
+    except (KeyError, TypeError):
+        pass
+
     _content: List[bytes] = []
+
+    def _assemble(_: None) -> bytes:
+        body = b"".join(_content)
+        try:
+            _content_cache[response] = body
+        except TypeError:
+            # The response can't be weakly referenced, so don't cache.
+            return body
+        # A buffering response may hold the body in many segments. Replace
+        # them with the assembled bytes so the body is only held once.
+        compact = getattr(response, "_compact", None)
+        if compact is not None:
+            compact(body)
+        return body
+
     d = collect(response, _content.append)
-    return cast(
-        "Deferred[bytes]",
-        d.addCallback(lambda _: b"".join(_content)),
-    )
+    return cast("Deferred[bytes]", d.addCallback(_assemble))
 
 
 def json_content(response: IResponse, **kwargs: Any) -> "Deferred[Any]":
@@ -165,3 +203,583 @@ def text_content(response: IResponse, encoding: str = "ISO-8859-1") -> "Deferred
 
     d = content(response)
     return cast("Deferred[str]", d.addCallback(_decode_content))
+
+
+_JSON_STRUCTURE = re.compile(rb'["\[\]{},]')
+# The rest of a string, up to its closing quote or the end of the data
+# received (before a backslash, if that's the last byte).
+_JSON_STRING_BODY = re.compile(rb'(?:[^"\\]|\\.)*', re.DOTALL)
+
+
+class _JSONItemParser:
+    """
+    Incrementally find the items of one array in a UTF-8 JSON document.
+
+    Only the structure of the document is scanned: strings are skipped over
+    and containers are tracked to find the target array, whose items are
+    each parsed with :func:`json.loads` once complete. Only the bytes of the
+    item currently being received are buffered.
+
+    :ivar _stack: For each open container, the key of the member being
+        parsed (for objects, `None` until a key has been seen), or
+        ``"item"`` for arrays. This is only used to match the path, as an
+        object may have a member named ``"item"``.
+
+    :ivar _arrays: For each open container, whether it is an array.
+
+    :ivar _keyExpected: For each open container, whether a string found at
+        that level would be an object member name.
+
+    :ivar _string: The offset in the buffer of the opening quote of a string
+        whose end hasn't been received, or -1. Scanning resumes within the
+        string, at `_pos`, when more data arrives.
+    """
+
+    def __init__(
+        self, path: str, collector: Callable[[Any], None], **kwargs: Any
+    ) -> None:
+        target = tuple(path.split("."))
+        if target[-1] != "item":
+            raise ValueError(
+                "path {!r} must select array items, ending in 'item'".format(path)
+            )
+        self._path = path
+        self._target = target[:-1]
+        self._collector = collector
+        self._kwargs = kwargs
+        self._buffer = bytearray()
+        self._pos = 0
+        self._stack: List[Optional[str]] = []
+        self._arrays: List[bool] = []
+        self._keyExpected: List[bool] = []
+        # Nesting depth of the target array while inside it, and the offset
+        # where the current item starts (or -1 between items).
+        self._depth = -1
+        self._start = -1
+        self._empty = True
+        self._string = -1
+        self._found = False
+
+    def feed(self, data: bytes) -> None:
+        buf = self._buffer
+        buf += data
+        pos = self._pos
+        stack = self._stack
+        arrays = self._arrays
+        string = self._string
+        while True:
+            if string < 0:
+                match = _JSON_STRUCTURE.search(buf, pos)
+                if match is None:
+                    pos = len(buf)
+                    break
+                at = match.start()
+                char = buf[at]
+                pos = match.end()
+            else:
+                char = 0x22
+            if char == 0x22:  # "
+                if string < 0:
+                    string = pos - 1
+                body = _JSON_STRING_BODY.match(buf, pos)
+                assert body is not None  # It matches the empty string.
+                end = body.end()
+                if end == len(buf) or buf[end] != 0x22:
+                    # Incomplete string: resume scanning it from here when
+                    # more data arrives.
+                    pos = end
+                    break
+                if stack and self._keyExpected[-1] and self._depth < 0:
+                    stack[-1] = json.loads(bytes(buf[string : end + 1]))
+                    self._keyExpected[-1] = False
+                pos = end + 1
+                string = -1
+            elif char in (0x5B, 0x7B):  # [ {
+                isArray = char == 0x5B
+                if isArray and self._depth < 0 and self._atTarget():
+                    self._depth = len(stack) + 1
+                    self._start = pos
+                    self._empty = True
+                    self._found = True
+                stack.append("item" if isArray else None)
+                arrays.append(isArray)
+                self._keyExpected.append(not isArray)
+            elif char == 0x2C:  # ,
+                if len(stack) == self._depth:
+                    self._emit(at)
+                    self._start = pos
+                elif arrays and not arrays[-1]:
+                    self._keyExpected[-1] = True
+            else:  # ] }
+                if not arrays or arrays[-1] != (char == 0x5D):
+                    raise ValueError("Unbalanced JSON document")
+                if len(stack) == self._depth:
+                    self._emit(at, last=True)
+                    self._depth = self._start = -1
+                stack.pop()
+                arrays.pop()
+                self._keyExpected.pop()
+
+        keep = min(i for i in (self._start, string, pos) if i >= 0)
+        del buf[:keep]
+        self._pos = pos - keep
+        if self._start >= 0:
+            self._start -= keep
+        self._string = string - keep if string >= 0 else -1
+
+    def _atTarget(self) -> bool:
+        return tuple(self._stack) == self._target
+
+    def _emit(self, end: int, last: bool = False) -> None:
+        item = bytes(self._buffer[self._start : end]).strip()
+        if not item:
+            if last and self._empty:
+                return
+            raise ValueError("Empty item in JSON array")
+        self._empty = False
+        self._collector(json.loads(item, **self._kwargs))
+
+    def close(self) -> None:
+        if self._stack or self._string >= 0:
+            raise ValueError("Incomplete JSON document")
+        if not self._found:
+            raise ValueError(
+                "JSON document has no array at path {!r}".format(self._path)
+            )
+
+
+def collect_json_items(
+    response: IResponse,
+    collector: Callable[[Any], None],
+    path: str = "item",
+    **kwargs: Any,
+) -> "Deferred[None]":
+    """
+    Incrementally decode the items of a JSON array in the body of the
+    response, calling *collector* with each as soon as it has been received.
+
+    Only the item being received is held in memory, so arrays far larger
+    than available memory may be processed. The body must be UTF-8.
+
+    Like :func:`collect`, this function may only be called **once** for
+    a given response, and if the collector raises the exception is set as
+    the error value of the returned ``Deferred`` and the HTTP transport is
+    closed.
+
+    :param IResponse response: The HTTP response to collect the body from.
+
+    :param collector: A single argument callable which receives each item.
+
+    :param str path: Which array to decode, as a dot-separated sequence of
+        object member names, with ``item`` for array items. The default
+        ``"item"`` selects the items of a top-level array, while
+        ``"results.item"`` selects those of the array in the top-level
+        object's ``results`` member. Only the parts of the document that
+        are selected are validated.
+
+    :param kwargs: Any keyword arguments accepted by :py:func:`json.loads`
+
+    :rtype: Deferred that fires with None when the entire body has been
+        read, or fails with :exc:`ValueError` if it is not a complete JSON
+        document or has no array at *path*.
+    """
+    parser = _JSONItemParser(path, collector, **kwargs)
+    d = collect(response, parser.feed)
+    return cast("Deferred[None]", d.addCallback(lambda _: parser.close()))
+
+
+class _LineSplitter:
+    """
+    Split bytes into lines ending in LF or CRLF, and pass each line, without
+    its line ending, to a callable.
+
+    This is only correct for ASCII-compatible encodings like UTF-8.
+    """
+
+    def __init__(self, collector: Callable[[bytes], None]) -> None:
+        self._collector = collector
+        self._pending = b""
+
+    def feed(self, data: bytes) -> None:
+        if b"\n" not in data:
+            self._pending += data
+            return
+        lines = data.split(b"\n")
+        lines[0] = self._pending + lines[0]
+        self._pending = lines.pop()
+        for line in lines:
+            self._collector(line[:-1] if line.endswith(b"\r") else line)
+
+    def close(self) -> None:
+        if self._pending:
+            line, self._pending = self._pending, b""
+            self._collector(line[:-1] if line.endswith(b"\r") else line)
+
+
+class _TextLineSplitter:
+    """
+    Incrementally decode text and split it into lines ending in LF or CRLF,
+    passing each to a callable.
+
+    :ivar _keepends: Pass lines with their line endings, as the `csv`
+        module requires.
+    """
+
+    def __init__(
+        self,
+        encoding: str,
+        collector: Callable[[str], None],
+        keepends: bool = False,
+    ) -> None:
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._collector = collector
+        self._keepends = keepends
+        self._pending = ""
+
+    def feed(self, data: bytes, final: bool = False) -> None:
+        text = self._decoder.decode(data, final)
+        if "\n" not in text:
+            self._pending += text
+            return
+        lines = text.split("\n")
+        lines[0] = self._pending + lines[0]
+        self._pending = lines.pop()
+        for line in lines:
+            self._deliver(line, "\n")
+
+    def _deliver(self, line: str, end: str) -> None:
+        if self._keepends:
+            self._collector(line + end)
+        elif line.endswith("\r"):
+            self._collector(line[:-1])
+        else:
+            self._collector(line)
+
+    def close(self) -> None:
+        self.feed(b"", final=True)
+        if self._pending:
+            line, self._pending = self._pending, ""
+            self._deliver(line, "")
+
+
+# The states of _CSVParser, which follow those of the csv module's reader.
+_FIELD_START, _IN_FIELD, _IN_QUOTED_FIELD, _QUOTE_IN_QUOTED_FIELD = range(4)
+
+
+class _CSVParser:
+    """
+    Parse CSV records from lines of text as they become available.
+
+    Each line is scanned as the `csv` module's reader would, to find whether
+    it ends within a quoted field (or after an escape character), in which
+    case the record continues on the next line.
+    """
+
+    def __init__(self, collector: Callable[[List[str]], None], **fmtparams: Any):
+        self._collector = collector
+        self._lines: Deque[str] = deque()
+        self._reader = csv.reader(self._pop(), **fmtparams)
+        dialect = self._reader.dialect
+        self._quotechar = (
+            None if dialect.quoting == csv.QUOTE_NONE else dialect.quotechar
+        )
+        self._delimiter = dialect.delimiter
+        self._escapechar = dialect.escapechar
+        self._doublequote = dialect.doublequote
+        self._skipinitialspace = dialect.skipinitialspace
+        self._special = {c for c in (self._quotechar, self._escapechar) if c}
+        self._state = _FIELD_START
+        # An escape character has been seen, and the character it escapes
+        # hasn't.
+        self._escaped = False
+        # The line so far ends in an escaped line break, which doesn't end
+        # the record.
+        self._escapedBreak = False
+
+    def _pop(self) -> Iterator[str]:
+        # The reader only finds no line waiting if the last line of the body
+        # lacks a line break, which it would otherwise join to the next.
+        while self._lines:
+            yield self._lines.popleft()
+
+    def line(self, line: str) -> None:
+        self._lines.append(line)
+        if not self._ends(line):
+            return
+        record = next(self._reader)
+        if record:
+            self._collector(record)
+
+    def _ends(self, line: str) -> bool:
+        """
+        Does the record end with *line*?
+        """
+        if (
+            self._state == _FIELD_START
+            and len(self._lines) == 1
+            and not any(c in line for c in self._special)
+        ):
+            return True
+        state = self._state
+        escaped = self._escaped
+        escapedBreak = self._escapedBreak
+        for c in line:
+            escapedBreak = False
+            if escaped:
+                escaped = False
+                if state != _IN_QUOTED_FIELD:
+                    state = _IN_FIELD
+                    escapedBreak = c in "\r\n"
+            elif c == self._escapechar and state != _QUOTE_IN_QUOTED_FIELD:
+                escaped = True
+            elif state == _IN_QUOTED_FIELD:
+                if c == self._quotechar:
+                    state = (
+                        _QUOTE_IN_QUOTED_FIELD if self._doublequote else _IN_FIELD
+                    )
+            elif c == self._delimiter or c in "\r\n":
+                state = _FIELD_START
+            elif state == _QUOTE_IN_QUOTED_FIELD and c == self._quotechar:
+                state = _IN_QUOTED_FIELD
+            elif state == _FIELD_START:
+                if c == self._quotechar:
+                    state = _IN_QUOTED_FIELD
+                elif not (c == " " and self._skipinitialspace):
+                    state = _IN_FIELD
+            else:
+                state = _IN_FIELD
+        if escaped or escapedBreak or state == _IN_QUOTED_FIELD:
+            self._state = state if state == _IN_QUOTED_FIELD else _IN_FIELD
+            self._escaped = False
+            self._escapedBreak = escapedBreak or escaped
+            return False
+        self._state = _FIELD_START
+        self._escaped = False
+        self._escapedBreak = False
+        return True
+
+    def close(self) -> None:
+        if self._lines:
+            raise csv.Error("Unterminated quoted field at end of body")
+
+
+def _collect_text_lines(
+    response: IResponse,
+    collector: Callable[[str], None],
+    encoding: str,
+    keepends: bool = False,
+) -> "Deferred[None]":
+    splitter = _TextLineSplitter(
+        _encoding_from_headers(response.headers) or encoding, collector, keepends
+    )
+    d = collect(response, splitter.feed)
+    return cast("Deferred[None]", d.addCallback(lambda _: splitter.close()))
+
+
+def collect_lines(
+    response: IResponse,
+    collector: Callable[[str], None],
+    encoding: str = "ISO-8859-1",
+) -> "Deferred[None]":
+    """
+    Incrementally decode the body of the response as text, calling
+    *collector* with each line as soon as it has been received.
+
+    Lines may end in LF or CRLF, which is not included in the line passed to
+    the collector. The last line need not have a line ending.
+
+    Like :func:`collect`, this function may only be called **once** for
+    a given response.
+
+    :param IResponse response: The HTTP response to collect the body from.
+
+    :param collector: A single argument callable which receives each line as
+        a `str`.
+
+    :param str encoding: A charset, such as ``UTF-8`` or ``ISO-8859-1``,
+        used if the response does not specify an encoding.
+
+    :rtype: Deferred that fires with None when the entire body has been read.
+    """
+    return _collect_text_lines(response, collector, encoding)
+
+
+def collect_ndjson(
+    response: IResponse, collector: Callable[[Any], None], **kwargs: Any
+) -> "Deferred[None]":
+    """
+    Incrementally decode a body of newline-delimited JSON values, calling
+    *collector* with each as soon as it has been received. Blank lines are
+    ignored.
+
+    The body must be UTF-8. Each line is passed to :func:`json.loads` as
+    `bytes`, without first being decoded.
+
+    Like :func:`collect`, this function may only be called **once** for
+    a given response.
+
+    :param IResponse response: The HTTP response to collect the body from.
+
+    :param collector: A single argument callable which receives each value.
+
+    :param kwargs: Any keyword arguments accepted by :py:func:`json.loads`
+
+    :rtype: Deferred that fires with None when the entire body has been read.
+    """
+
+    def _line(line: bytes) -> None:
+        if line.strip():
+            collector(json.loads(line, **kwargs))
+
+    splitter = _LineSplitter(_line)
+    d = collect(response, splitter.feed)
+    return cast("Deferred[None]", d.addCallback(lambda _: splitter.close()))
+
+
+def collect_csv(
+    response: IResponse,
+    collector: Callable[[List[str]], None],
+    encoding: str = "utf-8",
+    **fmtparams: Any,
+) -> "Deferred[None]":
+    """
+    Incrementally parse a CSV body, calling *collector* with each record as
+    soon as it has been received. Blank lines are ignored.
+
+    Like :func:`collect`, this function may only be called **once** for
+    a given response.
+
+    :param IResponse response: The HTTP response to collect the body from.
+
+    :param collector: A single argument callable which receives each record
+        as a list of `str`.
+
+    :param str encoding: A charset used if the response does not specify an
+        encoding.
+
+    :param fmtparams: Any dialect and formatting parameters accepted by
+        :func:`csv.reader`.
+
+    :rtype: Deferred that fires with None when the entire body has been read,
+        or fails with :exc:`csv.Error` if a record is malformed.
+    """
+    parser = _CSVParser(collector, **fmtparams)
+    d = _collect_text_lines(response, parser.line, encoding, keepends=True)
+    return cast("Deferred[None]", d.addCallback(lambda _: parser.close()))
+
+
+@implementer(IPushProducer)
+class _TeeProducer:
+    """
+    The producer registered with one of the consumers of a `_TeeProtocol`,
+    which tracks whether that consumer has asked for a pause.
+    """
+
+    def __init__(self, tee: "_TeeProtocol") -> None:
+        self._tee = tee
+        self.paused = False
+
+    def pauseProducing(self) -> None:
+        if not self.paused:
+            self.paused = True
+            self._tee._pause()
+
+    def resumeProducing(self) -> None:
+        if self.paused:
+            self.paused = False
+            self._tee._resume()
+
+    def stopProducing(self) -> None:
+        self._tee._stop()
+
+
+class _TeeProtocol(Protocol):
+    """
+    Write the body of a response to several consumers, pausing the
+    transport while any of them has paused its producer.
+
+    :ivar _pauses: The number of consumers which are currently paused.
+    """
+
+    def __init__(
+        self, consumers: Iterable[IConsumer], finished: "Deferred[None]"
+    ) -> None:
+        self._consumers = list(consumers)
+        self._finished: "Optional[Deferred[None]]" = finished
+        self._pauses = 0
+        for consumer in self._consumers:
+            consumer.registerProducer(_TeeProducer(self), True)
+
+    def connectionMade(self) -> None:
+        if self._pauses:
+            self.transport.pauseProducing()  # type: ignore
+
+    def _pause(self) -> None:
+        self._pauses += 1
+        if self._pauses == 1 and self.transport is not None:
+            self.transport.pauseProducing()  # type: ignore
+
+    def _resume(self) -> None:
+        self._pauses -= 1
+        if self._pauses == 0 and self.transport is not None:
+            self.transport.resumeProducing()  # type: ignore
+
+    def _stop(self) -> None:
+        if self.transport is not None:
+            self.transport.stopProducing()  # type: ignore
+
+    def dataReceived(self, data: bytes) -> None:
+        if self._finished is None:
+            return
+        try:
+            for consumer in self._consumers:
+                consumer.write(data)
+        except BaseException:
+            self._stop()
+            self._finish(Failure())
+
+    def connectionLost(self, reason: Failure = connectionDone) -> None:
+        if reason.check(ResponseDone, PotentialDataLoss):
+            self._finish(None)
+        else:
+            self._finish(reason)
+
+    def _finish(self, reason: Optional[Failure]) -> None:
+        if self._finished is None:
+            return
+        finished, self._finished = self._finished, None
+        for consumer in self._consumers:
+            consumer.unregisterProducer()
+        if reason is None:
+            finished.callback(None)
+        else:
+            finished.errback(reason)
+
+
+def tee(response: IResponse, consumers: Iterable[IConsumer]) -> "Deferred[None]":
+    """
+    Write the body of the response to several consumers at once, as it is
+    received, without buffering it.
+
+    A streaming producer is registered with each consumer. While any
+    consumer has paused its producer the transport is paused, so the body is
+    read only as fast as the slowest consumer accepts it. A consumer which
+    stops its producer aborts the response. Producers are unregistered once
+    the body is complete.
+
+    Like :func:`collect`, this function may only be called **once** for
+    a given response. If a consumer's ``write`` raises, the HTTP transport is
+    closed and the exception is set as the error value of the returned
+    ``Deferred``.
+
+    :param IResponse response: The HTTP response to read the body of.
+
+    :param consumers: :class:`~twisted.internet.interfaces.IConsumer`
+        providers, such as a hashing wrapper, a file writer, and a parser.
+
+    :rtype: Deferred that fires with None when the entire body has been
+        written to every consumer.
+    """
+    d: "Deferred[None]" = Deferred()
+    response.deliverBody(_TeeProtocol(consumers, d))
+    return d
@@ -0,0 +1,279 @@
+# Copyright (c) The treq Authors.
+# See LICENSE for details.
+"""
+Compute and verify digests of response bodies as they are received.
+
+Pass the *digests* argument to :func:`treq.request()` (or any of the other
+request functions) to hash the body while it streams, rather than in a second
+pass once it has been saved. The results are available from
+:meth:`~treq.response._Response.digests()`.
+"""
+import base64
+import binascii
+import hashlib
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from twisted.internet.defer import Deferred
+from twisted.internet.interfaces import IProtocol
+from twisted.python.components import proxyForInterface
+from twisted.python.failure import Failure
+from twisted.web.client import GzipDecoder, ResponseDone
+from twisted.web.http import PotentialDataLoss
+from twisted.web.iweb import IResponse
+
+from treq.codec import _optional
+
+crc32c = _optional("crc32c")
+
+# Algorithm names used in Content-Digest (RFC 9530) and Digest (RFC 3230)
+# headers, mapped to the names accepted by the *digests* argument.
+_CONTENT_DIGEST_ALGORITHMS = {
+    "sha-256": "sha256",
+    "sha-512": "sha512",
+    "md5": "md5",
+    "crc32c": "crc32c",
+}
+_INSTANCE_DIGEST_ALGORITHMS = {
+    "sha-256": "sha256",
+    "sha-512": "sha512",
+    "md5": "md5",
+}
+
+_CONTENT_DIGEST_MEMBER = re.compile(
+    r"\s*([a-z*][a-z0-9_.*-]*)\s*=\s*:([A-Za-z0-9+/=]*):\s*(?:;[^,]*)?(?:,|$)"
+)
+
+
+class DigestMismatch(Exception):
+    """
+    The body of a response did not match a digest sent by the server in
+    a Content-Digest or Digest header.
+
+    :ivar algorithm: The name of the algorithm, like ``"sha256"``.
+    :ivar expected: The digest sent by the server.
+    :ivar actual: The digest of the body received.
+    """
+
+    def __init__(self, algorithm: str, expected: bytes, actual: bytes) -> None:
+        super().__init__(
+            "{} digest of response body is {}, expected {}".format(
+                algorithm, actual.hex(), expected.hex()
+            )
+        )
+        self.algorithm = algorithm
+        self.expected = expected
+        self.actual = actual
+
+
+class _CRC32C:
+    """
+    A hashlib-style wrapper for the `crc32c
+    <https://pypi.org/project/crc32c/>`_ package.
+    """
+
+    def __init__(self) -> None:
+        self._value = 0
+
+    def update(self, data: bytes) -> None:
+        self._value = crc32c.crc32c(data, self._value)
+
+    def digest(self) -> bytes:
+        return self._value.to_bytes(4, "big")
+
+
+def _normalize(name: str) -> str:
+    name = name.lower()
+    return _CONTENT_DIGEST_ALGORITHMS.get(name, name)
+
+
+def _hasher(name: str) -> Any:
+    """
+    Create a hash object for an algorithm named as for the *digests*
+    argument.
+
+    :raises ImportError: for ``crc32c`` if the crc32c package is not
+        installed.
+    :raises ValueError: if the algorithm is not known.
+    """
+    if name == "crc32c":
+        if crc32c is None:
+            raise ImportError("The crc32c digest requires the crc32c package")
+        return _CRC32C()
+    return hashlib.new(name)
+
+
+def _parse_content_digest(values: Iterable[bytes]) -> List[Tuple[str, bytes]]:
+    """
+    Extract the digests of supported algorithms from Content-Digest header
+    values, which are structured field dictionaries of byte sequences.
+    """
+    digests = []
+    for value in values:
+        text = value.decode("latin-1")
+        for match in _CONTENT_DIGEST_MEMBER.finditer(text):
+            name = _CONTENT_DIGEST_ALGORITHMS.get(match.group(1))
+            if name is None:
+                continue
+            try:
+                digests.append((name, base64.b64decode(match.group(2))))
+            except binascii.Error:
+                continue
+    return digests
+
+
+def _parse_instance_digest(values: Iterable[bytes]) -> List[Tuple[str, bytes]]:
+    """
+    Extract the digests of supported algorithms from the obsolete Digest
+    header, a comma-separated list of ``algorithm=base64`` pairs.
+    """
+    digests = []
+    for value in values:
+        for member in value.decode("latin-1").split(","):
+            algorithm, _, encoded = member.strip().partition("=")
+            name = _INSTANCE_DIGEST_ALGORITHMS.get(algorithm.strip().lower())
+            if name is None:
+                continue
+            try:
+                digests.append((name, base64.b64decode(encoded.strip().strip('"'))))
+            except binascii.Error:
+                continue
+    return digests
+
+
+def _expected_digests(response: IResponse) -> List[Tuple[str, bytes]]:
+    """
+    Find the digests a response's headers say its body should have.
+
+    Nothing is verified when the body was decoded from a content coding,
+    since the headers describe the encoded bytes, nor when the response has
+    no content to compare.
+    """
+    if isinstance(response, GzipDecoder):
+        return []
+    if response.code in (204, 304):
+        return []
+    request = getattr(response, "request", None)
+    if request is not None and request.method == b"HEAD":
+        return []
+    headers = response.headers
+    expected = _parse_content_digest(headers.getRawHeaders(b"content-digest", ()))
+    # Digest describes the whole representation, not a range of it.
+    if response.code != 206:
+        expected += _parse_instance_digest(headers.getRawHeaders(b"digest", ()))
+    return expected
+
+
+class _DigestingProtocol(proxyForInterface(IProtocol)):  # type: ignore
+    def __init__(
+        self,
+        original: IProtocol,
+        hashers: Dict[str, Any],
+        finish: Callable[[Failure], Failure],
+    ) -> None:
+        self.original = original
+        self._hashers = hashers
+        self._finish = finish
+
+    def dataReceived(self, data: bytes) -> None:
+        for hasher in self._hashers.values():
+            hasher.update(data)
+        self.original.dataReceived(data)
+
+    def connectionLost(self, reason: Failure) -> None:
+        self.original.connectionLost(self._finish(reason))
+
+
+class _DigestingResponse(proxyForInterface(IResponse)):  # type: ignore
+    """
+    Hash the body of a response as it is delivered, and fail its delivery if
+    the result doesn't match the digests in the response headers.
+
+    :ivar _result: Once the body has been delivered, the digests or the
+        `Failure` with which delivery failed.
+    """
+
+    def __init__(self, original: IResponse, algorithms: Iterable[str]) -> None:
+        self.original = original
+        self._hashers: Dict[str, Any] = {}
+        for name in algorithms:
+            name = _normalize(name)
+            self._hashers[name] = _hasher(name)
+        self._expected = []
+        for name, expected in _expected_digests(original):
+            if name not in self._hashers:
+                try:
+                    self._hashers[name] = _hasher(name)
+                except ImportError:
+                    continue
+            self._expected.append((name, expected))
+        self._result: Any = None
+        self._waiters: "List[Deferred[Dict[str, bytes]]]" = []
+
+    def deliverBody(self, protocol: IProtocol) -> None:
+        self.original.deliverBody(
+            _DigestingProtocol(protocol, self._hashers, self._finish)
+        )
+
+    def _finish(self, reason: Failure) -> Failure:
+        """
+        Compute the digests once the body has been received.
+
+        :returns: The reason to pass to the protocol the body was delivered
+            to: *reason*, or a `DigestMismatch` failure.
+        """
+        if reason.check(ResponseDone, PotentialDataLoss):
+            digests = {
+                name: hasher.digest() for name, hasher in self._hashers.items()
+            }
+            for name, expected in self._expected:
+                if digests[name] != expected:
+                    reason = Failure(DigestMismatch(name, expected, digests[name]))
+                    break
+            else:
+                self._result = digests
+        if self._result is None:
+            self._result = reason
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            self._fire(waiter)
+        return reason
+
+    def _fire(self, waiter: "Deferred[Dict[str, bytes]]") -> None:
+        if isinstance(self._result, Failure):
+            waiter.errback(self._result)
+        else:
+            waiter.callback(dict(self._result))
+
+    def digests(self) -> "Deferred[Dict[str, bytes]]":
+        """
+        :returns: A `Deferred` that fires with a `dict` mapping each
+            algorithm name to the digest of the body, once the body has been
+            delivered.
+        """
+        d: "Deferred[Dict[str, bytes]]" = Deferred()
+        if self._result is None:
+            self._waiters.append(d)
+        else:
+            self._fire(d)
+        return d
+
+
+def _find_digesting(response: Any) -> Optional[_DigestingResponse]:
+    """
+    Find the `_DigestingResponse` beneath any number of wrapping responses.
+    """
+    while response is not None and not isinstance(response, _DigestingResponse):
+        response = getattr(response, "original", None)
+    return response
+
+
+def _digesting(algorithms: Iterable[str]) -> Callable[[IResponse], IResponse]:
+    """
+    Validate the *digests* argument to a request, returning a callback which
+    wraps the response.
+    """
+    algorithms = list(algorithms)
+    for name in algorithms:
+        _hasher(_normalize(name))
+    return lambda response: _DigestingResponse(response, algorithms)
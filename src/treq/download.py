@@ -0,0 +1,781 @@
+# Copyright (c) The treq Authors.
+# See LICENSE for details.
+"""
+Save response bodies to files without blocking the reactor on disk I/O.
+
+See :func:`treq.download()`.
+"""
+import os
+import re
+import secrets
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from twisted.internet.defer import CancelledError, Deferred, DeferredLock
+from twisted.internet.error import ConnectError, ConnectionLost
+from twisted.internet.interfaces import IReactorTime
+from twisted.internet.protocol import Protocol, connectionDone
+from twisted.internet.task import deferLater
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+from twisted.web.client import (RequestTransmissionFailed, ResponseDone,
+                                ResponseFailed, ResponseNeverReceived)
+from twisted.web.error import Error
+from twisted.web.http import PotentialDataLoss
+from twisted.web.http_headers import Headers
+from twisted.web.iweb import IResponse
+
+_PathType = Union[str, "os.PathLike[str]"]
+
+_CONTENT_RANGE = re.compile(rb"^\s*bytes\s+(\d+)-(\d+)/(\d+)\s*$", re.IGNORECASE)
+
+# A piece being received is only split when at least twice this much of it
+# remains.
+_MIN_STEAL = 256 * 1024
+
+
+class _Destination:
+    """
+    The temporary file a download is written to, which is renamed into
+    place once complete.
+
+    The methods run their I/O in a thread and return a `Deferred`. Opening,
+    committing, and discarding the file are serialized, so that the file
+    isn't discarded while it is still being created.
+    """
+
+    def __init__(
+        self, path: str, fsync: bool, inThread: Callable[..., "Deferred[Any]"]
+    ) -> None:
+        self._path = path
+        self._fsync = fsync
+        self._inThread = inThread
+        self._lock = DeferredLock()
+        self._seekLock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._temporary: Optional[str] = None
+
+    def open(self, size: Optional[int] = None) -> "Deferred[None]":
+        """
+        Create the temporary file, extending it to *size* bytes if given.
+        """
+        return self._lock.run(self._inThread, self._open, size)
+
+    def write(self, offset: int, batch: List[bytes]) -> "Deferred[None]":
+        """
+        Write *batch* to the file, starting at *offset*. Batches for
+        different parts of the file may be written concurrently.
+        """
+        return self._inThread(self._write, offset, batch)
+
+    def commit(self, size: Optional[int] = None) -> "Deferred[None]":
+        """
+        Close the file and rename it to its final path, first truncating it
+        to *size* bytes if given.
+        """
+        return self._lock.run(self._inThread, self._commit, size)
+
+    def discard(self) -> "Deferred[None]":
+        """
+        Close and remove the file, if it was created.
+        """
+        return self._lock.run(self._inThread, self._discard)
+
+    def _open(self, size: Optional[int]) -> None:
+        # Unlike tempfile.mkstemp(), the mode is subject to the umask, as for
+        # any other new file.
+        directory, name = os.path.split(self._path)
+        temporary = os.path.join(
+            directory, ".{}.{}.part".format(name, secrets.token_hex(4))
+        )
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+        self._fd = os.open(temporary, flags, 0o666)
+        self._temporary = temporary
+        if size:
+            os.ftruncate(self._fd, size)
+
+    def _write(self, offset: int, batch: List[bytes]) -> None:
+        assert self._fd is not None
+        for data in batch:
+            view = memoryview(data)
+            while view:
+                if hasattr(os, "pwrite"):
+                    written = os.pwrite(self._fd, view, offset)
+                else:
+                    with self._seekLock:
+                        os.lseek(self._fd, offset, os.SEEK_SET)
+                        written = os.write(self._fd, view)
+                view = view[written:]
+                offset += written
+
+    def _commit(self, size: Optional[int]) -> None:
+        assert self._fd is not None and self._temporary is not None
+        fd, self._fd = self._fd, None
+        try:
+            if size is not None:
+                os.ftruncate(fd, size)
+            if self._fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(self._temporary, self._path)
+        self._temporary = None
+        if self._fsync and hasattr(os, "O_DIRECTORY"):
+            fd = os.open(
+                os.path.dirname(self._path) or ".", os.O_RDONLY | os.O_DIRECTORY
+            )
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _discard(self) -> None:
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            os.close(fd)
+        if self._temporary is not None:
+            temporary, self._temporary = self._temporary, None
+            try:
+                os.remove(temporary)
+            except FileNotFoundError:
+                pass
+
+
+class _DownloadProtocol(Protocol):
+    """
+    Write a response body, or a range of one, to a `_Destination`.
+
+    Body data is queued on the reactor thread and written in batches, one
+    batch at a time. The transport is paused when more than *maxQueued*
+    bytes are waiting to be written and resumed when no more than half that
+    remains.
+
+    :ivar position: The offset in the file of the next byte received.
+    :ivar end: If not `None`, the offset at which the body ends. The body
+        must reach it, and is cut short there if it continues. It may be
+        lowered while the body is being received.
+    :ivar _queued: The number of bytes received but not yet written,
+        including any batch being written.
+    :ivar _busy: Whether a batch is being written.
+    :ivar _reason: Why the body ended, once it has.
+    :ivar _failure: Why the download failed, once it has.
+    """
+
+    def __init__(
+        self,
+        destination: _Destination,
+        offset: int,
+        maxQueued: int,
+        finished: "Deferred[None]",
+        end: Optional[int] = None,
+    ) -> None:
+        self._destination = destination
+        self.position = self._writeOffset = offset
+        self.end = end
+        self._maxQueued = maxQueued
+        self._finished = finished
+        self._queue: Deque[bytes] = deque()
+        self._queued = 0
+        self._paused = False
+        self._complete = False
+        self._cut = False
+        self._reason: Optional[Failure] = None
+        self._failure: Optional[Failure] = None
+        self._busy = False
+        self._settled = False
+
+    def connectionMade(self) -> None:
+        if self._failure is not None:
+            self.transport.stopProducing()  # type: ignore
+
+    def dataReceived(self, data: bytes) -> None:
+        if self._failure is not None or self._complete:
+            return
+        if self.end is not None and self.position + len(data) >= self.end:
+            self._cut = self._cut or self.position + len(data) > self.end
+            data = data[: self.end - self.position]
+            self._complete = True
+        self.position += len(data)
+        self._queue.append(data)
+        self._queued += len(data)
+        if self._complete and self._cut:
+            # The server would send more than is wanted.
+            self.transport.stopProducing()  # type: ignore
+        elif self._queued > self._maxQueued and not self._paused:
+            self._paused = True
+            self.transport.pauseProducing()  # type: ignore
+        self._next()
+
+    def connectionLost(self, reason: Failure = connectionDone) -> None:
+        self._reason = reason
+        self._next()
+
+    @property
+    def written(self) -> int:
+        """
+        The offset up to which the body has been written, once the protocol
+        has finished.
+        """
+        return self._writeOffset
+
+    def truncate(self, end: int) -> None:
+        """
+        Stop at *end*, which must be beyond the current position, rather
+        than at the end of the range that was requested.
+        """
+        assert end > self.position
+        self.end = end
+        self._cut = True
+
+    def _wrote(self, size: int) -> None:
+        self._busy = False
+        self._queued -= size
+        if (
+            self._paused
+            and self._failure is None
+            and not self._complete
+            and self._queued <= self._maxQueued // 2
+        ):
+            self._paused = False
+            self.transport.resumeProducing()  # type: ignore
+        self._next()
+
+    def _writeFailed(self, reason: Failure) -> None:
+        self._busy = False
+        self._fail(reason)
+
+    def _next(self) -> None:
+        """
+        Write the next batch, unless a batch is already being written, or
+        report the outcome once there is nothing left to write.
+        """
+        if self._busy or self._settled:
+            return
+        if self._failure is not None:
+            self._settle(self._failure)
+        elif self._queue:
+            batch: List[bytes] = list(self._queue)
+            self._queue.clear()
+            size = sum(len(data) for data in batch)
+            offset, self._writeOffset = self._writeOffset, self._writeOffset + size
+            self._busy = True
+            self._destination.write(offset, batch).addCallbacks(
+                lambda _: self._wrote(size), self._writeFailed
+            )
+        elif self._complete:
+            self._settle(None)
+        elif self._reason is None:
+            return
+        elif not self._reason.check(ResponseDone, PotentialDataLoss):
+            self._fail(self._reason)
+        elif self.end is not None and self.position < self.end:
+            message = "Range ended at byte {}, expected {}".format(
+                self.position, self.end
+            )
+            self._fail(Failure(Error(206, message.encode("ascii"))))
+        else:
+            self._settle(None)
+
+    def _fail(self, reason: Failure) -> None:
+        """
+        Abandon the body: stop receiving it and, once any write in progress
+        has finished, fail with *reason*.
+        """
+        if self._failure is not None or self._settled:
+            return
+        self._failure = reason
+        self._queue.clear()
+        if self._reason is None and not self._complete and self.transport:
+            self.transport.stopProducing()  # type: ignore
+        self._next()
+
+    def _settle(self, result: Optional[Failure]) -> None:
+        self._settled = True
+        if result is None:
+            self._finished.callback(None)
+        else:
+            self._finished.errback(result)
+
+
+def _fire(d: "Deferred[Any]", result: Any) -> None:
+    """
+    Fire *d* with *result*, unless it has been cancelled already.
+    """
+    if d.called:
+        return
+    if isinstance(result, Failure):
+        d.errback(result)
+    else:
+        d.callback(result)
+
+
+class _Retries:
+    """
+    How many more times, and after what delay, to retry after a connection
+    fails. The delay doubles after each retry.
+    """
+
+    _retryable = (
+        ConnectError,
+        ConnectionLost,
+        RequestTransmissionFailed,
+        ResponseFailed,
+        ResponseNeverReceived,
+    )
+
+    def __init__(self, clock: IReactorTime, retries: int, delay: float) -> None:
+        self.clock = clock
+        self._remaining = retries
+        self._delay = delay
+
+    def next(self, reason: Failure) -> Optional[float]:
+        """
+        :returns: The delay before retrying after *reason*, or `None` if the
+            download should fail.
+        """
+        if self._remaining <= 0 or not reason.check(*self._retryable):
+            return None
+        self._remaining -= 1
+        delay, self._delay = self._delay, self._delay * 2
+        return delay
+
+    def call(
+        self, f: Callable[[], "Deferred[IResponse]"]
+    ) -> "Deferred[IResponse]":
+        """
+        Request a response by calling *f*, and call it again after a delay
+        each time it fails, as long as retries remain.
+
+        :returns: A `Deferred` that fires with the first response, which
+            cancels the attempt in progress when it is cancelled.
+        """
+        attempts: "List[Deferred[Any]]" = []
+        result: "Deferred[IResponse]" = Deferred(lambda _: attempts[-1].cancel())
+
+        def failed(reason: Failure) -> None:
+            delay = None if result.called else self.next(reason)
+            if delay is None:
+                _fire(result, reason)
+            else:
+                attempt(deferLater(self.clock, delay, f))
+
+        def attempt(d: "Deferred[Any]") -> None:
+            attempts.append(d)
+            d.addCallbacks(lambda response: _fire(result, response), failed)
+
+        attempt(f())
+        return result
+
+
+class _Stream:
+    """
+    Write a response body to a `_Destination`. If the connection fails the
+    body is requested again, starting after the bytes already written if
+    the response had a validator for an If-Range header.
+
+    :ivar _offset: The number of bytes written when the last connection
+        failed.
+    :ivar _pending: A `Deferred` for the request in progress, if any.
+    """
+
+    def __init__(
+        self,
+        destination: _Destination,
+        maxQueued: int,
+        get: Callable[[Dict[bytes, bytes]], "Deferred[IResponse]"],
+        retries: _Retries,
+    ) -> None:
+        self._destination = destination
+        self._maxQueued = maxQueued
+        self._get = get
+        self._retries = retries
+        self._offset = 0
+        self._validator: Optional[bytes] = None
+        self._protocol: Optional[_DownloadProtocol] = None
+        self._pending: "Optional[Deferred[Any]]" = None
+        self._cancelled = False
+        self._result: "Deferred[IResponse]" = Deferred(self._cancel)
+
+    def start(self, response: IResponse) -> "Deferred[IResponse]":
+        """
+        Write the body of *response*.
+
+        :returns: A `Deferred` that fires with *response* once the file is in
+            place.
+        """
+        self._first = response
+        self._validator = _validator(response)
+
+        def notOpened(reason: Failure) -> None:
+            response.deliverBody(Protocol())
+            self._discard(reason)
+
+        # The transport is paused until the body is delivered, so nothing is
+        # buffered while the file is created.
+        self._destination.open().addCallbacks(
+            lambda _: self._receive(response, 0), notOpened
+        )
+        return self._result
+
+    def _receive(self, response: IResponse, offset: int) -> None:
+        self._pending = None
+        done: "Deferred[None]" = Deferred()
+        protocol = self._protocol = _DownloadProtocol(
+            self._destination, offset, self._maxQueued, done
+        )
+        if self._cancelled:
+            protocol._fail(Failure(CancelledError()))
+        response.deliverBody(protocol)
+        done.addCallbacks(
+            lambda _: self._commit(protocol.position),
+            lambda reason: self._failed(protocol, reason),
+        )
+
+    def _commit(self, size: int) -> None:
+        self._destination.commit(size).addBoth(
+            lambda committed: _fire(self._result, committed or self._first)
+        )
+
+    def _failed(self, protocol: _DownloadProtocol, reason: Failure) -> None:
+        self._protocol = None
+        if self._validator is not None:
+            self._offset = protocol.written
+        self._retry(reason)
+
+    def _retry(self, reason: Failure) -> None:
+        self._pending = None
+        delay = None if self._cancelled else self._retries.next(reason)
+        if delay is None:
+            self._discard(reason)
+            return
+        offset = self._offset
+        headers = {}
+        if offset:
+            assert self._validator is not None
+            headers[b"range"] = b"bytes=%d-" % (offset,)
+            headers[b"if-range"] = self._validator
+        d = self._pending = deferLater(self._retries.clock, delay, self._get, headers)
+        d.addCallback(self._resumed, offset).addErrback(self._retry)
+
+    def _resumed(self, response: IResponse, offset: int) -> None:
+        contentRange = _parse_content_range(response)
+        if response.code == 206 and contentRange and contentRange[0] == offset:
+            self._receive(response, offset)
+        elif 200 <= response.code < 300 and response.code != 206:
+            # The file changed, or the server ignored the range.
+            self._offset = 0
+            self._receive(response, 0)
+        else:
+            response.deliverBody(Protocol())
+            raise Error(response.code, response.phrase)
+
+    def _discard(self, reason: Failure) -> None:
+        self._destination.discard().addBoth(lambda _: _fire(self._result, reason))
+
+    def _cancel(self, _: "Deferred[IResponse]") -> None:
+        self._cancelled = True
+        if self._pending is not None:
+            self._pending.cancel()
+        if self._protocol is not None:
+            self._protocol._fail(Failure(CancelledError()))
+
+
+class _SegmentedDownload:
+    """
+    Download a file as byte ranges requested over several connections at
+    once, each written directly to its place in the file.
+
+    The file is split into pieces which are fetched in order by up to
+    *segments* requests at a time. Once no pieces remain, a request which
+    finishes early takes over the second half of whichever piece has the
+    most left to receive, so that one slow connection doesn't hold up the
+    end of the download. When a connection fails, the rest of its piece is
+    requested again, as the retry policy allows.
+
+    :ivar _pieces: The ``(start, end)`` offsets of pieces not yet requested.
+    :ivar _active: The protocol for each piece being received, mapped to its
+        request `Deferred`, or `None` once the response has arrived.
+    """
+
+    def __init__(
+        self,
+        requestRange: Callable[[int, int], "Deferred[IResponse]"],
+        destination: _Destination,
+        total: int,
+        pieces: Deque[Tuple[int, int]],
+        segments: int,
+        maxQueued: int,
+        retries: _Retries,
+    ) -> None:
+        self._requestRange = requestRange
+        self._destination = destination
+        self._total = total
+        self._pieces = pieces
+        self._segments = segments
+        self._maxQueued = maxQueued
+        self._retries = retries
+        self._active: "Dict[_DownloadProtocol, Optional[Deferred[Any]]]" = {}
+        self._failure: Optional[Failure] = None
+        self._result: "Deferred[None]" = Deferred(
+            lambda _: self._abort(Failure(CancelledError()))
+        )
+
+    def start(self, first: IResponse, end: int) -> "Deferred[None]":
+        """
+        Write the body of *first*, which holds the bytes before *end*, and
+        fetch the remaining pieces.
+
+        :returns: A `Deferred` that fires once the file is in place.
+        """
+        protocol = self._track(0, end)
+        self._active[protocol] = None
+        first.deliverBody(protocol)
+        for _ in range(self._segments - 1):
+            self._startNext()
+        return self._result
+
+    def _track(self, start: int, end: int) -> _DownloadProtocol:
+        done: "Deferred[None]" = Deferred()
+        protocol = _DownloadProtocol(
+            self._destination, start, self._maxQueued, done, end
+        )
+        done.addCallbacks(
+            lambda _: self._pieceDone(protocol),
+            lambda reason: self._pieceFailed(protocol, reason),
+        )
+        done.addBoth(lambda _: self._untrack(protocol))
+        return protocol
+
+    def _untrack(self, protocol: _DownloadProtocol) -> None:
+        self._active.pop(protocol, None)
+        if self._failure is not None and not self._active:
+            failure = self._failure
+            self._destination.discard().addBoth(
+                lambda _: _fire(self._result, failure)
+            )
+
+    def _pieceDone(self, protocol: _DownloadProtocol) -> None:
+        self._active.pop(protocol, None)
+        self._startNext()
+
+    def _pieceFailed(self, protocol: _DownloadProtocol, reason: Failure) -> None:
+        delay = None if self._failure is not None else self._retries.next(reason)
+        if delay is None:
+            self._abort(reason)
+            return
+        assert protocol.end is not None
+        self._active.pop(protocol, None)
+        self._fetch(protocol.written, protocol.end, delay)
+
+    def _startNext(self) -> None:
+        if self._failure is not None:
+            return
+        piece = self._take()
+        if piece is None:
+            if not self._active:
+                self._destination.commit().addBoth(
+                    lambda outcome: _fire(self._result, outcome)
+                )
+            return
+        start, end = piece
+        self._fetch(start, end, 0)
+
+    def _fetch(self, start: int, end: int, delay: float) -> None:
+        """
+        Request the bytes from *start* to *end* after *delay* seconds.
+        """
+        protocol = self._track(start, end)
+        d: "Deferred[Any]"
+        if delay:
+            d = deferLater(self._retries.clock, delay, self._requestRange, start, end)
+        else:
+            d = self._requestRange(start, end)
+        self._active[protocol] = d
+
+        def gotRange(response: IResponse) -> None:
+            self._active[protocol] = None
+            contentRange = _parse_content_range(response)
+            if (
+                response.code != 206
+                or contentRange is None
+                or contentRange[0] != start
+                or contentRange[2] != self._total
+            ):
+                response.deliverBody(Protocol())
+                message = "Expected bytes {}-{}/{}".format(
+                    start, end - 1, self._total
+                )
+                raise Error(response.code, message.encode("ascii"))
+            response.deliverBody(protocol)
+
+        d.addCallback(gotRange).addErrback(protocol._fail)
+
+    def _take(self) -> Optional[Tuple[int, int]]:
+        """
+        Choose the next piece to fetch: the next in order, or the second
+        half of the remainder of the piece with the most left to receive.
+        """
+        if self._pieces:
+            return self._pieces.popleft()
+        remaining = {
+            protocol: protocol.end - protocol.position
+            for protocol in self._active
+            if protocol.end is not None
+        }
+        if not remaining:
+            return None
+        slowest = max(remaining, key=remaining.__getitem__)
+        if remaining[slowest] < 2 * _MIN_STEAL:
+            return None
+        assert slowest.end is not None
+        split = slowest.position + remaining[slowest] // 2
+        end = slowest.end
+        slowest.truncate(split)
+        return split, end
+
+    def _abort(self, reason: Failure) -> None:
+        """
+        Stop every request, then remove the file and fail.
+        """
+        if self._failure is not None:
+            return
+        self._failure = reason
+        self._pieces.clear()
+        for protocol, request in list(self._active.items()):
+            if request is not None:
+                request.cancel()
+            protocol._fail(reason)
+
+
+def _parse_content_range(response: IResponse) -> Optional[Tuple[int, int, int]]:
+    """
+    Parse the Content-Range header of a 206 response.
+
+    :returns: The first offset, the offset after the last, and the complete
+        length, or `None` if the header is missing or malformed.
+    """
+    match = _CONTENT_RANGE.match(
+        (response.headers.getRawHeaders(b"content-range") or [b""])[-1]
+    )
+    if match is None:
+        return None
+    return int(match[1]), int(match[2]) + 1, int(match[3])
+
+
+def _validator(response: IResponse) -> Optional[bytes]:
+    """
+    Find a validator for an If-Range header: a strong entity tag, or the
+    modification date.
+    """
+    for name in (b"etag", b"last-modified"):
+        values = response.headers.getRawHeaders(name)
+        if values and not values[-1].startswith(b"W/"):
+            value: bytes = values[-1]
+            return value
+    return None
+
+
+def _threads(
+    reactor: Any, threadpool: Optional[ThreadPool]
+) -> Callable[..., "Deferred[Any]"]:
+    if threadpool is None:
+        threadpool = reactor.getThreadPool()
+
+    def inThread(f: Callable[..., Any], *args: Any) -> "Deferred[Any]":
+        return deferToThreadPool(reactor, threadpool, f, *args)
+
+    return inThread
+
+
+def _download(
+    request: Callable[..., "Deferred[Any]"],
+    url: Any,
+    path: _PathType,
+    fsync: bool,
+    max_queued: int,
+    threadpool: Optional[ThreadPool],
+    segments: int,
+    segment_size: int,
+    retries: int,
+    retry_delay: float,
+    kwargs: Dict[str, Any],
+) -> "Deferred[Any]":
+    """
+    Implement `treq.client.HTTPClient.download()`.
+
+    :param request: `treq.client.HTTPClient.request()`.
+    :param kwargs: Other arguments for *request*, with *headers* converted
+        to `Headers`.
+    """
+    if segments < 1:
+        raise ValueError("segments must be at least 1")
+    if segments > 1 and kwargs.get("digests") is not None:
+        raise ValueError("Digests can't be computed for a segmented download")
+    kwargs = dict(kwargs, unbuffered=True)
+    headers: Headers = kwargs.pop("headers")
+    reactor: Any = kwargs.get("reactor")
+    if reactor is None:
+        from twisted.internet import reactor
+    destination = _Destination(os.fspath(path), fsync, _threads(reactor, threadpool))
+    policy = _Retries(reactor, retries, retry_delay)
+
+    def get(extra: Dict[bytes, bytes]) -> "Deferred[IResponse]":
+        h = headers.copy()
+        for name, value in extra.items():
+            h.setRawHeaders(name, [value])
+        return request("GET", url, headers=h, **kwargs)
+
+    def stream(response: IResponse) -> "Deferred[IResponse]":
+        if not 200 <= response.code < 300:
+            response.deliverBody(Protocol())
+            raise Error(response.code, response.phrase)
+        return _Stream(destination, max_queued, get, policy).start(response)
+
+    def first(extra: Dict[bytes, bytes]) -> "Deferred[IResponse]":
+        return policy.call(lambda: get(extra))
+
+    if segments == 1:
+        return first({}).addCallback(stream)
+
+    def probed(response: IResponse) -> "Deferred[IResponse]":
+        if response.code == 416:
+            # An empty file has no range to request.
+            response.deliverBody(Protocol())
+            return first({}).addCallback(stream)
+        contentRange = _parse_content_range(response)
+        if response.code != 206 or contentRange is None or contentRange[0] != 0:
+            return stream(response)
+        _, end, total = contentRange
+        extra: Dict[bytes, bytes] = {}
+        validator = _validator(response)
+        if validator is not None:
+            extra[b"if-range"] = validator
+
+        def requestRange(start: int, end: int) -> "Deferred[IResponse]":
+            return get({**extra, b"range": b"bytes=%d-%d" % (start, end - 1)})
+
+        segmented = _SegmentedDownload(
+            requestRange,
+            destination,
+            total,
+            deque(
+                (start, min(start + segment_size, total))
+                for start in range(end, total, segment_size)
+            ),
+            segments,
+            max_queued,
+            policy,
+        )
+
+        def notOpened(reason: Failure) -> "Deferred[Failure]":
+            response.deliverBody(Protocol())
+            return destination.discard().addBoth(lambda _: reason)
+
+        d = destination.open(total)
+        d.addErrback(notOpened)
+        d.addCallback(lambda _: segmented.start(response, end))
+        return d.addCallback(lambda _: response)
+
+    return first({b"range": b"bytes=0-%d" % (segment_size - 1,)}).addCallback(probed)
@@ -19,7 +19,6 @@ from treq._types import _S, _FilesType, _FileValue
 CRLF = b"\r\n"
 
 
-_Consumer: TypeAlias = "Union[IConsumer, _LengthConsumer]"
 _UnknownLength = Literal["'twisted.web.iweb.UNKNOWN_LENGTH'"]
 _Length: TypeAlias = Union[int, _UnknownLength]
 _FieldValue = Union[bytes, Tuple[str, str, IBodyProducer]]
@@ -58,12 +57,25 @@ class MultiPartProducer:
     :ivar _cooperate: A method like `Cooperator.cooperate` which is used to
         schedule all reads.
 
+    :ivar _headers: The encoded boundary and headers which begin the part
+        for each field, encoded once and used both to calculate the length
+        and to write the body.
+
+    :ivar _nextFiles: The producer of the first file from each index of
+        `_fields` onward, if any.
+
+    :ivar _prefetched: The producer of the next file, if it has a
+        ``prefetch()`` method (like
+        :class:`~treq.producers.ThreadedFileProducer`) which has been called
+        so that it reads ahead while the current file is written.
+
     :ivar boundary: The generated boundary used in form-data encoding
     """
 
     length: _Length
     boundary: bytes
     _currentProducer: Optional[IBodyProducer] = None
+    _prefetched: Optional[IBodyProducer] = None
     _task: Optional[task.CooperativeTask] = None
 
     def __init__(
@@ -81,6 +93,16 @@ class MultiPartProducer:
             boundary = boundary.encode("ascii")
         self.boundary = boundary
 
+        self._headers = [
+            self._encodeHeaders(index, name, value)
+            for index, (name, value) in enumerate(self._fields)
+        ]
+        self._nextFiles: List[Optional[IBodyProducer]] = [None]
+        for name, value in reversed(self._fields):
+            self._nextFiles.append(
+                self._nextFiles[-1] if isinstance(value, bytes) else value[2]
+            )
+        self._nextFiles.reverse()
         self.length = self._calculateLength()
 
     def startProducing(self, consumer: IConsumer) -> "Deferred[None]":
@@ -91,7 +113,7 @@ class MultiPartProducer:
 
         :param consumer: Any `IConsumer` provider
         """
-        self._task = self._cooperate(self._writeLoop(consumer))  # type: ignore
+        self._task = self._cooperate(self._writeLoop(consumer))
         # whenDone returns the iterator that was passed to cooperate, so who
         # cares what type it has? It's an edge signal; we ignore its value.
         d: "Deferred[Any]" = self._task.whenDone()
@@ -111,6 +133,8 @@ class MultiPartProducer:
         assert self._task is not None
         if self._currentProducer:
             self._currentProducer.stopProducing()
+        if self._prefetched and self._prefetched is not self._currentProducer:
+            self._prefetched.stopProducing()
         self._task.stop()
 
     def pauseProducing(self) -> None:
@@ -144,15 +168,21 @@ class MultiPartProducer:
 
     def _calculateLength(self) -> _Length:
         """
-        Determine how many bytes the overall form post would consume.
-        The easiest way is to calculate is to generate of `fObj`
-        (assuming it is not modified from this point on).
-        If the determination cannot be made, return `UNKNOWN_LENGTH`.
+        Add up the lengths of the encoded headers, the values of the fields,
+        and the final boundary, assuming the producers of the files aren't
+        modified from this point on. If the length of a file is unknown,
+        return `UNKNOWN_LENGTH`.
         """
-        consumer = _LengthConsumer()
-        for i in list(self._writeLoop(consumer)):
-            pass
-        return consumer.length
+        length = len(CRLF + self._getBoundary(final=True) + CRLF)
+        for headers, (name, value) in zip(self._headers, self._fields):
+            length += len(headers)
+            if isinstance(value, bytes):
+                length += len(value)
+            elif value[2].length == UNKNOWN_LENGTH:
+                return cast(_UnknownLength, UNKNOWN_LENGTH)
+            else:
+                length += value[2].length
+        return length
 
     def _getBoundary(self, final: bool = False) -> bytes:
         """
@@ -164,83 +194,86 @@ class MultiPartProducer:
         f = b"--" if final else b""
         return b"--" + self.boundary + f
 
-    def _writeLoop(self, consumer: _Consumer) -> Iterable[Optional[Deferred]]:
+    def _encodeHeaders(self, index: int, name: str, value: _FieldValue) -> bytes:
+        """
+        Encode the boundary which begins the part for a field and the part's
+        headers, up to the blank line which ends them.
+        """
+        # We don't write the CRLF of the first boundary:
+        # HTTP request headers are already separated with CRLF
+        # from the request body, another newline is possible
+        # and should be considered as an empty preamble per rfc2046,
+        # but is generally confusing, so we omit it when generating
+        # the request. We don't write Content-Type: multipart/form-data
+        # header here as well as it's defined in the context of the HTTP
+        # request headers, not the producer, so we gust generate
+        # the body.
+
+        # It's also important to note that the boundary in the message
+        # is defined not only by "--boundary-value" but
+        # but with CRLF characters before it and after the line.
+        # This is very important.
+        # proper boundary is "CRLF--boundary-valueCRLF"
+        cdisp = _Header(b"Content-Disposition", b"form-data")
+        cdisp.add_param(b"name", name)
+        headers = [cdisp]
+        if not isinstance(value, bytes):
+            filename, content_type, producer = value
+            if filename:
+                cdisp.add_param(b"filename", filename)
+            headers.append(_Header(b"Content-Type", content_type))
+            if producer.length != UNKNOWN_LENGTH:
+                headers.append(_Header(b"Content-Length", str(producer.length)))
+        return b"".join(
+            [CRLF if index != 0 else b"", self._getBoundary(), CRLF]
+            + [bytes(header) + CRLF for header in headers]
+            + [CRLF]
+        )
+
+    def _writeLoop(self, consumer: IConsumer) -> Iterable[Optional[Deferred]]:
         """
         Return an iterator which generates the multipart/form-data
         request including the encoded objects
         and writes them to the consumer for each time it is iterated.
         """
         for index, (name, value) in enumerate(self._fields):
-            # We don't write the CRLF of the first boundary:
-            # HTTP request headers are already separated with CRLF
-            # from the request body, another newline is possible
-            # and should be considered as an empty preamble per rfc2046,
-            # but is generally confusing, so we omit it when generating
-            # the request. We don't write Content-Type: multipart/form-data
-            # header here as well as it's defined in the context of the HTTP
-            # request headers, not the producer, so we gust generate
-            # the body.
-
-            # It's also important to note that the boundary in the message
-            # is defined not only by "--boundary-value" but
-            # but with CRLF characters before it and after the line.
-            # This is very important.
-            # proper boundary is "CRLF--boundary-valueCRLF"
-            consumer.write((CRLF if index != 0 else b"") + self._getBoundary() + CRLF)
-            yield self._writeField(name, value, consumer)
+            consumer.write(self._headers[index])
+            self._prefetch(index + 1)
+            yield self._writeField(value, consumer)
 
         consumer.write(CRLF + self._getBoundary(final=True) + CRLF)
 
+    def _prefetch(self, index: int) -> None:
+        """
+        Let the producer of the first file from *index* onward start reading
+        ahead, if it can.
+        """
+        self._prefetched = None
+        producer = self._nextFiles[index]
+        prefetch = getattr(producer, "prefetch", None)
+        if prefetch is not None:
+            prefetch()
+            self._prefetched = producer
+
     def _writeField(
-        self, name: str, value: _FieldValue, consumer: _Consumer
-    ) -> Optional[Deferred]:
+        self, value: _FieldValue, consumer: IConsumer
+    ) -> "Optional[Deferred[None]]":
         if isinstance(value, bytes):
-            self._writeString(name, value, consumer)
+            # An empty write would end a chunked body.
+            if value:
+                consumer.write(value)
+            self._currentProducer = None
             return None
-        else:
-            filename, content_type, producer = value
-            return self._writeFile(name, filename, content_type, producer, consumer)
-
-    def _writeString(self, name: str, value: bytes, consumer: _Consumer) -> None:
-        cdisp = _Header(b"Content-Disposition", b"form-data")
-        cdisp.add_param(b"name", name)
-        consumer.write(bytes(cdisp) + CRLF + CRLF)
-        consumer.write(value)
-        self._currentProducer = None
 
-    def _writeFile(
-        self,
-        name: str,
-        filename: str,
-        content_type: str,
-        producer: IBodyProducer,
-        consumer: _Consumer,
-    ) -> "Optional[Deferred[None]]":
-        cdisp = _Header(b"Content-Disposition", b"form-data")
-        cdisp.add_param(b"name", name)
-        if filename:
-            cdisp.add_param(b"filename", filename)
-
-        consumer.write(bytes(cdisp) + CRLF)
-        consumer.write(bytes(_Header(b"Content-Type", content_type)) + CRLF)
-        if producer.length != UNKNOWN_LENGTH:
-            consumer.write(
-                bytes(_Header(b"Content-Length", str(producer.length))) + CRLF
-            )
-        consumer.write(CRLF)
+        producer = value[2]
+        self._currentProducer = producer
 
-        if isinstance(consumer, _LengthConsumer):
-            consumer.write(producer.length)
-            return None
-        else:
-            self._currentProducer = producer
+        def unset(val):
+            self._currentProducer = None
+            return val
 
-            def unset(val):
-                self._currentProducer = None
-                return val
-
-            d = producer.startProducing(consumer)
-            return cast("Deferred[None]", d.addCallback(unset))
+        d = producer.startProducing(consumer)
+        return cast("Deferred[None]", d.addCallback(unset))
 
 
 def _escape(value: Union[str, bytes]) -> str:
@@ -316,40 +349,6 @@ def _converted(fields: _FilesType) -> Iterable[_Field]:
             )
 
 
-class _LengthConsumer:
-    """
-    `_LengthConsumer` is used to calculate the length of the multi-part
-    request. The easiest way to do that is to consume all the fields,
-    but instead writing them to the string just accumulate the request
-    length.
-
-    :ivar length: The length of the request. Can be `UNKNOWN_LENGTH`
-        if consumer finds the field that has length that can not be calculated
-
-    """
-
-    length: _Length
-
-    def __init__(self) -> None:
-        self.length = 0
-
-    def write(self, value: Union[bytes, _Length]) -> None:
-        # this means that we have encountered
-        # unknown length producer
-        # so we need to stop attempts calculating
-        if self.length == UNKNOWN_LENGTH:
-            return
-        assert isinstance(self.length, int)
-
-        if value == UNKNOWN_LENGTH:
-            self.length = cast(_UnknownLength, UNKNOWN_LENGTH)
-        elif isinstance(value, int):
-            self.length += value
-        else:
-            assert isinstance(value, bytes)
-            self.length += len(value)
-
-
 class _Header:
     """
     `_Header` This class is a tiny wrapper that produces
@@ -0,0 +1,1173 @@
+# Copyright (c) The treq Authors.
+# See LICENSE for details.
+"""
+Request body producers for kinds of data which
+:class:`~twisted.web.client.FileBodyProducer` handles inefficiently.
+"""
+import json
+import mmap
+import os
+import zlib
+from collections import abc, deque
+from functools import partial
+from tempfile import SpooledTemporaryFile
+from typing import (IO, Any, AsyncIterable, AsyncIterator, Deque, Iterable,
+                    Iterator, List, Optional, Tuple, Union, cast)
+
+from twisted.internet import task
+from twisted.internet.defer import Deferred, fail, succeed
+from twisted.internet.interfaces import IConsumer
+from twisted.logger import Logger
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+from twisted.web.iweb import UNKNOWN_LENGTH, IBodyProducer
+from zope.interface import implementer
+
+from treq.codec import _optional
+from treq.download import _threads
+
+zstandard = _optional("zstandard")
+
+_BytesLike = Union[bytes, bytearray, memoryview]
+
+_CHUNK_SIZE = 2**16
+
+# How much of a body ReplayableProducer spools in memory, and in all.
+_SPOOL_MEMORY = 2**20
+_MAX_SPOOL = 2**26
+
+# JSONProducer encodes containers with more items than this item by item,
+# and smaller ones (and runs of this many items) with one call to the
+# encoder, which is much faster.
+_JSON_STREAM_ITEMS = 1024
+
+
+@implementer(IBodyProducer)
+class BytesProducer:
+    """
+    Produce a request body held in memory by writing it all at once.
+
+    Unlike :class:`~twisted.web.client.FileBodyProducer` this doesn't
+    schedule any work with a cooperator: the body is written as soon as the
+    request is, and the returned `Deferred` has already fired.
+
+    Twisted transports only accept `bytes`, so a `bytearray` or
+    `memoryview` is held without copying until the body is written, and
+    copied then.
+
+    :param data: The body.
+    """
+
+    def __init__(self, data: _BytesLike) -> None:
+        self._data = data
+        self.length = memoryview(data).nbytes
+
+    def startProducing(self, consumer: IConsumer) -> "Deferred[None]":
+        data = self._data
+        if not isinstance(data, bytes):
+            data = memoryview(data).tobytes()
+        if data:
+            consumer.write(data)
+        return succeed(None)
+
+    def pauseProducing(self) -> None:
+        """
+        Do nothing, as the body has already been written.
+        """
+
+    def resumeProducing(self) -> None:
+        """
+        Do nothing, as the body has already been written.
+        """
+
+    def stopProducing(self) -> None:
+        """
+        Do nothing, as the body has already been written.
+        """
+
+
+@implementer(IBodyProducer)
+class BufferProducer:
+    """
+    Produce a request body from any object supporting the buffer protocol,
+    like a `bytearray`, `memoryview`, :class:`mmap.mmap`, or
+    :class:`array.array`, in chunks.
+
+    Chunks are written in a loop until the consumer pauses the producer,
+    and the rest once it is resumed. The buffer is never copied as a whole:
+    Twisted transports only accept `bytes`, so each chunk is copied as it is
+    written, and memory use beyond the buffer itself is bounded by the
+    chunk size and the transport's write buffer.
+
+    The buffer must not be modified until the body has been written or
+    production stopped, and until then it can't be resized, nor an
+    :class:`~mmap.mmap` closed.
+
+    :param data: The body.
+    :param chunk_size: The greatest number of bytes written at once.
+    """
+
+    def __init__(self, data: Any, chunk_size: int = _CHUNK_SIZE) -> None:
+        self._view = memoryview(data).cast("B")
+        self.length = self._view.nbytes
+        self._chunkSize = chunk_size
+        self._offset = 0
+        self._consumer: Optional[IConsumer] = None
+        self._finished: Optional["Deferred[None]"] = None
+        self._paused = False
+        self._writing = False
+
+    def startProducing(self, consumer: IConsumer) -> "Deferred[None]":
+        self._consumer = consumer
+        self._finished = Deferred()
+        self._produce()
+        return self._finished
+
+    def _produce(self) -> None:
+        # A write may pause the producer and the consumer may resume it
+        # before the write returns, so this mustn't be reentered.
+        if self._writing:
+            return
+        self._writing = True
+        try:
+            while not self._paused and self._consumer is not None:
+                if self._offset < self.length:
+                    end = self._offset + self._chunkSize
+                    chunk = self._view[self._offset : end].tobytes()
+                    self._offset = end
+                    self._consumer.write(chunk)
+                if self._offset >= self.length and self._consumer is not None:
+                    self._consumer = None
+                    self._release()
+                    assert self._finished is not None
+                    self._finished.callback(None)
+        finally:
+            self._writing = False
+
+    def pauseProducing(self) -> None:
+        self._paused = True
+
+    def resumeProducing(self) -> None:
+        self._paused = False
+        self._produce()
+
+    def stopProducing(self) -> None:
+        """
+        Stop writing the body. As with
+        :class:`~twisted.web.client.FileBodyProducer`, the `Deferred`
+        returned by `startProducing` then never fires.
+        """
+        self._consumer = None
+        self._release()
+
+    def _release(self) -> None:
+        """
+        Release the buffer once it won't be written any more.
+        """
+        self._view.release()
+
+
+@implementer(IBodyProducer)
+class FileProducer(BufferProducer):
+    """
+    Produce a request body from the current position to the end of a
+    regular file, by mapping the file into memory.
+
+    This writes the file as :class:`BufferProducer` writes a buffer, without
+    reading it through the file object or scheduling work with a
+    cooperator. The chunk size adapts to the consumer: each time it pauses
+    the producer, subsequent chunks are made as large as the amount it
+    accepted, up to *max_chunk_size*, so that a transport with a large
+    write buffer is filled with fewer writes.
+
+    The file is closed once the body has been written or production
+    stopped, as by :class:`~twisted.web.client.FileBodyProducer`.
+
+    Files passed as request bodies are read by
+    :class:`~twisted.web.client.FileBodyProducer` unless wrapped in this
+    class, as mapping one has costs that only the caller can weigh. Pages
+    of the file are read from storage as they are written, blocking the
+    reactor while they are, so the file should be on fast local storage or
+    already cached. If the file is truncated before the body has been
+    written the process is killed by ``SIGBUS``.
+
+    :param file: A file opened for reading in binary mode, which must be a
+        regular file with a descriptor. Its contents must not change until
+        the body has been written.
+    :param chunk_size: The initial number of bytes written at once.
+    :param max_chunk_size: The greatest number of bytes written at once.
+
+    :raises ValueError: if the file is empty, since an empty file can't be
+        mapped.
+    :raises OSError: if the file can't be mapped.
+    """
+
+    def __init__(
+        self,
+        file: IO[bytes],
+        chunk_size: int = _CHUNK_SIZE,
+        max_chunk_size: int = 16 * _CHUNK_SIZE,
+    ) -> None:
+        self._file = file
+        self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        start = min(file.tell(), len(self._mmap))
+        with memoryview(self._mmap) as view:
+            super().__init__(view[start:], chunk_size)
+        self._maxChunkSize = max_chunk_size
+        self._resumedAt = 0
+
+    def pauseProducing(self) -> None:
+        super().pauseProducing()
+        accepted = self._offset - self._resumedAt
+        if accepted > self._chunkSize:
+            self._chunkSize = min(accepted, self._maxChunkSize)
+
+    def resumeProducing(self) -> None:
+        self._resumedAt = self._offset
+        super().resumeProducing()
+
+    def _release(self) -> None:
+        super()._release()
+        self._mmap.close()
+        self._file.close()
+
+
+@implementer(IBodyProducer)
+class ThreadedFileProducer:
+    """
+    Produce a request body from the current position to the end of a file,
+    reading it in a thread.
+
+    :class:`~twisted.web.client.FileBodyProducer` and :class:`FileProducer`
+    read on the reactor thread, so a file on slow storage, like a network
+    file system, stalls everything else the process is doing. This reads
+    chunks in a thread pool while earlier chunks are written, holding at
+    most two chunks at once, either waiting to be written or being read.
+    Reading continues while the producer is paused until both are full.
+
+    Reading can begin before the body is written by calling
+    :meth:`prefetch`, which :class:`~treq.multipart.MultiPartProducer` does
+    for the next file while it writes the current one.
+
+    The file is closed once the body has been written or production
+    stopped, as by :class:`~twisted.web.client.FileBodyProducer`.
+
+    :param file: A file opened for reading in binary mode. If it is
+        seekable, its length is found by seeking to its end and back.
+    :param reactor: The reactor, by default the global reactor.
+    :param threadpool: The thread pool to read from, by default the
+        reactor's thread pool.
+    :param chunk_size: The number of bytes read at once.
+    """
+
+    def __init__(
+        self,
+        file: IO[bytes],
+        *,
+        reactor: Any = None,
+        threadpool: Optional[ThreadPool] = None,
+        chunk_size: int = _CHUNK_SIZE,
+    ) -> None:
+        if reactor is None:
+            from twisted.internet import reactor
+        self._file = file
+        self._inThread = _threads(reactor, threadpool)
+        self._chunkSize = chunk_size
+        self.length = self._determineLength(file)
+        self._chunks: Deque[bytes] = deque()
+        self._reading = False
+        self._eof = False
+        self._consumer: Optional[IConsumer] = None
+        self._finished: Optional["Deferred[None]"] = None
+        self._paused = False
+        self._stopped = False
+        self._failure: Optional[Failure] = None
+
+    def _determineLength(self, file: IO[bytes]) -> Any:
+        try:
+            start = file.tell()
+            end = file.seek(0, os.SEEK_END)
+            file.seek(start, os.SEEK_SET)
+        except (AttributeError, OSError, ValueError):
+            return UNKNOWN_LENGTH
+        return max(end - start, 0)
+
+    def prefetch(self) -> None:
+        """
+        Start reading the file, if it hasn't started already.
+        """
+        self._read()
+
+    def startProducing(self, consumer: IConsumer) -> "Deferred[None]":
+        self._consumer = consumer
+        self._finished = Deferred()
+        if self._failure is not None:
+            # Prefetching failed.
+            self._finished.errback(self._failure)
+            return self._finished
+        self._write()
+        self._read()
+        return self._finished
+
+    def pauseProducing(self) -> None:
+        self._paused = True
+
+    def resumeProducing(self) -> None:
+        self._paused = False
+        self._write()
+        self._read()
+
+    def stopProducing(self) -> None:
+        """
+        Stop writing the body. As with
+        :class:`~twisted.web.client.FileBodyProducer`, the `Deferred`
+        returned by `startProducing` then never fires.
+        """
+        self._stopped = True
+        self._consumer = None
+        self._chunks.clear()
+        if not self._reading:
+            self._close()
+
+    def _read(self) -> None:
+        if self._reading or self._eof or self._stopped or len(self._chunks) >= 2:
+            return
+        self._reading = True
+        self._inThread(self._file.read, self._chunkSize).addCallbacks(
+            self._readDone, self._readFailed
+        )
+
+    def _readDone(self, chunk: bytes) -> None:
+        self._reading = False
+        if self._stopped:
+            self._close()
+            return
+        if chunk:
+            self._chunks.append(chunk)
+        else:
+            self._eof = True
+        self._write()
+        self._read()
+
+    def _readFailed(self, reason: Failure) -> None:
+        self._reading = False
+        if self._stopped:
+            self._close()
+            return
+        self._stopped = True
+        self._consumer = None
+        self._chunks.clear()
+        self._close()
+        if self._finished is None:
+            self._failure = reason
+        else:
+            self._finished.errback(reason)
+
+    def _write(self) -> None:
+        while self._consumer is not None and self._chunks and not self._paused:
+            self._consumer.write(self._chunks.popleft())
+        if self._consumer is not None and self._eof and not self._chunks:
+            self._consumer = None
+            self._stopped = True
+            self._close()
+            assert self._finished is not None
+            self._finished.callback(None)
+
+    def _close(self) -> None:
+        self._inThread(self._file.close)
+
+
+@implementer(IBodyProducer)
+class IterableProducer:
+    """
+    Produce a request body from an iterable of `bytes` chunks, like a
+    generator, which is sent with chunked transfer encoding.
+
+    As by :class:`~twisted.web.client.FileBodyProducer`, chunks are taken
+    from the iterable and written by a cooperative task, which is paused
+    while the consumer is. Empty chunks are skipped. When production is
+    stopped, as it is when the request is cancelled, the iterator's
+    ``close()`` method is called if it has one, so that a generator's
+    ``finally`` blocks run.
+
+    Generators are adapted to `IBodyProducer` with this class, so they may
+    be passed as the *data* argument of a request.
+
+    :param iterable: The chunks of the body.
+    :param cooperator: The `Cooperator` which schedules the task.
+    """
+
+    def __init__(
+        self,
+        iterable: Iterable[_BytesLike],
+        cooperator: task.Cooperator = cast(task.Cooperator, task),
+    ) -> None:
+        self._iterator: Iterator[_BytesLike] = iter(iterable)
+        self._cooperate = cooperator.cooperate
+        self.length = UNKNOWN_LENGTH
+        self._task: Optional[task.CooperativeTask] = None
+
+    def startProducing(self, consumer: IConsumer) -> "Deferred[None]":
+        self._task = self._cooperate(self._writeLoop(consumer))
+        d: "Deferred[Any]" = self._task.whenDone()
+
+        def maybeStopped(reason: Failure) -> "Deferred[None]":
+            reason.trap(task.TaskStopped)
+            return Deferred()
+
+        return d.addCallbacks(lambda ignored: None, maybeStopped)
+
+    def _writeLoop(self, consumer: IConsumer) -> Iterator[None]:
+        for chunk in self._iterator:
+            if chunk:
+                consumer.write(bytes(chunk))
+                yield None
+
+    def pauseProducing(self) -> None:
+        assert self._task is not None
+        self._task.pause()
+
+    def resumeProducing(self) -> None:
+        assert self._task is not None
+        self._task.resume()
+
+    def stopProducing(self) -> None:
+        """
+        Stop the task, and close the iterator. The `Deferred` returned by
+        `startProducing` then never fires.
+        """
+        close = getattr(self._iterator, "close", None)
+        if self._task is not None:
+            try:
+                self._task.stop()
+            except task.TaskFinished:
+                pass
+        if close is not None:
+            close()
+
+
+@implementer(IBodyProducer)
+class AsyncIterableProducer:
+    """
+    Produce a request body from an asynchronous iterable of `bytes`
+    chunks, like an async generator, which is sent with chunked transfer
+    encoding.
+
+    The next chunk is awaited once the previous one has been written,
+    unless the consumer has paused the producer, in which case it is
+    awaited once the producer is resumed. Empty chunks are skipped. The
+    iterator is driven by :meth:`Deferred.fromCoroutine
+    <twisted.internet.defer.Deferred.fromCoroutine>`, so it may await a
+    `Deferred`. When production is stopped, as it is when the request is
+    cancelled, the `Deferred` being awaited is cancelled and the iterator's
+    ``aclose()`` method is called if it has one.
+
+    Async generators are adapted to `IBodyProducer` with this class, so they
+    may be passed as the *data* argument of a request.
+
+    :param iterable: The chunks of the body.
+    """
+
+    _log = Logger()
+
+    def __init__(self, iterable: AsyncIterable[_BytesLike]) -> None:
+        self._iterator: AsyncIterator[_BytesLike] = iterable.__aiter__()
+        self.length = UNKNOWN_LENGTH
+        self._consumer: Optional[IConsumer] = None
+        self._finished: Optional["Deferred[None]"] = None
+        self._pending: Optional["Deferred[Optional[_BytesLike]]"] = None
+        self._paused = False
+        self._looping = False
+
+    def startProducing(self, consumer: IConsumer) -> "Deferred[None]":
+        self._consumer = consumer
+        self._finished = Deferred()
+        self._next()
+        return self._finished
+
+    async def _anext(self) -> Optional[_BytesLike]:
+        try:
+            return await self._iterator.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def _next(self) -> None:
+        # A chunk which is available immediately is received before
+        # Deferred.fromCoroutine returns, so chunks are taken in a loop
+        # rather than by recursion.
+        if self._looping:
+            return
+        self._looping = True
+        try:
+            while (
+                self._consumer is not None
+                and not self._paused
+                and self._pending is None
+            ):
+                d = Deferred.fromCoroutine(self._anext())
+                self._pending = d
+                d.addCallbacks(self._received, self._failed)
+        finally:
+            self._looping = False
+
+    def _received(self, chunk: Optional[_BytesLike]) -> None:
+        self._pending = None
+        if self._consumer is None:
+            return
+        if chunk is None:
+            self._consumer = None
+            assert self._finished is not None
+            self._finished.callback(None)
+            return
+        if chunk:
+            self._consumer.write(bytes(chunk))
+        self._next()
+
+    def _failed(self, reason: Failure) -> None:
+        self._pending = None
+        if self._consumer is None:
+            # Production was stopped.
+            return
+        self._consumer = None
+        assert self._finished is not None
+        self._finished.errback(reason)
+
+    def pauseProducing(self) -> None:
+        self._paused = True
+
+    def resumeProducing(self) -> None:
+        self._paused = False
+        self._next()
+
+    def stopProducing(self) -> None:
+        """
+        Cancel the chunk being awaited and close the iterator. The
+        `Deferred` returned by `startProducing` then never fires.
+        """
+        self._consumer = None
+        if self._pending is not None:
+            self._pending.cancel()
+        aclose = getattr(self._iterator, "aclose", None)
+        if aclose is not None:
+
+            async def close() -> None:
+                await aclose()
+
+            Deferred.fromCoroutine(close()).addErrback(
+                lambda f: self._log.failure("Closing the body iterator failed", f)
+            )
+
+
+class JSONProducer(IterableProducer):
+    """
+    Produce a request body by encoding a value as JSON incrementally, so that
+    neither the encoded document nor its text is held in memory at once.
+
+    The encoding is the same as that of :class:`~treq.codec.JSONCodec`.
+    Any iterator within the value, like a generator of records, is encoded
+    as an array an item at a time, so that the records needn't all be held
+    in memory either. So are lists, tuples, and dicts with more than 1024
+    items, when they are the value or within one encoded an item at a time.
+    Smaller runs of items are encoded at once, which is much faster. The
+    encoded text is written in chunks of about *chunk_size* bytes by a
+    cooperative task, which is paused while the consumer is, as by
+    :class:`IterableProducer`.
+
+    Pass a `JSONProducer`, or an iterator to be encoded as an array, as the
+    *json* argument of a request to send it with chunked transfer encoding
+    and a Content-Type of ``application/json``.
+
+    :param value: The value to encode.
+    :param chunk_size: The number of bytes to encode before each write.
+    :param cooperator: The `Cooperator` which schedules the task.
+    """
+
+    def __init__(
+        self,
+        value: Any,
+        chunk_size: int = _CHUNK_SIZE,
+        cooperator: task.Cooperator = cast(task.Cooperator, task),
+    ) -> None:
+        self._encoder = json.JSONEncoder(separators=(",", ":"), default=_default)
+        self._chunkSize = chunk_size
+        super().__init__(self._chunks(value), cooperator)
+
+    def _chunks(self, value: Any) -> Iterator[bytes]:
+        pieces: List[str] = []
+        size = 0
+        for piece in self._encode(value):
+            pieces.append(piece)
+            size += len(piece)
+            if size >= self._chunkSize:
+                yield "".join(pieces).encode("utf-8")
+                pieces = []
+                size = 0
+        yield "".join(pieces).encode("utf-8")
+
+    def _encode(self, value: Any) -> Iterator[str]:
+        if not _large(value) and not any(map(_large, _children(value))):
+            try:
+                encoded = self._encoder.encode(value)
+            except _IteratorFound:
+                pass
+            else:
+                yield encoded
+                return
+        if isinstance(value, dict):
+            yield "{"
+            yield from self._items(value.items(), dict)
+            yield "}"
+        else:
+            yield "["
+            yield from self._items(((None, item) for item in value), list)
+            yield "]"
+
+    def _items(
+        self, items: Iterable[Tuple[Any, Any]], container: type
+    ) -> Iterator[str]:
+        """
+        Encode the items of an array or object, without its brackets. Runs
+        of items which aren't large are encoded together as a smaller
+        container, with its brackets removed, unless they contain an
+        iterator.
+        """
+        separator = ""
+        batch: List[Tuple[Any, Any]] = []
+
+        def flush() -> Iterator[str]:
+            nonlocal separator
+            run: Any
+            if container is dict:
+                run = dict(batch)
+            else:
+                run = [item for _, item in batch]
+            try:
+                encoded = self._encoder.encode(run)
+            except _IteratorFound:
+                for key, item in batch:
+                    yield from single(key, item)
+            else:
+                yield separator + encoded[1:-1]
+                separator = ","
+            del batch[:]
+
+        def single(key: Any, item: Any) -> Iterator[str]:
+            nonlocal separator
+            if container is dict:
+                yield separator + self._encoder.encode(self._key(key)) + ":"
+            else:
+                yield separator
+            yield from self._encode(item)
+            separator = ","
+
+        for key, item in items:
+            if _large(item):
+                if batch:
+                    yield from flush()
+                yield from single(key, item)
+            else:
+                batch.append((key, item))
+                if len(batch) >= _JSON_STREAM_ITEMS:
+                    yield from flush()
+        if batch:
+            yield from flush()
+
+    def _key(self, key: Any) -> str:
+        """
+        Convert a dict key to a string as :mod:`json` does.
+        """
+        if isinstance(key, str):
+            return key
+        if key is True:
+            return "true"
+        if key is False:
+            return "false"
+        if key is None:
+            return "null"
+        if isinstance(key, (int, float)):
+            return self._encoder.encode(key)
+        raise TypeError(
+            "keys must be str, int, float, bool or None, "
+            f"not {key.__class__.__name__}"
+        )
+
+
+class _CompressingConsumer:
+    """
+    The consumer of the producer wrapped by a `CompressingProducer`.
+    """
+
+    def __init__(self, producer: "CompressingProducer") -> None:
+        self._producer = producer
+
+    def write(self, data: bytes) -> None:
+        self._producer._compress(data)
+
+
+def _compressobj(encoding: str, level: Optional[int]) -> Any:
+    if encoding == "gzip":
+        return zlib.compressobj(-1 if level is None else level, zlib.DEFLATED, 31)
+    if encoding == "deflate":
+        return zlib.compressobj(-1 if level is None else level)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor(
+            level=3 if level is None else level
+        ).compressobj()
+    raise ValueError(f"Unsupported content coding {encoding!r}")
+
+
+@implementer(IBodyProducer)
+class CompressingProducer:
+    """
+    Compress the body written by another producer as it is written.
+
+    The compressed body has an unknown length, so it is sent with chunked
+    transfer encoding. The wrapped producer is paused while the consumer
+    is.
+
+    By default each chunk is compressed as it is written, on the reactor
+    thread. If *threadpool* is given chunks are instead compressed in it,
+    one at a time and in order, with the wrapped producer paused while
+    more than two are waiting, so that compressing a large body doesn't
+    block the reactor.
+
+    Passed as the *data* argument of a request, this sets the request's
+    Content-Encoding header.
+
+    :param producer: The producer of the uncompressed body.
+    :param encoding: The content coding: ``"gzip"``, ``"deflate"``, or
+        ``"zstd"``, which requires the `zstandard
+        <https://pypi.org/project/zstandard/>`_ package.
+    :param level: The compression level, by default that of the library.
+    :param reactor: The reactor, by default the global reactor. Only used
+        with *threadpool*.
+    :param threadpool: The thread pool to compress in.
+
+    :raises ValueError: if the encoding isn't supported.
+    :raises ImportError: if zstd is requested and zstandard isn't installed.
+    """
+
+    def __init__(
+        self,
+        producer: IBodyProducer,
+        encoding: str = "gzip",
+        *,
+        level: Optional[int] = None,
+        reactor: Any = None,
+        threadpool: Optional[ThreadPool] = None,
+    ) -> None:
+        self._producer = producer
+        self.encoding = encoding
+        self._compressor = _compressobj(encoding, level)
+        self.length = UNKNOWN_LENGTH
+        self._inThread: Optional[Any] = None
+        if threadpool is not None:
+            if reactor is None:
+                from twisted.internet import reactor
+            self._inThread = _threads(reactor, threadpool)
+        self._consumer: Optional[IConsumer] = None
+        self._finished: Optional["Deferred[None]"] = None
+        self._queue: "Deferred[None]" = succeed(None)
+        self._queued = 0
+        self._paused = False
+        self._producing = False
+        self._producerPaused = False
+
+    def startProducing(self, consumer: IConsumer) -> "Deferred[None]":
+        self._consumer = consumer
+        self._finished = Deferred()
+        self._producing = True
+
+        def produced(result: Any) -> Any:
+            self._producing = False
+            return result
+
+        self._producer.startProducing(_CompressingConsumer(self)).addBoth(
+            produced
+        ).addCallbacks(
+            lambda _: self._run(self._compressor.flush, None, True), self._fail
+        )
+        return self._finished
+
+    def _compress(self, data: bytes) -> None:
+        self._run(self._compressor.compress, data, False)
+
+    def _run(self, f: Any, data: Optional[bytes], last: bool) -> None:
+        """
+        Compress or flush, in order, and write the result.
+        """
+        args = () if data is None else (data,)
+        if self._inThread is None:
+            try:
+                compressed = f(*args)
+            except BaseException:
+                self._fail(Failure())
+            else:
+                self._write(compressed, last)
+            return
+
+        inThread = self._inThread
+        self._queued += 1
+        self._update()
+
+        def done(compressed: bytes) -> None:
+            self._queued -= 1
+            self._write(compressed, last)
+            self._update()
+
+        self._queue.addCallback(lambda _: inThread(f, *args)).addCallbacks(
+            done, self._fail
+        )
+
+    def _write(self, compressed: bytes, last: bool) -> None:
+        if self._consumer is None:
+            return
+        if compressed:
+            self._consumer.write(compressed)
+        if last and self._consumer is not None:
+            self._consumer = None
+            assert self._finished is not None
+            self._finished.callback(None)
+
+    def _fail(self, reason: Failure) -> None:
+        if self._consumer is None:
+            return
+        self._consumer = None
+        if self._producing:
+            self._producing = False
+            self._producer.stopProducing()
+        assert self._finished is not None
+        self._finished.errback(reason)
+
+    def _update(self) -> None:
+        """
+        Pause the wrapped producer while the consumer is paused or too many
+        chunks are waiting to be compressed, and resume it otherwise.
+        """
+        pause = self._paused or self._queued > 2
+        if pause != self._producerPaused and self._producing:
+            self._producerPaused = pause
+            if pause:
+                self._producer.pauseProducing()
+            else:
+                self._producer.resumeProducing()
+
+    def pauseProducing(self) -> None:
+        self._paused = True
+        self._update()
+
+    def resumeProducing(self) -> None:
+        self._paused = False
+        self._update()
+
+    def stopProducing(self) -> None:
+        """
+        Stop the wrapped producer. The `Deferred` returned by
+        `startProducing` then never fires.
+        """
+        self._consumer = None
+        if self._producing:
+            self._producing = False
+            self._producer.stopProducing()
+
+
+@implementer(IBodyProducer)
+class ContinueProducer:
+    """
+    Delay producing a body sent with an ``Expect: 100-continue`` header, so
+    that the server may respond to the request from its headers alone
+    before the body is sent (:rfc:`9110#section-10.1.1`).
+
+    Twisted's HTTP client discards interim responses, so the wrapped
+    producer is started once *timeout* seconds have passed, whether or not
+    the server has sent 100 (Continue), unless :meth:`cancel` is called
+    first because a final response has arrived.
+
+    Passed as the *data* argument of a request, this sets the request's
+    Expect header, and the body is cancelled when the response is received.
+
+    :param producer: The producer of the body.
+    :param reactor: The reactor, by default the global reactor.
+    :param timeout: Seconds to wait before the body is sent.
+    """
+
+    def __init__(
+        self, producer: IBodyProducer, *, reactor: Any = None, timeout: float = 1.0
+    ) -> None:
+        if reactor is None:
+            from twisted.internet import reactor
+        self._producer = producer
+        self._reactor = reactor
+        self._timeout = timeout
+        self.length = producer.length
+        self._consumer: Optional[IConsumer] = None
+        self._finished: Optional["Deferred[None]"] = None
+        self._delayedCall: Any = None
+        self._paused = False
+        self._started = False
+
+    def startProducing(self, consumer: IConsumer) -> "Deferred[None]":
+        self._consumer = consumer
+        self._finished = Deferred(lambda _: self.stopProducing())
+        self._delayedCall = self._reactor.callLater(self._timeout, self._ready)
+        return self._finished
+
+    def _ready(self) -> None:
+        self._delayedCall = None
+        if not self._paused:
+            self._start()
+
+    def _start(self) -> None:
+        assert self._consumer is not None and self._finished is not None
+        self._started = True
+        self._producer.startProducing(self._consumer).chainDeferred(self._finished)
+
+    def cancel(self) -> None:
+        """
+        Don't send the body if it hasn't been started. The `Deferred`
+        returned by `startProducing` then never fires.
+        """
+        if not self._started:
+            self.stopProducing()
+
+    def pauseProducing(self) -> None:
+        self._paused = True
+        if self._started:
+            self._producer.pauseProducing()
+
+    def resumeProducing(self) -> None:
+        self._paused = False
+        if self._started:
+            self._producer.resumeProducing()
+        elif self._delayedCall is None and self._consumer is not None:
+            self._start()
+
+    def stopProducing(self) -> None:
+        self._consumer = None
+        if self._delayedCall is not None:
+            self._delayedCall.cancel()
+            self._delayedCall = None
+        if self._started:
+            self._started = False
+            self._producer.stopProducing()
+
+
+@implementer(IBodyProducer)
+class ReplayableProducer:
+    """
+    Produce a body which may be produced again from the start, so that
+    a request can be sent more than once: to follow a 307 (Temporary
+    Redirect) or 308 (Permanent Redirect) response, say, or to retry it.
+
+    How the body is produced again depends on what it is:
+
+    - `bytes` or another buffer, like a `bytearray` or
+      :class:`mmap.mmap`, is written again, as by :class:`BufferProducer`.
+    - A seekable binary file is rewound to the position it had when this
+      was made, and read in chunks.
+    - Any other :class:`~twisted.web.iweb.IBodyProducer`, or a binary file
+      which can't be seeked, is spooled as it is first produced: in memory
+      up to *max_memory* bytes, and then to a temporary file. A body of more
+      than *max_spool* bytes isn't kept, and can't be produced again, nor
+      can one whose first production didn't finish.
+
+    Files are left open, so that the body can be produced again, until
+    :meth:`close` is called.
+
+    Passed as the *data* argument of a request, 307 and 308 redirects of the
+    request are followed with the same body, and it is closed once the
+    response is received.
+
+    :param body: The body.
+    :param max_memory: The greatest number of bytes spooled in memory.
+    :param max_spool: The greatest number of bytes spooled.
+    :param cooperator: The `Cooperator` which schedules reading files.
+    """
+
+    def __init__(
+        self,
+        body: Any,
+        *,
+        max_memory: int = _SPOOL_MEMORY,
+        max_spool: int = _MAX_SPOOL,
+        cooperator: task.Cooperator = cast(task.Cooperator, task),
+    ) -> None:
+        self._cooperator = cooperator
+        self._data: Any = None
+        self._file: Optional[IO[bytes]] = None
+        self._start = 0
+        self._original: Optional[IBodyProducer] = None
+        self._spool: Optional[IO[bytes]] = None
+        self._maxSpool = max_spool
+        self._spooledLength = 0
+        self._spooled = False
+        self._started = False
+        self._closed = False
+        self._current: Optional[IBodyProducer] = None
+
+        if IBodyProducer.providedBy(body):
+            self._original = body
+            self.length = body.length
+        elif hasattr(body, "read"):
+            self._file = body
+            if getattr(body, "seekable", lambda: False)():
+                self._start = body.tell()
+                self.length = body.seek(0, os.SEEK_END) - self._start
+                body.seek(self._start)
+            else:
+                self._original = _reader(body, cooperator)
+                self.length = UNKNOWN_LENGTH
+        else:
+            self._data = body
+            self.length = memoryview(body).nbytes
+        if self._original is not None:
+            self._spool = cast(IO[bytes], SpooledTemporaryFile(max_memory))
+
+    @property
+    def replayable(self) -> bool:
+        """
+        Whether the body can be produced again from the start.
+        """
+        if self._closed:
+            return False
+        if self._original is None or not self._started:
+            return True
+        return self._spooled
+
+    def _replay(self) -> IBodyProducer:
+        if self._data is not None:
+            if isinstance(self._data, bytes):
+                return BytesProducer(self._data)
+            return BufferProducer(self._data)
+        if self._file is not None and self._original is None:
+            self._file.seek(self._start)
+            return _reader(self._file, self._cooperator)
+        assert self._spool is not None
+        self._spool.seek(0)
+        return _reader(self._spool, self._cooperator)
+
+    def startProducing(self, consumer: IConsumer) -> "Deferred[None]":
+        if not self.replayable:
+            return fail(ValueError("The body can't be produced again"))
+        if self._current is not None:
+            # The server responded before the body was sent.
+            self._current.stopProducing()
+        producer: IBodyProducer
+        if self._original is not None and not self._started:
+            producer = self._original
+            consumer = cast(IConsumer, _SpoolingConsumer(self, consumer))
+        else:
+            producer = self._replay()
+        self._started = True
+        self._current = producer
+
+        def produced(result: None) -> None:
+            if self._current is producer:
+                self._current = None
+            if producer is self._original:
+                self._spooled = self._spool is not None
+
+        finished: "Deferred[None]" = producer.startProducing(consumer)
+        return finished.addCallback(produced)
+
+    def _write(self, data: bytes) -> None:
+        if self._spool is None:
+            return
+        self._spooledLength += len(data)
+        if self._spooledLength > self._maxSpool:
+            self._spool.close()
+            self._spool = None
+        else:
+            self._spool.write(data)
+
+    def pauseProducing(self) -> None:
+        if self._current is not None:
+            self._current.pauseProducing()
+
+    def resumeProducing(self) -> None:
+        if self._current is not None:
+            self._current.resumeProducing()
+
+    def stopProducing(self) -> None:
+        """
+        Stop the current production. The `Deferred` returned by
+        `startProducing` then never fires.
+
+        If the body was being spooled the spool is closed, as the body
+        can't be produced again.
+        """
+        if self._current is not None:
+            current, self._current = self._current, None
+            current.stopProducing()
+            if current is self._original and self._spool is not None:
+                self._spool.close()
+                self._spool = None
+
+    def close(self) -> None:
+        """
+        Stop any production, and close the file and the spool. The body
+        can't be produced again.
+        """
+        self.stopProducing()
+        self._closed = True
+        if self._file is not None:
+            self._file.close()
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+
+class _SpoolingConsumer:
+    """
+    The consumer of the producer wrapped by a `ReplayableProducer` when it
+    is first produced, which spools what is written.
+    """
+
+    def __init__(self, producer: ReplayableProducer, consumer: IConsumer) -> None:
+        self._producer = producer
+        self._consumer = consumer
+
+    def write(self, data: bytes) -> None:
+        self._producer._write(data)
+        self._consumer.write(data)
+
+
+def _reader(file: IO[bytes], cooperator: task.Cooperator) -> IBodyProducer:
+    """
+    Produce the rest of a file by reading it in chunks.
+    """
+    return IterableProducer(iter(partial(file.read, _CHUNK_SIZE), b""), cooperator)
+
+
+class _IteratorFound(Exception):
+    """
+    An iterator was found within a value which `JSONProducer` tried to
+    encode at once.
+    """
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, abc.Iterator):
+        raise _IteratorFound()
+    raise TypeError(
+        f"Object of type {value.__class__.__name__} is not JSON serializable"
+    )
+
+
+def _large(value: Any) -> bool:
+    """
+    Should *value* be encoded by `JSONProducer` an item at a time?
+    """
+    if isinstance(value, (dict, list, tuple)):
+        return len(value) > _JSON_STREAM_ITEMS
+    return isinstance(value, abc.Iterator)
+
+
+def _children(value: Any) -> Iterable[Any]:
+    if isinstance(value, dict):
+        return value.values()
+    if isinstance(value, (list, tuple)):
+        return value
+    return ()
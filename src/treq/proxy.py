@@ -0,0 +1,254 @@
+# Copyright (c) The treq Authors.
+# See LICENSE for details.
+"""
+A :mod:`twisted.web` resource which forwards requests to an upstream server
+with treq.
+"""
+from typing import Any, List, Optional
+
+from twisted.internet.defer import CancelledError, Deferred
+from twisted.internet.protocol import Protocol, connectionDone
+from twisted.internet.task import Cooperator
+from twisted.logger import Logger
+from twisted.python.failure import Failure
+from twisted.web.client import Agent, FileBodyProducer, ResponseDone
+from twisted.web.http import PotentialDataLoss
+from twisted.web.http_headers import Headers
+from twisted.web.iweb import UNKNOWN_LENGTH, IAgent, IResponse
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET, Request
+
+from treq._types import _ITreqReactor, _URLType
+from treq.api import default_pool, default_reactor
+
+# Headers which apply to a single connection, and so are never forwarded
+# (RFC 9110 section 7.6.1). Content-Length is recomputed for each message.
+_HOP_BY_HOP = frozenset(
+    [
+        b"connection",
+        b"content-length",
+        b"keep-alive",
+        b"proxy-authenticate",
+        b"proxy-authorization",
+        b"proxy-connection",
+        b"te",
+        b"trailer",
+        b"transfer-encoding",
+        b"upgrade",
+    ]
+)
+
+
+def _end_to_end(headers: Headers) -> Headers:
+    """
+    Copy the headers of a message that should be forwarded: all but the
+    hop-by-hop headers and those named by the Connection header.
+    """
+    hopByHop = set(_HOP_BY_HOP)
+    for value in headers.getRawHeaders(b"connection", ()):
+        hopByHop.update(
+            token.strip().lower() for token in value.split(b",") if token.strip()
+        )
+    forwarded = Headers()
+    for name, values in headers.getAllRawHeaders():
+        if name.lower() not in hopByHop:
+            forwarded.setRawHeaders(name, values)
+    return forwarded
+
+
+class _RelayProtocol(Protocol):
+    """
+    Write the body of an upstream response to the downstream request,
+    letting the request pause the upstream transport while the downstream
+    connection can't keep up.
+    """
+
+    def __init__(self, request: Request, finished: "Deferred[None]") -> None:
+        self._request = request
+        self._finished = finished
+
+    def connectionMade(self) -> None:
+        self._request.registerProducer(self.transport, True)
+
+    def dataReceived(self, data: bytes) -> None:
+        self._request.write(data)
+
+    def connectionLost(self, reason: Failure = connectionDone) -> None:
+        if self.transport is not None and self._request.channel is not None:
+            self._request.unregisterProducer()
+        if reason.check(ResponseDone, PotentialDataLoss):
+            self._finished.callback(None)
+        else:
+            self._finished.errback(reason)
+
+
+class ReverseProxyResource(Resource):
+    """
+    Forward each request to an upstream server and relay its response,
+    streaming both bodies.
+
+    The request path beneath this resource and the query string are appended
+    to *upstream*: if the resource is at ``/api`` and *upstream* is
+    ``http://backend:8080/v1``, a request for ``/api/users?id=1`` is
+    forwarded to ``http://backend:8080/v1/users?id=1``.
+
+    Hop-by-hop headers (like Connection, Keep-Alive, and Transfer-Encoding)
+    are removed in both directions, as are any others named by the
+    Connection header of a request. (Twisted's client doesn't expose the
+    Connection header of a response.) The
+    Host header is that of the upstream server, with the original given in
+    X-Forwarded-Host, along with X-Forwarded-For, X-Forwarded-Proto, and
+    Via. Redirects are relayed rather than followed, cookies pass through
+    without being stored, and bodies are relayed with their content codings
+    untouched: the client's Accept-Encoding header is forwarded as it is,
+    and a compressed response isn't decoded.
+
+    The response body is relayed as it is received, with the upstream
+    transport paused while the downstream connection is not accepting data.
+    :mod:`twisted.web` receives the whole request body before the resource
+    is rendered, spooling large bodies to a temporary file, from which it
+    is streamed upstream.
+
+    A response is 502 Bad Gateway if the upstream server can't be reached
+    and 504 Gateway Timeout if it doesn't respond within *timeout*. If the
+    downstream client disconnects, the upstream request is cancelled or its
+    connection closed.
+
+    :param upstream: The URL requests are forwarded to.
+    :param agent: The agent used to make requests. By default an
+        :class:`~twisted.web.client.Agent` using treq's global persistent
+        connection pool, so that connections to the upstream server are
+        reused.
+    :param reactor: The reactor, by default the global reactor.
+    :param timeout: Seconds to wait for the response headers.
+    """
+
+    isLeaf = True
+    _log = Logger()
+
+    def __init__(
+        self,
+        upstream: _URLType,
+        agent: Optional[IAgent] = None,
+        *,
+        reactor: Optional[_ITreqReactor] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        super().__init__()
+        if not isinstance(upstream, (bytes, str)):
+            upstream = upstream.to_uri().to_text()
+        if isinstance(upstream, str):
+            upstream = upstream.encode("ascii")
+        self._upstream = upstream.rstrip(b"/")
+        self._reactor = default_reactor(reactor)
+        if agent is None:
+            agent = Agent(self._reactor, pool=default_pool(self._reactor, None, None))
+        # The agent is used directly, rather than through HTTPClient, which
+        # would decode the response body and store cookies from the
+        # responses to all the clients of the proxy together.
+        self._agent = agent
+        self._timeout = timeout
+        self._cooperator = Cooperator(
+            scheduler=lambda work: self._reactor.callLater(0, work)
+        )
+
+    def _url(self, request: Request) -> bytes:
+        path, _, query = request.uri.partition(b"?")
+        segments = path.split(b"/")[1 + len(request.prepath or ()) :]
+        url = self._upstream + b"/" + b"/".join(segments)
+        if query:
+            url += b"?" + query
+        return url
+
+    def _headers(self, request: Request) -> Headers:
+        headers = _end_to_end(request.requestHeaders)
+        host = headers.getRawHeaders(b"host")
+        headers.removeHeader(b"host")
+        if host:
+            headers.setRawHeaders(b"x-forwarded-host", host[-1:])
+        peer = request.getClientAddress()
+        forwardedFor = list(headers.getRawHeaders(b"x-forwarded-for", ()))
+        forwardedFor.append(getattr(peer, "host", "unknown").encode("ascii"))
+        headers.setRawHeaders(b"x-forwarded-for", [b", ".join(forwardedFor)])
+        headers.setRawHeaders(
+            b"x-forwarded-proto", [b"https" if request.isSecure() else b"http"]
+        )
+        version = request.clientproto.split(b"/")[-1]
+        headers.addRawHeader(b"via", version + b" treq")
+        return headers
+
+    def render(self, request: Request) -> Any:
+        body: Optional[FileBodyProducer] = None
+        content = request.content
+        if content is not None and (
+            request.requestHeaders.hasHeader(b"content-length")
+            or request.requestHeaders.hasHeader(b"transfer-encoding")
+        ):
+            content.seek(0)
+            body = FileBodyProducer(content, self._cooperator)
+
+        d = self._agent.request(
+            request.method, self._url(request), self._headers(request), body
+        )
+        if self._timeout:
+            delayedCall = self._reactor.callLater(self._timeout, d.cancel)
+
+            def gotResult(result: object) -> object:
+                if delayedCall.active():
+                    delayedCall.cancel()
+                return result
+
+            d.addBoth(gotResult)
+        relayed: "Deferred[None]" = Deferred()
+        relays: List[_RelayProtocol] = []
+        disconnected: List[Failure] = []
+
+        def gotResponse(response: IResponse) -> "Deferred[None]":
+            request.setResponseCode(response.code, response.phrase)
+            for name, values in _end_to_end(response.headers).getAllRawHeaders():
+                request.responseHeaders.setRawHeaders(name, values)
+            if request.method == b"HEAD" or response.code in (204, 304):
+                length = response.headers.getRawHeaders(b"content-length")
+                if length:
+                    request.responseHeaders.setRawHeaders(b"content-length", length)
+            elif response.length is not UNKNOWN_LENGTH:
+                request.setHeader(b"content-length", b"%d" % (response.length,))
+            relay = _RelayProtocol(request, relayed)
+            relays.append(relay)
+            response.deliverBody(relay)
+            return relayed
+
+        def finished(_: None) -> None:
+            if not disconnected:
+                request.finish()
+
+        def failed(reason: Failure) -> None:
+            if disconnected:
+                return
+            if request.startedWriting:
+                # The status has been sent, so the only way to signal the
+                # failure is to cut the response short.
+                self._log.failure("Relaying the upstream response failed", reason)
+                request.loseConnection()
+                return
+            if reason.check(CancelledError):
+                code, message = 504, b"Gateway Timeout"
+            else:
+                self._log.failure("The upstream request failed", reason)
+                code, message = 502, b"Bad Gateway"
+            request.setResponseCode(code, message)
+            request.responseHeaders = Headers({b"content-type": [b"text/plain"]})
+            request.setHeader(b"content-length", b"%d" % (len(message),))
+            request.write(message)
+            request.finish()
+
+        def lost(reason: Failure) -> None:
+            disconnected.append(reason)
+            if not relays:
+                d.cancel()
+            elif relays[0].transport is not None:
+                relays[0].transport.stopProducing()  # type: ignore
+
+        request.notifyFinish().addErrback(lost)
+        d.addCallback(gotResponse).addCallbacks(finished, failed)
+        return NOT_DONE_YET
@@ -0,0 +1,317 @@
+# Copyright (c) The treq Authors.
+# See LICENSE for details.
+"""
+Random access to remote files with HTTP range requests.
+"""
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from twisted.internet.defer import Deferred, gatherResults, succeed
+from twisted.internet.protocol import Protocol
+from twisted.python.failure import Failure
+from twisted.web.error import Error
+from twisted.web.http_headers import Headers
+from twisted.web.iweb import IResponse
+
+from treq._types import _URLType
+from treq.client import HTTPClient
+from treq.content import content
+from treq.download import _parse_content_range, _validator
+
+
+class _Abandon(Protocol):
+    """
+    Close the connection rather than receive a response body.
+    """
+
+    def connectionMade(self) -> None:
+        self.transport.stopProducing()  # type: ignore
+
+
+class RemoteFile:
+    """
+    A read-only, seekable file whose contents are fetched from a URL with
+    HTTP range requests, as they are read.
+
+    The file is divided into blocks of *block_size* bytes. Blocks are cached
+    in memory, discarding the least recently used once the cache holds
+    *cache_size* bytes. When a read needs several blocks which aren't
+    cached, they are fetched with one request, and blocks which are cached
+    are fetched again rather than splitting the request when no more than
+    *max_gap* bytes separate those which are missing. Reads which follow
+    each other also fetch blocks beyond what was asked for once those
+    already fetched run out, doubling the amount up to *max_read_ahead*
+    bytes as long as the reads stay sequential.
+
+    All requests after the first are conditional on its entity tag or
+    modification date, so that a read fails with
+    :class:`twisted.web.error.Error` (status 412) rather than mixing parts of
+    different versions of the file. A server which doesn't respond to range
+    requests with 206 Partial Content also causes reads to fail; the file is
+    never downloaded whole.
+
+    Reads and seeks return a `Deferred`. Wait for each before starting the
+    next.
+
+    :param client: The client used to make requests.
+    :param url: The URL of the file.
+    :param headers: Additional headers for each request.
+    :param kwargs: Other arguments for
+        :meth:`~treq.client.HTTPClient.request()`, like *auth* or *timeout*.
+    """
+
+    def __init__(
+        self,
+        client: HTTPClient,
+        url: _URLType,
+        *,
+        headers: Optional[Headers] = None,
+        block_size: int = 64 * 1024,
+        cache_size: int = 16 * 1024 * 1024,
+        max_read_ahead: int = 1024 * 1024,
+        max_gap: int = 64 * 1024,
+        **kwargs: Any
+    ) -> None:
+        self._client = client
+        self._url = url
+        self._headers = headers if headers is not None else Headers()
+        self._kwargs = kwargs
+        self._blockSize = block_size
+        self._cacheBlocks = max(1, cache_size // block_size)
+        self._maxReadAhead = max_read_ahead // block_size
+        self._maxGap = max_gap // block_size
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._waiting: "Dict[int, List[Deferred[bytes]]]" = {}
+        self._conditions: Optional[Dict[bytes, bytes]] = None
+        self._size: Optional[int] = None
+        self._position = 0
+        self._lastEnd: Optional[int] = None
+        self._readAhead = 0
+
+    @property
+    def size(self) -> Optional[int]:
+        """
+        The length of the file in bytes, or `None` if no response has
+        revealed it yet. See :meth:`get_size()`.
+        """
+        return self._size
+
+    def get_size(self) -> "Deferred[int]":
+        """
+        Find the length of the file.
+
+        If it isn't known yet the last block of the file is requested, which
+        is then cached.
+
+        :returns: A `Deferred` that fires with the length in bytes.
+        """
+        if self._size is not None:
+            return succeed(self._size)
+        return self._request(b"bytes=-%d" % (self._blockSize,)).addCallback(
+            self._gotSuffix
+        )
+
+    def tell(self) -> int:
+        """
+        :returns: The current position in the file.
+        """
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> "Deferred[int]":
+        """
+        Change the position in the file, as for :meth:`io.IOBase.seek()`.
+
+        :returns: A `Deferred` that fires with the new position. Seeking
+            relative to the end may need to request the length of the file.
+        """
+        if whence == os.SEEK_SET:
+            base: "Deferred[int]" = succeed(0)
+        elif whence == os.SEEK_CUR:
+            base = succeed(self._position)
+        elif whence == os.SEEK_END:
+            base = self.get_size()
+        else:
+            raise ValueError("Invalid whence ({!r})".format(whence))
+
+        def seeked(base: int) -> int:
+            if base + offset < 0:
+                raise ValueError("Negative seek position {}".format(base + offset))
+            self._position = base + offset
+            return self._position
+
+        return base.addCallback(seeked)
+
+    def read(self, size: int = -1) -> "Deferred[bytes]":
+        """
+        Read up to *size* bytes from the current position, or until the end
+        of the file if *size* is negative.
+
+        :returns: A `Deferred` that fires with `bytes`, which are empty at the
+            end of the file.
+        """
+        if size < 0:
+            return self.get_size().addCallback(
+                lambda total: self.read(max(total - self._position, 0))
+            )
+        start = self._position
+        end = start + size
+        if self._size is not None:
+            end = min(end, self._size)
+        if end <= start:
+            return succeed(b"")
+        first, last = start // self._blockSize, (end - 1) // self._blockSize
+
+        if start == self._lastEnd:
+            self._readAhead = min(max(1, self._readAhead * 2), self._maxReadAhead)
+        else:
+            self._readAhead = 0
+        self._lastEnd = end
+        ahead = self._readAhead
+        if last + 1 in self._cache or last + 1 in self._waiting:
+            ahead = 0
+        requests = self._plan(first, last + 1 + ahead)
+        # Wait for the blocks before requesting any, in case responses arrive
+        # synchronously and push them out of the cache.
+        waiting = [self._block(index) for index in range(first, last + 1)]
+        for byteRange, indices in requests:
+            self._request(byteRange).addBoth(self._gotBlocks, indices)
+
+        def assemble(blocks: List[bytes]) -> bytes:
+            data = b"".join(blocks)[start - first * self._blockSize :]
+            data = data[: end - start]
+            self._position = start + len(data)
+            return data
+
+        return gatherResults(waiting, consumeErrors=True).addCallbacks(
+            assemble, lambda f: f.value.subFailure
+        )
+
+    def _block(self, index: int) -> "Deferred[bytes]":
+        """
+        Get a block which is cached or being fetched.
+        """
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return succeed(self._cache[index])
+        if index not in self._waiting:
+            # Past the end of the file.
+            return succeed(b"")
+        d: "Deferred[bytes]" = Deferred()
+        self._waiting[index].append(d)
+        return d
+
+    def _plan(self, first: int, end: int) -> List[Tuple[bytes, List[int]]]:
+        """
+        Plan requests for the blocks from index *first* up to *end* which are
+        neither cached nor already being fetched, as few as the *max_gap*
+        allows, and mark those blocks as being fetched.
+
+        :returns: The range to request for each, and the blocks it fetches.
+        """
+        if self._size is not None:
+            end = min(end, -(-self._size // self._blockSize))
+        missing = [
+            index
+            for index in range(first, end)
+            if index not in self._cache and index not in self._waiting
+        ]
+        runs: List[Tuple[int, int]] = []
+        requests = []
+        for index in missing:
+            if runs and index - runs[-1][1] <= self._maxGap:
+                runs[-1] = (runs[-1][0], index + 1)
+            else:
+                runs.append((index, index + 1))
+        for runStart, runEnd in runs:
+            indices = [
+                index
+                for index in range(runStart, runEnd)
+                if index not in self._waiting
+            ]
+            for index in indices:
+                self._waiting[index] = []
+            byteRange = b"bytes=%d-%d" % (
+                runStart * self._blockSize,
+                runEnd * self._blockSize - 1,
+            )
+            requests.append((byteRange, indices))
+        return requests
+
+    def _request(self, byteRange: bytes) -> "Deferred[Tuple[int, bytes]]":
+        """
+        Request a range of the file.
+
+        :returns: A `Deferred` that fires with the offset of the data
+            received and the data, which is empty if the range starts beyond
+            the end of the file.
+        """
+        headers = self._headers.copy()
+        headers.setRawHeaders(b"range", [byteRange])
+        for name, value in (self._conditions or {}).items():
+            headers.setRawHeaders(name, [value])
+        d = self._client.get(
+            self._url, headers=headers, unbuffered=True, **self._kwargs
+        )
+        return d.addCallback(self._gotResponse)
+
+    def _gotResponse(self, response: IResponse) -> "Deferred[Tuple[int, bytes]]":
+        contentRange = _parse_content_range(response)
+        if response.code == 416:
+            response.deliverBody(Protocol())
+            unsatisfied = response.headers.getRawHeaders(b"content-range", [b""])
+            if unsatisfied[-1].startswith(b"bytes */"):
+                self._size = int(unsatisfied[-1][len(b"bytes */") :])
+            return succeed((self._size or 0, b""))
+        if response.code != 206 or contentRange is None:
+            response.deliverBody(_Abandon())
+            raise Error(response.code, b"Expected a 206 Partial Content response")
+        start, _, total = contentRange
+        self._size = total
+        if self._conditions is None:
+            validator = _validator(response)
+            etag = response.headers.getRawHeaders(b"etag")
+            if validator is None:
+                self._conditions = {}
+            elif etag and validator == etag[-1]:
+                self._conditions = {b"if-match": validator}
+            else:
+                self._conditions = {b"if-unmodified-since": validator}
+        return content(response).addCallback(lambda data: (start, data))
+
+    def _gotSuffix(self, result: Tuple[int, bytes]) -> int:
+        start, data = result
+        if self._size is None:
+            # Only an empty file can't satisfy a suffix range.
+            self._size = 0
+        if data:
+            index = (self._size - 1) // self._blockSize
+            blockStart = index * self._blockSize
+            if start <= blockStart and index not in self._waiting:
+                self._store(index, data[blockStart - start :])
+        return self._size
+
+    def _gotBlocks(self, result: Any, indices: List[int]) -> None:
+        """
+        Cache the blocks received in response to a range request, and
+        deliver them to any reads waiting for them.
+        """
+        for index in indices:
+            waiters = self._waiting.pop(index)
+            if isinstance(result, Failure):
+                for waiter in waiters:
+                    waiter.errback(result)
+                continue
+            start, data = result
+            offset = index * self._blockSize - start
+            block = data[offset : offset + self._blockSize] if offset >= 0 else b""
+            if block:
+                self._store(index, block)
+            for waiter in waiters:
+                waiter.callback(block)
+
+    def _store(self, index: int, block: bytes) -> None:
+        self._cache[index] = block
+        self._cache.move_to_end(index)
+        while len(self._cache) > self._cacheBlocks:
+            self._cache.popitem(last=False)
@@ -1,9 +1,185 @@
 from requests.cookies import cookiejar_from_dict
+from twisted.internet.defer import Deferred, fail
+from twisted.internet.protocol import Protocol
 from twisted.python import reflect
 from twisted.python.components import proxyForInterface
+from twisted.web.client import ResponseDone
+from twisted.web.http import PotentialDataLoss
 from twisted.web.iweb import UNKNOWN_LENGTH, IResponse
 
-from treq.content import collect, content, json_content, text_content
+from treq.codec import CodecRegistry
+from treq.content import (collect, collect_csv, collect_json_items,
+                          collect_lines, collect_ndjson, content, json_content,
+                          tee, text_content)
+from treq.digest import _find_digesting
+
+_default_codecs = CodecRegistry()
+
+
+class _PeekProtocol(Protocol):
+    def __init__(self, peeking):
+        self._peeking = peeking
+
+    def connectionMade(self):
+        self._peeking._connected(self.transport)
+
+    def dataReceived(self, data):
+        self._peeking._received(data)
+
+    def connectionLost(self, reason):
+        self._peeking._ended(reason)
+
+
+class _PeekProducer:
+    """
+    The transport given to the protocol that reads a body after it was
+    peeked at, so that its pauses are combined with those for peeking.
+    """
+
+    def __init__(self, peeking):
+        self._peeking = peeking
+
+    def pauseProducing(self):
+        self._peeking._consumerPaused = True
+        self._peeking._update()
+
+    def resumeProducing(self):
+        self._peeking._consumerPaused = False
+        self._peeking._update()
+
+    def stopProducing(self):
+        self._peeking._transport.stopProducing()
+
+
+class _PeekingResponse(proxyForInterface(IResponse)):  # type: ignore
+    """
+    Receive the start of a body to peek at, pausing the transport once
+    enough has been received, and replay it to the protocol that the body
+    is later delivered to.
+
+    :ivar _peeks: Pairs of the length requested and a `Deferred` for each
+        peek which hasn't been satisfied yet.
+    :ivar _protocol: The protocol the body was handed over to, if any.
+    :ivar _reason: The reason the body ended, if it has.
+    """
+
+    def __init__(self, original):
+        self.original = original
+        self._buffer = b""
+        self._peeks = []
+        self._protocol = None
+        self._transport = None
+        self._reason = None
+        self._paused = False
+        self._consumerPaused = False
+        self._started = False
+
+    def peek(self, n):
+        if self._protocol is not None:
+            return fail(RuntimeError("The body is already being read"))
+        d = Deferred()
+        self._peeks.append((n, d))
+        if not self._started:
+            self._started = True
+            self.original.deliverBody(_PeekProtocol(self))
+        else:
+            self._fire()
+            self._update()
+        return d
+
+    def _connected(self, transport):
+        self._transport = transport
+        self._update()
+
+    def _update(self):
+        """
+        Pause the transport while nothing wants more of the body, and resume
+        it otherwise.
+        """
+        if self._transport is None or self._reason is not None:
+            return
+        if self._protocol is None:
+            pause = not self._peeks
+        else:
+            pause = self._consumerPaused
+        if pause and not self._paused:
+            self._paused = True
+            self._transport.pauseProducing()
+        elif not pause and self._paused:
+            self._paused = False
+            self._transport.resumeProducing()
+
+    def _received(self, data):
+        if self._protocol is not None:
+            self._protocol.dataReceived(data)
+            return
+        self._buffer += data
+        self._fire()
+        self._update()
+
+    def _ended(self, reason):
+        self._reason = reason
+        if self._protocol is not None:
+            self._protocol.connectionLost(reason)
+            return
+        self._fire()
+
+    def _fire(self):
+        """
+        Fire the peeks for which enough of the body has been received, or
+        all of them once the body has ended.
+        """
+        peeks, self._peeks = self._peeks, []
+        for n, d in peeks:
+            if len(self._buffer) >= n:
+                d.callback(self._buffer[:n])
+            elif self._reason is None:
+                self._peeks.append((n, d))
+            elif self._reason.check(ResponseDone, PotentialDataLoss):
+                d.callback(self._buffer)
+            else:
+                d.errback(self._reason)
+
+    def deliverBody(self, protocol):
+        if self._protocol is not None:
+            # The original response may allow the body to be read again.
+            self.original.deliverBody(protocol)
+            return
+        self._protocol = protocol
+        if self._transport is not None:
+            protocol.makeConnection(_PeekProducer(self))
+        buffer, self._buffer = self._buffer, b""
+        if buffer:
+            protocol.dataReceived(buffer)
+        if self._reason is not None:
+            protocol.connectionLost(self._reason)
+        else:
+            self._update()
+
+
+class _Discard(Protocol):
+    """
+    Discard a body, closing the connection unless the body is no longer than
+    *limit* bytes.
+    """
+
+    def __init__(self, length, limit, finished):
+        self._length = length
+        self._limit = limit
+        self._finished = finished
+        self._received = 0
+
+    def connectionMade(self):
+        if self._length is not UNKNOWN_LENGTH and self._length > self._limit:
+            self.transport.stopProducing()
+
+    def dataReceived(self, data):
+        self._received += len(data)
+        if self._received > self._limit and self.transport is not None:
+            self.transport.stopProducing()
+
+    def connectionLost(self, reason):
+        self._finished.callback(None)
 
 
 class _Response(proxyForInterface(IResponse)):  # type: ignore
@@ -12,9 +188,11 @@ class _Response(proxyForInterface(IResponse)):  # type: ignore
     adds a few convenience methods.
     """
 
-    def __init__(self, original, cookiejar):
+    def __init__(self, original, cookiejar, codecs=None):
+        self._peeking = None
         self.original = original
         self._cookiejar = cookiejar
+        self._codecs = codecs
 
     def __repr__(self):
         """
@@ -51,6 +229,74 @@ class _Response(proxyForInterface(IResponse)):  # type: ignore
         """
         return collect(self.original, collector)
 
+    def collect_json_items(self, collector, path="item", **kwargs):
+        """
+        Incrementally decode the items of a JSON array in the body, per
+        :func:`treq.content.collect_json_items()`.
+
+        :param collector: A single argument callable that will be called
+            with each item of the array as it is received.
+
+        :param str path: Which array to decode, like ``"item"`` for
+            a top-level array or ``"results.item"`` for the array in the
+            ``results`` member of a top-level object.
+
+        :param kwargs: Any keyword arguments accepted by :py:func:`json.loads`
+
+        :returns: A `Deferred` that fires when the entire body has been
+            received.
+        """
+        return collect_json_items(self.original, collector, path, **kwargs)
+
+    def collect_lines(self, collector, encoding="ISO-8859-1"):
+        """
+        Incrementally decode the body as lines of text, per
+        :func:`treq.content.collect_lines()`.
+
+        :param collector: A single argument callable that will be called
+            with each line as it is received.
+
+        :param str encoding: A charset used if the response does not specify
+            an encoding.
+
+        :returns: A `Deferred` that fires when the entire body has been
+            received.
+        """
+        return collect_lines(self.original, collector, encoding)
+
+    def collect_ndjson(self, collector, **kwargs):
+        """
+        Incrementally decode the body as newline-delimited JSON, per
+        :func:`treq.content.collect_ndjson()`.
+
+        :param collector: A single argument callable that will be called
+            with each JSON value as it is received.
+
+        :param kwargs: Any keyword arguments accepted by :py:func:`json.loads`
+
+        :returns: A `Deferred` that fires when the entire body has been
+            received.
+        """
+        return collect_ndjson(self.original, collector, **kwargs)
+
+    def collect_csv(self, collector, encoding="utf-8", **fmtparams):
+        """
+        Incrementally parse the body as CSV, per
+        :func:`treq.content.collect_csv()`.
+
+        :param collector: A single argument callable that will be called
+            with each record, a list of `str`, as it is received.
+
+        :param str encoding: A charset used if the response does not specify
+            an encoding.
+
+        :param fmtparams: Any parameters accepted by :func:`csv.reader`.
+
+        :returns: A `Deferred` that fires when the entire body has been
+            received.
+        """
+        return collect_csv(self.original, collector, encoding, **fmtparams)
+
     def content(self):
         """
         Read the entire body all at once, per :func:`treq.content()`.
@@ -66,10 +312,44 @@ class _Response(proxyForInterface(IResponse)):  # type: ignore
 
         :param kwargs: Any keyword arguments accepted by :py:func:`json.loads`
 
+        If the client was given a :class:`~treq.codec.CodecRegistry` its JSON
+        codec decodes the body bytes instead.
+
         :rtype: Deferred that fires with the decoded JSON when the entire body
             has been read.
         """
-        return json_content(self.original, **kwargs)
+        if self._codecs is None:
+            return json_content(self.original, **kwargs)
+        codec = self._codecs.json
+        return content(self.original).addCallback(
+            lambda body: codec.decode(body, **kwargs)
+        )
+
+    def decode(self, **kwargs):
+        """
+        Collect the response body and decode it with the codec for its
+        Content-Type, such as JSON, MessagePack, or CBOR.
+
+        Codecs are found in the client's :class:`~treq.codec.CodecRegistry`,
+        or a default registry which only handles JSON.
+
+        :param kwargs: Any keyword arguments accepted by the codec's
+            ``decode`` method.
+
+        :rtype: Deferred that fires with the decoded body when the entire
+            body has been read. It fails with :exc:`ValueError` if no codec
+            handles the Content-Type.
+        """
+        codecs = _default_codecs if self._codecs is None else self._codecs
+        contentTypes = self.original.headers.getRawHeaders(b"content-type")
+        codec = codecs.for_content_type(contentTypes[-1]) if contentTypes else None
+        if codec is None:
+            return fail(
+                ValueError("No codec for Content-Type {!r}".format(contentTypes))
+            )
+        return content(self.original).addCallback(
+            lambda body: codec.decode(body, **kwargs)
+        )
 
     def text(self, encoding="ISO-8859-1"):
         """
@@ -81,6 +361,78 @@ class _Response(proxyForInterface(IResponse)):  # type: ignore
         """
         return text_content(self.original, encoding)
 
+    def tee(self, *consumers):
+        """
+        Write the body to several consumers as it is received, per
+        :func:`treq.content.tee()`. The body is read only as fast as the
+        slowest consumer accepts it.
+
+        :param consumers: :class:`~twisted.internet.interfaces.IConsumer`
+            providers.
+
+        :returns: A `Deferred` that fires when the entire body has been
+            written to every consumer.
+        """
+        return tee(self.original, consumers)
+
+    def digests(self):
+        """
+        Get the digests of the body, computed as it was received for the
+        algorithms given in the request's *digests* argument.
+
+        The body is not read by this method. For a buffered response, call
+        it after :meth:`content()` or the like; for an unbuffered response,
+        after the body has been collected.
+
+        :returns: A `Deferred` that fires with a `dict` mapping each
+            algorithm name, like ``"sha256"``, to the `bytes` digest once the
+            entire body has been received. It fails with
+            :exc:`~treq.digest.DigestMismatch` if the body did not match the
+            response's Content-Digest or Digest header, and with
+            :exc:`ValueError` if digests weren't requested.
+        """
+        digesting = _find_digesting(self.original)
+        if digesting is None:
+            return fail(ValueError("Digests were not requested"))
+        return digesting.digests()
+
+    def peek(self, n):
+        """
+        Get the start of the body without consuming it, so that the whole
+        body can still be read by any of the other methods.
+
+        Only as much of the body as has been asked for is received until
+        something else reads it; the transport is paused meanwhile. Peeking
+        is not possible once reading the body has started.
+
+        :param int n: The number of bytes to get.
+
+        :returns: A `Deferred` that fires with the first *n* bytes of the
+            body, or the whole body if it is shorter.
+        """
+        if self._peeking is None:
+            self._peeking = self.original = _PeekingResponse(self.original)
+        return self._peeking.peek(n)
+
+    def abort(self, drain=64 * 1024):
+        """
+        Discard the rest of the body, such as after deciding with
+        :meth:`peek()` that it isn't wanted.
+
+        A body no longer than *drain* bytes is received and discarded so that
+        the connection may be reused. Otherwise the connection is closed
+        without receiving any more of it.
+
+        :param int drain: The largest body to receive rather than closing
+            the connection.
+
+        :returns: A `Deferred` that fires with `None` once the body has been
+            discarded or the connection has been closed.
+        """
+        finished = Deferred()
+        self.original.deliverBody(_Discard(self.original.length, drain, finished))
+        return finished
+
     def history(self):
         """
         Get a list of all responses that (such as intermediate redirects),
@@ -93,7 +445,9 @@ class _Response(proxyForInterface(IResponse)):  # type: ignore
         history = []
 
         while response.previousResponse is not None:
-            history.append(_Response(response.previousResponse, self._cookiejar))
+            history.append(
+                _Response(response.previousResponse, self._cookiejar, self._codecs)
+            )
             response = response.previousResponse
 
         history.reverse()
@@ -0,0 +1,328 @@
+# Copyright (c) The treq Authors.
+# See LICENSE for details.
+"""
+A client for `server-sent events
+<https://html.spec.whatwg.org/multipage/server-sent-events.html>`_.
+"""
+import codecs
+import re
+from typing import Any, Callable, List, Optional
+
+import attr
+from twisted.internet.defer import Deferred
+from twisted.internet.interfaces import IDelayedCall
+from twisted.internet.protocol import Protocol, connectionDone
+from twisted.logger import Logger
+from twisted.python.failure import Failure
+from twisted.web.client import ResponseDone
+from twisted.web.http import PotentialDataLoss
+from twisted.web.http_headers import Headers
+
+from treq._types import _ITreqReactor, _URLType
+from treq.client import HTTPClient
+
+_LINE_END = re.compile(r"\r\n|\r|\n")
+
+
+@attr.s(frozen=True, order=False, slots=True)
+class Event:
+    """
+    An event received from an event stream.
+
+    :ivar data: The event data. Multiple ``data`` fields are joined with
+        newlines.
+    :ivar type: The event type, ``"message"`` unless the server specified
+        one with an ``event`` field.
+    :ivar id: The last event ID, as set by the most recent ``id`` field.
+    """
+
+    data: str = attr.field()
+    type: str = attr.field(default="message")
+    id: str = attr.field(default="")
+
+
+class EventStreamError(Exception):
+    """
+    The server sent an event stream which treq will not process, like one
+    with an event larger than the stream's limit.
+    """
+
+
+class _EventParser:
+    """
+    Incrementally parse the ``text/event-stream`` format.
+
+    :ivar _maxSize: The maximum number of characters held for a single
+        event, including the line being received.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[Event], None],
+        setRetry: Callable[[int], None],
+        lastEventId: str = "",
+        maxSize: int = 1024 * 1024,
+    ) -> None:
+        self._dispatch = dispatch
+        self._setRetry = setRetry
+        self._maxSize = maxSize
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._pending = ""
+        self._started = False
+        self._type = ""
+        self._data: List[str] = []
+        self._size = 0
+        self._idBuffer = lastEventId
+        self.lastEventId = lastEventId
+
+    def feed(self, data: bytes) -> None:
+        text = self._decoder.decode(data)
+        if not self._started and text:
+            self._started = True
+            if text.startswith("\ufeff"):
+                text = text[1:]
+        text = self._pending + text
+        # A trailing CR may be the first half of a CRLF, so wait to see what
+        # follows it.
+        held = ""
+        if text.endswith("\r"):
+            text, held = text[:-1], "\r"
+        lines = _LINE_END.split(text)
+        self._pending = lines.pop() + held
+        for line in lines:
+            self._line(line)
+        if self._size + len(self._pending) > self._maxSize:
+            raise EventStreamError(
+                "Event exceeds {:,d} characters".format(self._maxSize)
+            )
+
+    def _line(self, line: str) -> None:
+        if not line:
+            self._dispatchEvent()
+            return
+        if line.startswith(":"):
+            return
+        name, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if name == "data":
+            self._data.append(value)
+            self._size += len(value) + 1
+        elif name == "event":
+            self._type = value
+        elif name == "id":
+            if "\0" not in value:
+                self._idBuffer = value
+        elif name == "retry":
+            if value.isdigit() and value.isascii():
+                self._setRetry(int(value))
+
+    def _dispatchEvent(self) -> None:
+        self.lastEventId = self._idBuffer
+        data, self._data, self._size = self._data, [], 0
+        eventType, self._type = self._type, ""
+        if data:
+            self._dispatch(
+                Event("\n".join(data), eventType or "message", self.lastEventId)
+            )
+
+
+class _EventStreamProtocol(Protocol):
+    def __init__(self, parser: _EventParser, finished: "Deferred[None]") -> None:
+        self._parser = parser
+        self._finished: "Optional[Deferred[None]]" = finished
+
+    def dataReceived(self, data: bytes) -> None:
+        if self._finished is None:
+            return
+        try:
+            self._parser.feed(data)
+        except Exception:
+            finished, self._finished = self._finished, None
+            self.transport.stopProducing()  # type: ignore
+            finished.errback(Failure())
+
+    def connectionLost(self, reason: Failure = connectionDone) -> None:
+        if self._finished is None:
+            return
+        finished, self._finished = self._finished, None
+        if reason.check(ResponseDone, PotentialDataLoss):
+            finished.callback(None)
+        else:
+            finished.errback(reason)
+
+
+class EventSource:
+    """
+    Receive a stream of server-sent events, reconnecting whenever the
+    connection is lost.
+
+    Events are parsed as they are received and only the event in progress is
+    buffered, up to *max_event_size* characters. Each reconnection waits for
+    the retry interval, which the server may change with a ``retry`` field,
+    and resumes the stream by sending the last event ID in a Last-Event-ID
+    header.
+
+    The stream stops for good when :meth:`close()` is called, or when the
+    server responds with a status other than 200 or a Content-Type other than
+    ``text/event-stream`` (a 204 No Content response is the conventional way
+    for a server to ask clients to stop).
+
+    :param client: The client used to make requests.
+    :param url: The URL of the event stream.
+    :param handler: A single-argument callable which receives each
+        :class:`Event`. Exceptions it raises are logged.
+    :param headers: Additional headers for each request.
+    :param float retry: The initial reconnection delay in seconds.
+    :param int max_event_size: The maximum number of characters buffered
+        for a single event. A larger event is treated as a connection error.
+    :param str last_event_id: The event ID from which to resume the stream.
+    :param reactor: Optional Twisted reactor.
+
+    :ivar last_event_id: The ID of the most recent event received.
+    :ivar retry: The current reconnection delay in seconds.
+    """
+
+    _log = Logger()
+
+    def __init__(
+        self,
+        client: HTTPClient,
+        url: _URLType,
+        handler: Callable[[Event], None],
+        *,
+        headers: Optional[Headers] = None,
+        retry: float = 3.0,
+        max_event_size: int = 1024 * 1024,
+        last_event_id: str = "",
+        reactor: Optional[_ITreqReactor] = None,
+    ) -> None:
+        if reactor is None:
+            from twisted.internet import reactor  # type: ignore
+        assert reactor is not None
+        self._client = client
+        self._url = url
+        self._handler = handler
+        self._headers = headers
+        self._reactor = reactor
+        self._maxEventSize = max_event_size
+        self.retry = retry
+        self.last_event_id = last_event_id
+        self._closed = False
+        self._request: "Optional[Deferred[Any]]" = None
+        self._protocol: Optional[_EventStreamProtocol] = None
+        self._delayedCall: Optional[IDelayedCall] = None
+        self._done: "Deferred[None]" = Deferred()
+
+    def start(self) -> "Deferred[None]":
+        """
+        Connect to the event stream.
+
+        :returns: A `Deferred` that fires with `None` when the stream is
+            closed by :meth:`close()`, or fails if the server refused to
+            provide an event stream.
+        """
+        self._connect()
+        return self._done
+
+    def close(self) -> None:
+        """
+        Disconnect from the event stream and stop reconnecting.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._delayedCall is not None and self._delayedCall.active():
+            self._delayedCall.cancel()
+        self._delayedCall = None
+        if self._request is not None:
+            self._request.cancel()
+        if self._protocol is not None and self._protocol.transport is not None:
+            self._protocol.transport.stopProducing()  # type: ignore
+        self._protocol = None
+        self._done.callback(None)
+
+    def _connect(self) -> None:
+        self._delayedCall = None
+        headers = Headers(
+            {
+                b"Accept": [b"text/event-stream"],
+                b"Cache-Control": [b"no-cache"],
+            }
+        )
+        if self._headers is not None:
+            for name, values in self._headers.getAllRawHeaders():
+                headers.setRawHeaders(name, values)
+        if self.last_event_id:
+            headers.setRawHeaders(
+                b"Last-Event-ID", [self.last_event_id.encode("utf-8")]
+            )
+        d = self._request = self._client.get(
+            self._url, headers=headers, unbuffered=True, reactor=self._reactor
+        )
+        d.addCallback(self._gotResponse)
+        d.addErrback(self._lost)
+
+    def _gotResponse(self, response: Any) -> "Optional[Deferred[None]]":
+        self._request = None
+        contentTypes = response.headers.getRawHeaders(b"content-type", [b""])
+        mediaType = contentTypes[-1].split(b";")[0].strip().lower()
+        if response.code != 200 or mediaType != b"text/event-stream":
+            self._closed = True
+            response.deliverBody(Protocol())
+            self._done.errback(
+                EventStreamError(
+                    "Expected 200 text/event-stream, got {} {!r}".format(
+                        response.code, contentTypes[-1]
+                    )
+                )
+            )
+            return None
+
+        def setRetry(milliseconds: int) -> None:
+            self.retry = milliseconds / 1000.0
+
+        parser = _EventParser(
+            self._dispatch, setRetry, self.last_event_id, self._maxEventSize
+        )
+        finished: "Deferred[None]" = Deferred()
+        self._protocol = _EventStreamProtocol(parser, finished)
+        response.deliverBody(self._protocol)
+
+        def ended(result: Any) -> None:
+            # Blank lines update the last event ID, even without data.
+            self.last_event_id = parser.lastEventId
+            self._streamEnded(result)
+
+        return finished.addBoth(ended)
+
+    def _dispatch(self, event: Event) -> None:
+        if self._closed:
+            return
+        self.last_event_id = event.id
+        try:
+            self._handler(event)
+        except Exception:
+            self._log.failure("Event handler for {url!r} failed", url=self._url)
+
+    def _streamEnded(self, result: Any) -> None:
+        self._protocol = None
+        if self._closed:
+            return
+        if isinstance(result, Failure):
+            self._lost(result)
+        else:
+            self._reconnect()
+
+    def _lost(self, reason: Failure) -> None:
+        self._request = None
+        if self._closed:
+            return
+        self._log.failure(
+            "Event stream {url!r} failed; reconnecting", reason, url=self._url
+        )
+        self._reconnect()
+
+    def _reconnect(self) -> None:
+        if not self._closed:
+            self._delayedCall = self._reactor.callLater(self.retry, self._connect)
@@ -1,3 +1,4 @@
+import gc
 from collections import OrderedDict
 from io import BytesIO
 
@@ -6,15 +7,27 @@ from unittest import mock
 from hyperlink import DecodedURL, EncodedURL
 from twisted.internet.defer import Deferred, succeed, CancelledError
 from twisted.internet.protocol import Protocol
+from twisted.internet.task import Clock
 from twisted.python.failure import Failure
 from twisted.trial.unittest import TestCase
-from twisted.web.client import Agent, ResponseFailed
+from twisted.web.client import Agent, ResponseDone, ResponseFailed
+from twisted.web.error import InfiniteRedirection
 from twisted.web.http_headers import Headers
+from twisted.web.iweb import UNKNOWN_LENGTH
 
+from treq.codec import CodecRegistry
+from treq.content import content
+from treq.test.test_codec import _ReversingCodec
 from treq.test.util import with_clock
 from treq.client import (
-    HTTPClient, _BodyBufferingProtocol, _BufferedResponse
+    BufferBudget, HTTPClient, _BodyBufferingProtocol, _BufferedResponse,
+    _Unconsumed
 )
+from treq.producers import (AsyncIterableProducer, BufferProducer,
+                            CompressingProducer, ContinueProducer,
+                            FileProducer, IterableProducer, JSONProducer,
+                            ReplayableProducer)
+from treq.response import _Discard, _Response
 
 
 class HTTPClientTests(TestCase):
@@ -26,13 +39,20 @@ class HTTPClientTests(TestCase):
         self.FileBodyProducer = self.fbp_patcher.start()
         self.addCleanup(self.fbp_patcher.stop)
 
+        self.bp_patcher = mock.patch('treq.client.BytesProducer')
+        self.BytesProducer = self.bp_patcher.start()
+        self.addCleanup(self.bp_patcher.stop)
+
         self.mbp_patcher = mock.patch('treq.multipart.MultiPartProducer')
         self.MultiPartProducer = self.mbp_patcher.start()
         self.addCleanup(self.mbp_patcher.stop)
 
     def assertBody(self, expected):
-        body = self.FileBodyProducer.mock_calls[0][1][0]
-        self.assertEqual(body.read(), expected)
+        if self.BytesProducer.mock_calls:
+            body = self.BytesProducer.mock_calls[0][1][0]
+        else:
+            body = self.FileBodyProducer.mock_calls[0][1][0].read()
+        self.assertEqual(body, expected)
 
     def test_post(self):
         self.client.post('http://example.com/')
@@ -285,7 +305,7 @@ class HTTPClientTests(TestCase):
             b'POST', b'http://example.com/',
             Headers({b'Content-Type': [b'application/x-www-form-urlencoded'],
                      b'accept-encoding': [b'gzip']}),
-            self.FileBodyProducer.return_value)
+            self.BytesProducer.return_value)
 
         self.assertBody(b'foo=bar&foo=baz')
 
@@ -297,7 +317,7 @@ class HTTPClientTests(TestCase):
             b'POST', b'http://example.com/',
             Headers({b'Content-Type': [b'application/x-www-form-urlencoded'],
                      b'accept-encoding': [b'gzip']}),
-            self.FileBodyProducer.return_value)
+            self.BytesProducer.return_value)
 
         self.assertBody(b'foo=bar')
 
@@ -309,25 +329,75 @@ class HTTPClientTests(TestCase):
             b'POST', b'http://example.com/',
             Headers({b'Content-Type': [b'application/x-www-form-urlencoded'],
                      b'accept-encoding': [b'gzip']}),
-            self.FileBodyProducer.return_value)
+            self.BytesProducer.return_value)
 
         self.assertBody(b'foo=bar')
 
+    def test_request_data_buffer(self):
+        """
+        A buffer like a `bytearray` is written by a `BufferProducer`.
+        """
+        self.client.request('POST', 'http://example.com/',
+                            data=bytearray(b'hello'))
+
+        args = self.agent.request.call_args[0]
+        self.assertIsInstance(args[3], BufferProducer)
+        self.assertEqual(5, args[3].length)
+
+    def test_request_data_generator(self):
+        """
+        A generator is written by an `IterableProducer`, and an async
+        generator by an `AsyncIterableProducer`.
+        """
+        def chunks():
+            yield b'hello'
+
+        async def async_chunks():
+            yield b'hello'
+
+        self.client.request('POST', 'http://example.com/', data=chunks())
+        self.assertIsInstance(
+            self.agent.request.call_args[0][3], IterableProducer)
+
+        self.client.request('POST', 'http://example.com/', data=async_chunks())
+        self.assertIsInstance(
+            self.agent.request.call_args[0][3], AsyncIterableProducer)
+
     def test_request_data_file(self):
         temp_fn = self.mktemp()
 
         with open(temp_fn, "wb") as temp_file:
             temp_file.write(b'hello')
 
-        self.client.request('POST', 'http://example.com/',
-                            data=open(temp_fn, 'rb'))
+        with open(temp_fn, 'rb') as f:
+            self.client.request('POST', 'http://example.com/', data=f)
+
+            self.agent.request.assert_called_once_with(
+                b'POST', b'http://example.com/',
+                Headers({b'accept-encoding': [b'gzip']}),
+                self.FileBodyProducer.return_value)
+
+            self.assertBody(b'hello')
+
+    def test_request_data_file_producer(self):
+        """
+        A file is only written from a memory map when it is passed in
+        a `FileProducer`.
+        """
+        temp_fn = self.mktemp()
+
+        with open(temp_fn, "wb") as temp_file:
+            temp_file.write(b'hello')
+
+        producer = FileProducer(open(temp_fn, 'rb'))
+        self.addCleanup(producer.stopProducing)
+        self.client.request('POST', 'http://example.com/', data=producer)
 
         self.agent.request.assert_called_once_with(
             b'POST', b'http://example.com/',
             Headers({b'accept-encoding': [b'gzip']}),
-            self.FileBodyProducer.return_value)
-
-        self.assertBody(b'hello')
+            producer)
+        self.FileBodyProducer.assert_not_called()
 
     def test_request_json_dict(self):
         self.client.request('POST', 'http://example.com/', json={'foo': 'bar'})
@@ -335,7 +405,7 @@ class HTTPClientTests(TestCase):
             b'POST', b'http://example.com/',
             Headers({b'Content-Type': [b'application/json; charset=UTF-8'],
                      b'accept-encoding': [b'gzip']}),
-            self.FileBodyProducer.return_value)
+            self.BytesProducer.return_value)
         self.assertBody(b'{"foo":"bar"}')
 
     def test_request_json_tuple(self):
@@ -344,7 +414,7 @@ class HTTPClientTests(TestCase):
             b'POST', b'http://example.com/',
             Headers({b'Content-Type': [b'application/json; charset=UTF-8'],
                      b'accept-encoding': [b'gzip']}),
-            self.FileBodyProducer.return_value)
+            self.BytesProducer.return_value)
         self.assertBody(b'["foo",1]')
 
     def test_request_json_number(self):
@@ -353,7 +423,7 @@ class HTTPClientTests(TestCase):
             b'POST', b'http://example.com/',
             Headers({b'Content-Type': [b'application/json; charset=UTF-8'],
                      b'accept-encoding': [b'gzip']}),
-            self.FileBodyProducer.return_value)
+            self.BytesProducer.return_value)
         self.assertBody(b'1.0')
 
     def test_request_json_string(self):
@@ -362,7 +432,7 @@ class HTTPClientTests(TestCase):
             b'POST', b'http://example.com/',
             Headers({b'Content-Type': [b'application/json; charset=UTF-8'],
                      b'accept-encoding': [b'gzip']}),
-            self.FileBodyProducer.return_value)
+            self.BytesProducer.return_value)
         self.assertBody(b'"hello"')
 
     def test_request_json_bool(self):
@@ -371,7 +441,7 @@ class HTTPClientTests(TestCase):
             b'POST', b'http://example.com/',
             Headers({b'Content-Type': [b'application/json; charset=UTF-8'],
                      b'accept-encoding': [b'gzip']}),
-            self.FileBodyProducer.return_value)
+            self.BytesProducer.return_value)
         self.assertBody(b'true')
 
     def test_request_json_none(self):
@@ -380,9 +450,180 @@ class HTTPClientTests(TestCase):
             b'POST', b'http://example.com/',
             Headers({b'Content-Type': [b'application/json; charset=UTF-8'],
                      b'accept-encoding': [b'gzip']}),
-            self.FileBodyProducer.return_value)
+            self.BytesProducer.return_value)
         self.assertBody(b'null')
 
+    def test_request_json_producer(self):
+        """
+        A `JSONProducer` passed as *json* is sent as it is, with a JSON
+        Content-Type.
+        """
+        producer = JSONProducer({'foo': 'bar'})
+        self.client.request('POST', 'http://example.com/', json=producer)
+        self.agent.request.assert_called_once_with(
+            b'POST', b'http://example.com/',
+            Headers({b'Content-Type': [b'application/json; charset=UTF-8'],
+                     b'accept-encoding': [b'gzip']}),
+            producer)
+
+    def test_request_json_iterator(self):
+        """
+        An iterator passed as *json* is encoded as an array by a
+        `JSONProducer`.
+        """
+        self.client.request(
+            'POST', 'http://example.com/', json=(n for n in range(3)))
+        producer = self.agent.request.call_args[0][3]
+        self.assertIsInstance(producer, JSONProducer)
+        self.assertEqual(b'[0,1,2]', b''.join(producer._iterator))
+
+    def test_request_compress(self):
+        """
+        With *compress* the body is compressed by a `CompressingProducer`,
+        and the Content-Encoding header set.
+        """
+        self.client.request('POST', 'http://example.com/', data=b'hello',
+                            compress='gzip')
+        [(_, _, headers, producer)] = [self.agent.request.call_args[0]]
+        self.assertIsInstance(producer, CompressingProducer)
+        self.assertEqual([b'gzip'], headers.getRawHeaders(b'content-encoding'))
+
+    def test_request_compress_no_body(self):
+        """
+        *compress* is ignored for a request without a body.
+        """
+        self.client.request('GET', 'http://example.com/', compress='gzip')
+        [(_, _, headers, producer)] = [self.agent.request.call_args[0]]
+        self.assertIsNone(producer)
+        self.assertFalse(headers.hasHeader(b'content-encoding'))
+
+    def test_request_compressing_producer(self):
+        """
+        A `CompressingProducer` passed as *data* sets the Content-Encoding
+        header.
+        """
+        producer = CompressingProducer(BufferProducer(bytearray(b'x')), 'deflate')
+        self.client.request('POST', 'http://example.com/', data=producer)
+        self.agent.request.assert_called_once_with(
+            b'POST', b'http://example.com/',
+            Headers({b'Content-Encoding': [b'deflate'],
+                     b'accept-encoding': [b'gzip']}),
+            producer)
+
+    def test_request_compress_content_encoding(self):
+        """
+        A body can't be compressed if a Content-Encoding header is given.
+        """
+        self.assertRaises(
+            ValueError, self.client.request, 'POST', 'http://example.com/',
+            data=b'hello', compress='gzip',
+            headers={'Content-Encoding': 'identity'})
+
+    def test_request_compress_compressing_producer(self):
+        """
+        A `CompressingProducer` passed as *data* can't be compressed again
+        with *compress*.
+        """
+        producer = CompressingProducer(BufferProducer(bytearray(b'x')), 'deflate')
+        self.assertRaises(
+            ValueError, self.client.request, 'POST', 'http://example.com/',
+            data=producer, compress='gzip')
+        self.agent.request.assert_not_called()
+
+    def test_request_expect_continue(self):
+        """
+        With *expect_continue* a body at least that long is sent with an
+        Expect header by a `ContinueProducer`, which is cancelled when the
+        response arrives.
+        """
+        clock = Clock()
+        self.agent.request.return_value = Deferred()
+        body = BufferProducer(bytearray(b'hello'))
+        d = self.client.request('POST', 'http://example.com/', data=body,
+                                expect_continue=5, reactor=clock)
+        [(_, _, headers, producer)] = [self.agent.request.call_args[0]]
+        self.assertIsInstance(producer, ContinueProducer)
+        self.assertEqual([b'100-continue'], headers.getRawHeaders(b'expect'))
+
+        producer.startProducing(mock.Mock())
+        self.agent.request.return_value.callback(
+            mock.Mock(code=413, headers=Headers({})))
+        self.assertEqual([], clock.getDelayedCalls())
+        self.assertEqual(413, self.successResultOf(d).code)
+
+    def test_request_expect_continue_small(self):
+        """
+        A body shorter than *expect_continue* is sent without waiting.
+        """
+        body = BufferProducer(bytearray(b'hello'))
+        self.client.request('POST', 'http://example.com/', data=body,
+                            expect_continue=6)
+        [(_, _, headers, producer)] = [self.agent.request.call_args[0]]
+        self.assertIs(body, producer)
+        self.assertFalse(headers.hasHeader(b'expect'))
+
+    def test_request_expect_continue_unknown_length(self):
+        """
+        A body of unknown length is sent with an Expect header.
+        """
+        self.client.request('POST', 'http://example.com/', data=b'x',
+                            compress='gzip', expect_continue=2**20)
+        [(_, _, headers, producer)] = [self.agent.request.call_args[0]]
+        self.assertIsInstance(producer, ContinueProducer)
+        self.assertEqual([b'100-continue'], headers.getRawHeaders(b'expect'))
+
+    def test_request_continue_producer(self):
+        """
+        A `ContinueProducer` passed as *data* sets the Expect header.
+        """
+        producer = ContinueProducer(BufferProducer(bytearray(b'x')))
+        self.client.request('POST', 'http://example.com/', data=producer,
+                            expect_continue=0)
+        self.agent.request.assert_called_once_with(
+            b'POST', b'http://example.com/',
+            Headers({b'Expect': [b'100-continue'],
+                     b'accept-encoding': [b'gzip']}),
+            producer)
+
+    def test_request_json_codec(self):
+        """
+        The JSON codec of the client's codec registry encodes the *json*
+        argument.
+        """
+        json_codec = mock.Mock(
+            media_type="application/json",
+            content_type=b"application/json",
+            encode=mock.Mock(return_value=b"[]"),
+        )
+        self.client = HTTPClient(self.agent, codecs=CodecRegistry([json_codec]))
+        self.client.request('POST', 'http://example.com/', json=())
+        json_codec.encode.assert_called_once_with(())
+        self.agent.request.assert_called_once_with(
+            b'POST', b'http://example.com/',
+            Headers({b'Content-Type': [b'application/json'],
+                     b'accept-encoding': [b'gzip']}),
+            self.BytesProducer.return_value)
+        self.assertBody(b'[]')
+
+    def test_request_json_codec_content_type(self):
+        """
+        When a Content-Type header is given the codec registered for it
+        encodes the *json* argument.
+        """
+        self.client = HTTPClient(
+            self.agent, codecs=CodecRegistry([_ReversingCodec()])
+        )
+        self.client.request(
+            'POST', 'http://example.com/', json=b'olleh',
+            headers={b'Content-Type': b'application/reversed'},
+        )
+        self.agent.request.assert_called_once_with(
+            b'POST', b'http://example.com/',
+            Headers({b'Content-Type': [b'application/reversed'],
+                     b'accept-encoding': [b'gzip']}),
+            self.BytesProducer.return_value)
+        self.assertBody(b'hello')
+
     @mock.patch('treq.client.uuid.uuid4', mock.Mock(return_value="heyDavid"))
     def test_request_no_name_attachment(self):
 
@@ -688,8 +929,128 @@ class HTTPClientTests(TestCase):
 
         d = self.client.get('http://www.example.com', unbuffered=True)
 
-        # YOLO public attribute.
-        self.assertEqual(self.successResultOf(d).original, response)
+        # YOLO public attribute. Unbuffered responses are wrapped to track
+        # whether they are read.
+        self.assertEqual(self.successResultOf(d).original.original, response)
+
+    def test_response_buffering_uses_budget(self):
+        """
+        The client's `BufferBudget` is charged for the bytes buffered by its
+        responses.
+        """
+        budget = BufferBudget(1024)
+        self.client = HTTPClient(self.agent, buffer_budget=budget)
+        wrappers = []
+        response = mock.Mock(
+            deliverBody=mock.Mock(wraps=wrappers.append), headers=Headers({})
+        )
+        self.agent.request.return_value = succeed(response)
+
+        result = self.successResultOf(self.client.get('http://example.com'))
+        result.deliverBody(mock.Mock(Protocol))
+        wrappers[0].dataReceived(b"hello")
+
+        self.assertEqual(budget.used, 5)
+
+    def unconsumed(self, **kwargs):
+        """
+        Make an unbuffered request whose response has a body of 10 bytes,
+        tracking it with a `Clock`.
+        """
+        clock = Clock()
+        clock.callFromThread = lambda f, *args: f(*args)
+        self.client = HTTPClient(self.agent, **kwargs)
+        response = mock.Mock(length=10, headers=Headers({}))
+        self.agent.request.return_value = succeed(response)
+        d = self.client.get('http://example.com', unbuffered=True, reactor=clock)
+        return clock, response, d
+
+    def test_unconsumed_collected(self):
+        """
+        When an unread unbuffered response is garbage collected its body is
+        discarded and the call site of the request is logged.
+        """
+        _, response, d = self.unconsumed()
+        with mock.patch.object(_Unconsumed, '_log') as log:
+            self.successResultOf(d)
+            del d
+            gc.collect()
+
+        [(protocol,), _] = response.deliverBody.call_args
+        self.assertIsInstance(protocol, _Discard)
+        log.warn.assert_called_once()
+        self.assertIn(__file__.rstrip('c'), log.warn.call_args[1]['site'])
+
+    def test_unconsumed_without_body(self):
+        """
+        An unbuffered response which has no body isn't tracked: not the
+        response to a HEAD request, a 204 or 304 response, nor one with a
+        length of 0.
+        """
+        clock = Clock()
+        self.client = HTTPClient(self.agent, unconsumed_timeout=5)
+        cases = [
+            ('HEAD', 200, 10),
+            ('DELETE', 204, UNKNOWN_LENGTH),
+            ('GET', 304, UNKNOWN_LENGTH),
+            ('GET', 200, 0),
+        ]
+        for method, code, length in cases:
+            response = mock.Mock(code=code, length=length, headers=Headers({}))
+            self.agent.request.return_value = succeed(response)
+            d = self.client.request(method, 'http://example.com',
+                                    unbuffered=True, reactor=clock)
+            with mock.patch.object(_Unconsumed, '_log') as log:
+                self.assertIs(self.successResultOf(d).original, response)
+                del d
+                gc.collect()
+
+            log.warn.assert_not_called()
+            response.deliverBody.assert_not_called()
+        self.assertEqual([], clock.getDelayedCalls())
+
+    def test_unconsumed_collected_clock(self):
+        """
+        An unread unbuffered response is released when it is garbage
+        collected even if the reactor can't be called from threads.
+        """
+        clock = Clock()
+        response = mock.Mock(length=10, headers=Headers({}))
+        self.agent.request.return_value = succeed(response)
+        d = self.client.get('http://example.com', unbuffered=True, reactor=clock)
+        with mock.patch.object(_Unconsumed, '_log'):
+            self.successResultOf(d)
+            del d
+            gc.collect()
+        [(protocol,), _] = response.deliverBody.call_args
+        self.assertIsInstance(protocol, _Discard)
+
+    def test_unconsumed_timeout(self):
+        """
+        An unbuffered response that isn't read within the client's
+        *unconsumed_timeout* has its body discarded.
+        """
+        clock, response, d = self.unconsumed(unconsumed_timeout=5)
+        result = self.successResultOf(d)
+        with mock.patch.object(_Unconsumed, '_log'):
+            clock.advance(4)
+            response.deliverBody.assert_not_called()
+            clock.advance(1)
+        [(protocol,), _] = response.deliverBody.call_args
+        self.assertIsInstance(protocol, _Discard)
+        del result
+
+    def test_consumed(self):
+        """
+        An unbuffered response whose body is read is not tracked any more.
+        """
+        clock, response, d = self.unconsumed(unconsumed_timeout=5)
+        protocol = mock.Mock(Protocol)
+        self.successResultOf(d).deliverBody(protocol)
+        del d
+        gc.collect()
+        self.assertEqual([], clock.getDelayedCalls())
+        response.deliverBody.assert_called_once_with(protocol)
 
     def test_request_post_redirect_denied(self):
         response = mock.Mock(code=302, headers=Headers({'Location': ['/']}))
@@ -710,7 +1071,98 @@ class HTTPClientTests(TestCase):
                                  browser_like_redirects=True,
                                  unbuffered=True)
 
-        self.assertEqual(self.successResultOf(d).original, final_resp)
+        self.assertEqual(self.successResultOf(d).original.original, final_resp)
+
+    def redirectOnce(self, code):
+        """
+        Respond to the first request with a redirect, and the next with 200.
+        """
+        self.agent.request.side_effect = [
+            succeed(mock.Mock(code=code, headers=Headers({'Location': ['/b']}))),
+            succeed(mock.Mock(code=200, headers=Headers({}))),
+        ]
+
+    def test_request_post_307_redirect(self):
+        """
+        A 307 redirect of a POST is followed with the body made again.
+        """
+        self.redirectOnce(307)
+        d = self.client.post('http://example.com/a', data=b'hello')
+        self.assertEqual(200, self.successResultOf(d).code)
+        [_, (method, url, _, producer)] = [
+            c[0] for c in self.agent.request.call_args_list]
+        self.assertEqual((b'POST', b'http://example.com/b'), (method, url))
+        self.assertIs(self.BytesProducer.return_value, producer)
+        self.assertEqual(
+            [mock.call(b'hello'), mock.call(b'hello')],
+            self.BytesProducer.call_args_list)
+
+    def test_request_post_308_replayable_producer(self):
+        """
+        A 308 redirect is followed with a `ReplayableProducer`, which is
+        closed once the response is received.
+        """
+        self.redirectOnce(308)
+        body = ReplayableProducer(BytesIO(b'hello'))
+        d = self.client.post('http://example.com/a', data=body)
+        self.successResultOf(d)
+        [first, second] = [c[0][3] for c in self.agent.request.call_args_list]
+        self.assertIs(body, first)
+        self.assertIs(body, second)
+        self.assertFalse(body.replayable)
+
+    def test_request_post_307_compressed(self):
+        """
+        A compressed body is compressed afresh when it is sent again.
+        """
+        self.redirectOnce(307)
+        self.client.post('http://example.com/a', data=b'hello',
+                         compress='gzip')
+        [first, second] = [c[0][3] for c in self.agent.request.call_args_list]
+        self.assertIsInstance(second, CompressingProducer)
+        self.assertIsNot(first, second)
+
+    def test_request_post_307_not_replayable(self):
+        """
+        A 307 redirect isn't followed when the body can't be sent again.
+        """
+        self.redirectOnce(307)
+        d = self.client.post('http://example.com/a',
+                             data=(chunk for chunk in [b'hello']))
+        self.failureResultOf(d, ResponseFailed)
+        self.assertEqual(1, self.agent.request.call_count)
+
+    def test_request_post_307_other_origin(self):
+        """
+        Credentials aren't sent when a 307 redirect is followed to another
+        origin.
+        """
+        self.agent.request.side_effect = [
+            succeed(mock.Mock(
+                code=307,
+                headers=Headers({'Location': ['https://other.example/b']}))),
+            succeed(mock.Mock(code=200, headers=Headers({}))),
+        ]
+        d = self.client.post('http://example.com/a', data=b'hello',
+                             headers={'Authorization': 'secret',
+                                      'X-Foo': 'bar'})
+        self.assertEqual(200, self.successResultOf(d).code)
+        [_, (_, url, headers, _)] = [
+            c[0] for c in self.agent.request.call_args_list]
+        self.assertEqual(b'https://other.example/b', url)
+        self.assertIsNone(headers.getRawHeaders('Authorization'))
+        self.assertEqual(['bar'], headers.getRawHeaders('X-Foo'))
+
+    def test_request_post_307_limit(self):
+        """
+        Only 20 redirects are followed with the body made again.
+        """
+        self.agent.request.side_effect = lambda *args: succeed(
+            mock.Mock(code=307, headers=Headers({'Location': ['/a']})))
+        d = self.client.post('http://example.com/a', data=b'hello')
+        failure = self.failureResultOf(d, ResponseFailed)
+        self.assertTrue(failure.value.reasons[0].check(InfiniteRedirection))
+        self.assertEqual(21, self.agent.request.call_count)
 
 
 class BodyBufferingProtocolTests(TestCase):
@@ -833,3 +1285,220 @@ class BufferedResponseTests(TestCase):
 
         finished.dataReceived.assert_called_once_with(b"foo")
         finished.connectionLost.assert_called_once_with(done)
+
+
+class BufferBudgetTests(TestCase):
+    def deliver(self, budget, reactor=None):
+        """
+        Create a `_BufferedResponse` charged to *budget* and start delivering
+        its body over a mock transport.
+
+        :returns: (response, buffering protocol, transport) tuple
+        """
+        wrappers = []
+        response = _BufferedResponse(
+            mock.Mock(deliverBody=mock.Mock(wraps=wrappers.append)),
+            budget,
+            reactor,
+        )
+        response.deliverBody(mock.Mock(Protocol))
+        transport = mock.Mock(["pauseProducing", "resumeProducing"])
+        wrappers[0].makeConnection(transport)
+        return response, wrappers[0], transport
+
+    def test_invalid_limit(self):
+        """
+        The limit must be a positive number of bytes.
+        """
+        self.assertRaises(ValueError, BufferBudget, 0)
+
+    def test_charges_buffered_bytes(self):
+        """
+        Bytes buffered by a response count against the budget.
+        """
+        budget = BufferBudget(10)
+        _, protocol, transport = self.deliver(budget)
+
+        protocol.dataReceived(b"foo")
+        protocol.dataReceived(b"bar")
+
+        self.assertEqual(budget.used, 6)
+        self.assertFalse(budget.exhausted)
+        self.assertEqual(budget.paused, 0)
+        transport.pauseProducing.assert_not_called()
+
+    def test_pauses_when_exhausted(self):
+        """
+        When the budget is exhausted the transport of a response receiving
+        data is paused, once, while another response is still receiving
+        its body.
+        """
+        budget = BufferBudget(4)
+        _, firstProtocol, firstTransport = self.deliver(budget)
+        _, secondProtocol, secondTransport = self.deliver(budget)
+
+        firstProtocol.dataReceived(b"foo")
+        secondProtocol.dataReceived(b"bar")
+        secondProtocol.dataReceived(b"baz")
+
+        self.assertTrue(budget.exhausted)
+        self.assertEqual(budget.paused, 1)
+        secondTransport.pauseProducing.assert_called_once_with()
+        self.assertEqual(
+            repr(budget), "<BufferBudget used=9 limit=4 paused=1>"
+        )
+
+        firstProtocol.dataReceived(b"spam")
+        firstTransport.pauseProducing.assert_not_called()
+
+    def test_oversized_body_completes(self):
+        """
+        A body larger than the limit isn't paused when it is the only one
+        being received, and its bytes are released once it is complete.
+        """
+        budget = BufferBudget(4)
+        response, protocol, transport = self.deliver(budget)
+
+        protocol.dataReceived(b"spam")
+        protocol.dataReceived(b"eggs")
+        protocol.connectionLost(Failure(ResponseDone()))
+
+        transport.pauseProducing.assert_not_called()
+        self.assertEqual(budget.used, 0)
+        self.assertEqual(budget.paused, 0)
+        self.assertEqual(
+            self.successResultOf(content(response)), b"spameggs"
+        )
+
+    def test_resumes_when_others_complete(self):
+        """
+        A paused transport is resumed when every other response has
+        received its body, even if the budget remains exhausted.
+        """
+        budget = BufferBudget(4)
+        _, firstProtocol, firstTransport = self.deliver(budget)
+        _, secondProtocol, secondTransport = self.deliver(budget)
+        firstProtocol.dataReceived(b"spam")
+        firstTransport.pauseProducing.assert_called_once_with()
+
+        secondProtocol.dataReceived(b"eggs")
+        secondTransport.pauseProducing.assert_not_called()
+        firstTransport.resumeProducing.assert_not_called()
+
+        secondProtocol.connectionLost(Failure(ResponseDone()))
+
+        self.assertEqual(budget.used, 4)
+        self.assertEqual(budget.paused, 0)
+        firstTransport.resumeProducing.assert_called_once_with()
+
+    def test_released_when_complete(self):
+        """
+        A response which has received its body doesn't hold any of the
+        budget, even while it is kept alive, and paused transports are
+        resumed.
+        """
+        budget = BufferBudget(4)
+        first, firstProtocol, _ = self.deliver(budget)
+        firstProtocol.dataReceived(b"spam")
+        _, secondProtocol, transport = self.deliver(budget)
+        secondProtocol.dataReceived(b"x")
+        transport.pauseProducing.assert_called_once_with()
+
+        firstProtocol.connectionLost(Failure(ResponseDone()))
+
+        self.assertEqual(budget.used, 1)
+        self.assertEqual(budget.paused, 0)
+        transport.resumeProducing.assert_called_once_with()
+        self.assertEqual(self.successResultOf(content(first)), b"spam")
+
+    def test_resumes_when_collected(self):
+        """
+        Paused transports are resumed when a buffered response whose body
+        never completes is garbage collected and its bytes are released.
+        """
+        budget = BufferBudget(4)
+        first, firstProtocol, _ = self.deliver(budget)
+        firstProtocol.dataReceived(b"spam")
+        second, secondProtocol, transport = self.deliver(budget)
+        secondProtocol.dataReceived(b"x")
+        transport.pauseProducing.assert_called_once_with()
+
+        del first, firstProtocol
+        gc.collect()
+
+        self.assertEqual(budget.used, 1)
+        self.assertEqual(budget.paused, 0)
+        transport.resumeProducing.assert_called_once_with()
+
+    def test_collected_in_reactor_thread(self):
+        """
+        The bytes of a collected response are released, and paused
+        transports resumed, in the reactor thread.
+        """
+        reactor = mock.Mock(["callFromThread"])
+        budget = BufferBudget(4)
+        first, firstProtocol, _ = self.deliver(budget, reactor)
+        firstProtocol.dataReceived(b"spam")
+        _, secondProtocol, transport = self.deliver(budget, reactor)
+        secondProtocol.dataReceived(b"x")
+
+        del first, firstProtocol
+        gc.collect()
+
+        self.assertEqual(budget.used, 5)
+        transport.resumeProducing.assert_not_called()
+        [(_, (release,), _)] = reactor.callFromThread.mock_calls
+        release()
+        self.assertEqual(budget.used, 1)
+        transport.resumeProducing.assert_called_once_with()
+
+    def test_peeked_not_receiving(self):
+        """
+        A body paused by `peek()` doesn't count as receiving, so another body
+        is left to make progress, and its transport isn't resumed by the
+        budget.
+        """
+        budget = BufferBudget(4)
+        wrappers = []
+        peeked = _Response(
+            _BufferedResponse(
+                mock.Mock(deliverBody=mock.Mock(wraps=wrappers.append)), budget
+            ),
+            None,
+        )
+        d = peeked.peek(2)
+        peekTransport = mock.Mock(["pauseProducing", "resumeProducing"])
+        wrappers[0].makeConnection(peekTransport)
+        wrappers[0].dataReceived(b"spam")
+        self.assertEqual(b"sp", self.successResultOf(d))
+        peekTransport.pauseProducing.assert_called_once_with()
+
+        _, protocol, transport = self.deliver(budget)
+        protocol.dataReceived(b"eggs")
+        transport.pauseProducing.assert_not_called()
+
+        protocol.connectionLost(Failure(ResponseDone()))
+        self.assertEqual(budget.paused, 0)
+        peekTransport.resumeProducing.assert_not_called()
+
+    def test_consumer_paused_while_waiting(self):
+        """
+        A body paused by the budget and then by the protocol reading it stays
+        paused when the budget is released, until that protocol resumes it.
+        """
+        budget = BufferBudget(4)
+        _, firstProtocol, _ = self.deliver(budget)
+        firstProtocol.dataReceived(b"spam")
+        _, secondProtocol, transport = self.deliver(budget)
+        secondProtocol.dataReceived(b"x")
+        transport.pauseProducing.assert_called_once_with()
+        [consumerTransport] = secondProtocol.original.makeConnection.call_args[0]
+
+        consumerTransport.pauseProducing()
+        self.assertEqual(budget.paused, 0)
+        firstProtocol.connectionLost(Failure(ResponseDone()))
+        transport.resumeProducing.assert_not_called()
+
+        consumerTransport.resumeProducing()
+        transport.resumeProducing.assert_called_once_with()
+        transport.pauseProducing.assert_called_once_with()
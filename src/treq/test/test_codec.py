@@ -0,0 +1,145 @@
+from unittest import mock
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from treq import codec
+from treq.codec import (CBORCodec, CodecRegistry, JSONCodec, MsgpackCodec,
+                        OrjsonCodec)
+
+
+class _ReversingCodec:
+    """
+    A trivial codec for an ``application/reversed`` media type.
+    """
+
+    media_type = "application/reversed"
+    content_type = b"application/reversed"
+
+    def encode(self, value):
+        return value[::-1]
+
+    def decode(self, data, **kwargs):
+        return data[::-1]
+
+
+class JSONCodecTests(SynchronousTestCase):
+    def test_encode(self):
+        """
+        Values are encoded compactly as UTF-8.
+        """
+        self.assertEqual(
+            JSONCodec().encode({"a": ["☃", 1]}),
+            b'{"a":["\\u2603",1]}',
+        )
+
+    def test_decode_bytes(self):
+        """
+        Bytes are decoded directly, in any of the encodings permitted by RFC
+        8259.
+        """
+        self.assertEqual(JSONCodec().decode(b'{"a":1}'), {"a": 1})
+        self.assertEqual(
+            JSONCodec().decode('["☃"]'.encode("utf-16-le")), ["☃"]
+        )
+
+    def test_decode_kwargs(self):
+        """
+        Keyword arguments are passed to :func:`json.loads`.
+        """
+        self.assertEqual(
+            JSONCodec().decode(b"1.5", parse_float=str), "1.5"
+        )
+
+
+class OptionalCodecTests(SynchronousTestCase):
+    def test_missing_dependency(self):
+        """
+        Codecs which depend on packages that aren't installed raise
+        `ImportError` when constructed.
+        """
+        with mock.patch.object(codec, "orjson", None), mock.patch.object(
+            codec, "msgpack", None
+        ), mock.patch.object(codec, "cbor2", None):
+            self.assertRaises(ImportError, OrjsonCodec)
+            self.assertRaises(ImportError, MsgpackCodec)
+            self.assertRaises(ImportError, CBORCodec)
+
+    def test_orjson(self):
+        """
+        `OrjsonCodec` delegates to orjson, which works with bytes.
+        """
+        orjson = mock.Mock(dumps=mock.Mock(return_value=b"[1]"),
+                           loads=mock.Mock(return_value=[1]))
+        with mock.patch.object(codec, "orjson", orjson):
+            c = OrjsonCodec()
+            self.assertEqual(c.encode([1]), b"[1]")
+            self.assertEqual(c.decode(b"[1]"), [1])
+            self.assertRaises(TypeError, c.decode, b"[1]", parse_float=str)
+        orjson.dumps.assert_called_once_with([1])
+        orjson.loads.assert_called_once_with(b"[1]")
+
+    def test_msgpack(self):
+        """
+        `MsgpackCodec` delegates to msgpack.
+        """
+        msgpack = mock.Mock(packb=mock.Mock(return_value=b"\x91\x01"),
+                            unpackb=mock.Mock(return_value=[1]))
+        with mock.patch.object(codec, "msgpack", msgpack):
+            c = MsgpackCodec()
+            self.assertEqual(c.encode([1]), b"\x91\x01")
+            self.assertEqual(c.decode(b"\x91\x01"), [1])
+
+    def test_cbor(self):
+        """
+        `CBORCodec` delegates to cbor2.
+        """
+        cbor2 = mock.Mock(dumps=mock.Mock(return_value=b"\x81\x01"),
+                          loads=mock.Mock(return_value=[1]))
+        with mock.patch.object(codec, "cbor2", cbor2):
+            c = CBORCodec()
+            self.assertEqual(c.encode([1]), b"\x81\x01")
+            self.assertEqual(c.decode(b"\x81\x01"), [1])
+
+
+class CodecRegistryTests(SynchronousTestCase):
+    def test_json_default(self):
+        """
+        The standard library JSON codec is registered by default.
+        """
+        self.assertIsInstance(CodecRegistry().json, JSONCodec)
+
+    def test_replace_json(self):
+        """
+        A codec passed for ``application/json`` replaces the default.
+        """
+        replacement = mock.Mock(media_type="application/json")
+        self.assertIs(CodecRegistry([replacement]).json, replacement)
+
+    def test_for_content_type(self):
+        """
+        Codecs are found by the media type of a Content-Type header, ignoring
+        case and parameters.
+        """
+        reversing = _ReversingCodec()
+        registry = CodecRegistry([reversing])
+
+        self.assertIs(
+            registry.for_content_type(b"Application/Reversed; charset=x"),
+            reversing,
+        )
+        self.assertIs(
+            registry.for_content_type("application/json"), registry.json
+        )
+        self.assertIsNone(registry.for_content_type(b"text/plain"))
+
+    def test_for_content_type_suffix(self):
+        """
+        Media types with a structured syntax suffix use the codec for the
+        suffix.
+        """
+        registry = CodecRegistry()
+        self.assertIs(
+            registry.for_content_type(b"application/problem+json"),
+            registry.json,
+        )
+        self.assertIsNone(registry.for_content_type(b"application/foo+xml"))
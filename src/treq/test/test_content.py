@@ -1,3 +1,4 @@
+import csv
 import unittest
 from unittest import mock
 from typing import Optional
@@ -13,8 +14,12 @@ from twisted.web.resource import Resource
 from twisted.web.server import NOT_DONE_YET
 
 from treq import collect, content, json_content, text_content
-from treq.content import _encoding_from_headers
+from treq.content import (collect_csv, collect_json_items, collect_lines,
+                          collect_ndjson, tee)
+from treq.content import (_content_cache, _encoding_from_headers,
+                          _JSONItemParser)
 from treq.client import _BufferedResponse
+from treq.response import _Response
 from treq.testing import StubTreq
 
 
@@ -111,6 +116,78 @@ class ContentTests(TestCase):
 
         self.assertNotIdentical(d1, d3)
 
+    def test_content_memoized(self):
+        """
+        The body is assembled once and the same bytes are returned for every
+        subsequent call.
+        """
+        d1 = content(self.response)
+
+        self.protocol.dataReceived(b'foo')
+        self.protocol.dataReceived(b'bar')
+        self.protocol.connectionLost(Failure(ResponseDone()))
+
+        self.assertIs(
+            self.successResultOf(content(self.response)),
+            self.successResultOf(d1),
+        )
+
+    def test_content_compacts_buffer(self):
+        """
+        Once the body of a buffered response has been assembled its segments
+        are replaced with the assembled bytes.
+        """
+        d = content(self.response)
+
+        self.protocol.dataReceived(b'foo')
+        self.protocol.dataReceived(b'bar')
+        self.protocol.connectionLost(Failure(ResponseDone()))
+
+        self.assertEqual([self.successResultOf(d)], self.response._buffer)
+
+    def test_content_of_wrapper(self):
+        """
+        The body of a buffered response is cached under, and compacts, the
+        buffered response when read through treq's wrapper of it, so that
+        the wrapper's methods find it too.
+        """
+        response = _Response(self.response, None)
+        d = content(response)
+
+        self.protocol.dataReceived(b'foo')
+        self.protocol.dataReceived(b'bar')
+        self.protocol.connectionLost(Failure(ResponseDone()))
+
+        body = self.successResultOf(d)
+        self.assertEqual([body], self.response._buffer)
+        self.assertIs(body, _content_cache[self.response])
+        self.assertNotIn(response, _content_cache)
+        self.assertIs(body, self.successResultOf(response.content()))
+
+    def test_content_unbuffered_cached(self):
+        """
+        The body of an unbuffered response may be retrieved more than once.
+        """
+        response = mock.Mock()
+        response.deliverBody.side_effect = lambda p: (
+            p.dataReceived(b'foo'),
+            p.connectionLost(Failure(ResponseDone())),
+        )
+
+        self.assertEqual(self.successResultOf(content(response)), b'foo')
+        self.assertEqual(self.successResultOf(content(response)), b'foo')
+        self.assertEqual(response.deliverBody.call_count, 1)
+
+    def test_content_failure_not_cached(self):
+        """
+        A failure to read the body is not cached.
+        """
+        d = content(self.response)
+        self.protocol.connectionLost(Failure(ResponseFailed("test failure")))
+        self.failureResultOf(d, ResponseFailed)
+
+        self.assertNotIn(self.response, _content_cache)
+
     def test_content_multiple_waiters(self):
         d1 = content(self.response)
         d2 = content(self.response)
@@ -326,3 +403,416 @@ class EncodingFromHeadersTests(unittest.TestCase):
             "text/plain;charset=🙃",
         ]:
             self.assertIsNone(self._encodingFromContentType(example))
+
+
+class CollectJSONItemsTests(TestCase):
+    def setUp(self):
+        self.response = mock.Mock()
+        self.protocol = None
+
+        def deliverBody(protocol):
+            self.protocol = protocol
+
+        self.response.deliverBody.side_effect = deliverBody
+
+    def deliver(self, *chunks):
+        for chunk in chunks:
+            self.protocol.dataReceived(chunk)
+        self.protocol.connectionLost(Failure(ResponseDone()))
+
+    def test_top_level_array(self):
+        """
+        The items of a top-level array are delivered as each is completed,
+        however the body is split into chunks.
+        """
+        body = (
+            b' [1, "a,]\\"b", {"x": [1, {"y": "}"}]}, [], null, true,'
+            b' -2.5e3 ] '
+        )
+        expected = [1, 'a,]"b', {"x": [1, {"y": "}"}]}, [], None, True, -2.5e3]
+        for size in [1, 2, 7, len(body)]:
+            items = []
+            d = collect_json_items(self.response, items.append)
+            self.deliver(*[body[i:i + size] for i in range(0, len(body), size)])
+            self.assertIsNone(self.successResultOf(d))
+            self.assertEqual(expected, items)
+
+    def test_incremental(self):
+        """
+        An item is delivered as soon as its end is received.
+        """
+        items = []
+        collect_json_items(self.response, items.append)
+
+        self.protocol.dataReceived(b'[{"a": 1}, {"b"')
+        self.assertEqual([{"a": 1}], items)
+        self.protocol.dataReceived(b': 2}, 3')
+        self.assertEqual([{"a": 1}, {"b": 2}], items)
+        self.protocol.dataReceived(b']')
+        self.assertEqual([{"a": 1}, {"b": 2}, 3], items)
+
+    def test_nested_path(self):
+        """
+        The path selects an array nested in objects, ignoring arrays at other
+        paths.
+        """
+        items = []
+        d = collect_json_items(self.response, items.append, "data.items.item")
+        self.deliver(
+            b'{"items": [0], "data": {"items\\u0000": [1], "n": {"items": [2]},',
+            b' "items": [{"id": 3}, {"items": [4]}], "z": [5]}}',
+        )
+        self.successResultOf(d)
+        self.assertEqual([{"id": 3}, {"items": [4]}], items)
+
+    def test_item_key(self):
+        """
+        An object member named ``item`` isn't mistaken for an array.
+        """
+        for body, expected in [
+            (b'{"item": 1, "results": [1, 2]}', [1, 2]),
+            (b'{"meta": {"item": 5}, "results": [{"item": 3}, 4]}',
+             [{"item": 3}, 4]),
+        ]:
+            items = []
+            d = collect_json_items(self.response, items.append, "results.item")
+            self.deliver(body)
+            self.successResultOf(d)
+            self.assertEqual(expected, items)
+
+    def test_split_string(self):
+        """
+        A string split across chunks is scanned from where the previous
+        chunk ended, rather than from its start, including when a chunk
+        ends in a backslash.
+        """
+        items = []
+        parser = _JSONItemParser("item", items.append)
+        parser.feed(b'["ab')
+        self.assertEqual(len(parser._buffer), parser._pos)
+        parser.feed(b'cd\\')
+        self.assertEqual(len(parser._buffer) - 1, parser._pos)
+        parser.feed(b'"e", "f\\')
+        parser.feed(b'\\"]')
+        parser.close()
+        self.assertEqual(['abcd"e', 'f\\'], items)
+
+    def test_path_not_found(self):
+        """
+        A document without an array at the path is an error.
+        """
+        for body, path in [
+            (b'{"items": [1]}', "item"),
+            (b'1', "item"),
+            (b'{"results": 5}', "results.item"),
+        ]:
+            d = collect_json_items(self.response, lambda item: None, path)
+            self.deliver(body)
+            self.failureResultOf(d, ValueError)
+
+    def test_empty_array(self):
+        items = []
+        d = collect_json_items(self.response, items.append)
+        self.deliver(b'[ ]')
+        self.successResultOf(d)
+        self.assertEqual([], items)
+
+    def test_json_kwargs(self):
+        """
+        Keyword arguments are passed to :func:`json.loads`.
+        """
+        items = []
+        d = collect_json_items(self.response, items.append, parse_int=str)
+        self.deliver(b'[1,2]')
+        self.successResultOf(d)
+        self.assertEqual(["1", "2"], items)
+
+    def test_invalid_path(self):
+        """
+        The path must select array items.
+        """
+        self.assertRaises(
+            ValueError, collect_json_items, self.response, print, "items"
+        )
+
+    def test_truncated(self):
+        """
+        A body which ends before the document is complete is an error.
+        """
+        items = []
+        d = collect_json_items(self.response, items.append)
+        self.deliver(b'[1, 2')
+        self.failureResultOf(d, ValueError)
+        self.assertEqual([1], items)
+
+    def test_invalid_item(self):
+        """
+        An invalid item is an error, and closes the connection.
+        """
+        for body in [b'[1, }', b'[1, ]', b'[,]', b'[1, {]}', b'[1 2]']:
+            d = collect_json_items(self.response, lambda item: None)
+            self.protocol.transport = mock.Mock()
+            self.protocol.dataReceived(body)
+            self.failureResultOf(d, ValueError)
+            self.protocol.transport.loseConnection.assert_called_once_with()
+
+
+class _StreamingTestMixin:
+    def setUp(self):
+        self.response = mock.Mock(headers=Headers())
+        self.protocol = None
+
+        def deliverBody(protocol):
+            self.protocol = protocol
+
+        self.response.deliverBody.side_effect = deliverBody
+
+    def deliver(self, *chunks):
+        for chunk in chunks:
+            self.protocol.dataReceived(chunk)
+        self.protocol.connectionLost(Failure(ResponseDone()))
+
+
+class CollectLinesTests(_StreamingTestMixin, TestCase):
+    def test_lines(self):
+        """
+        Lines ending in LF or CRLF are delivered without their line endings,
+        however they are split into chunks. The final line need not end in
+        a newline.
+        """
+        lines = []
+        d = collect_lines(self.response, lines.append)
+        self.deliver(b"a\r", b"\nb", b"c\n\n", b"\xa1\r\nd")
+        self.successResultOf(d)
+        self.assertEqual(["a", "bc", "", "\xa1", "d"], lines)
+
+    def test_incremental(self):
+        """
+        A line is delivered as soon as its line ending has been received.
+        """
+        lines = []
+        collect_lines(self.response, lines.append)
+        self.protocol.dataReceived(b"a\nb")
+        self.assertEqual(["a"], lines)
+
+    def test_charset(self):
+        """
+        The body is decoded incrementally with the charset from the
+        Content-Type header, so multi-byte characters may span chunks.
+        """
+        self.response.headers = Headers(
+            {b"Content-Type": [b"text/plain; charset=utf-16-le"]}
+        )
+        body = "\u2603\nx\n".encode("utf-16-le")
+        lines = []
+        d = collect_lines(self.response, lines.append)
+        self.deliver(*[body[i:i + 1] for i in range(len(body))])
+        self.successResultOf(d)
+        self.assertEqual(["\u2603", "x"], lines)
+
+    def test_encoding(self):
+        """
+        The *encoding* is used when the response has no charset.
+        """
+        lines = []
+        d = collect_lines(self.response, lines.append, encoding="utf-8")
+        self.deliver(b"\xe2\x98", b"\x83")
+        self.successResultOf(d)
+        self.assertEqual(["\u2603"], lines)
+
+
+class CollectNDJSONTests(_StreamingTestMixin, TestCase):
+    def test_values(self):
+        """
+        Each line is decoded as a JSON value. Blank lines are skipped.
+        """
+        values = []
+        d = collect_ndjson(self.response, values.append)
+        self.deliver(b'{"a": 1}\n[', b'2]\r\n\n  \n"\xe2\x98\x83"')
+        self.successResultOf(d)
+        self.assertEqual([{"a": 1}, [2], "\u2603"], values)
+
+    def test_kwargs(self):
+        """
+        Keyword arguments are passed to :func:`json.loads`.
+        """
+        values = []
+        d = collect_ndjson(self.response, values.append, parse_int=str)
+        self.deliver(b"1\n")
+        self.successResultOf(d)
+        self.assertEqual(["1"], values)
+
+    def test_invalid(self):
+        """
+        A line that isn't JSON is an error.
+        """
+        d = collect_ndjson(self.response, lambda value: None)
+        self.protocol.transport = mock.Mock()
+        self.protocol.dataReceived(b"1\n{\n")
+        self.failureResultOf(d, ValueError)
+
+
+class CollectCSVTests(_StreamingTestMixin, TestCase):
+    def test_records(self):
+        """
+        Records are parsed however the body is split into chunks, including
+        quoted fields which contain delimiters and line breaks. Blank lines
+        are skipped.
+        """
+        body = b'a,b\r\n"x, ""y""",\r\n\r\n"multi\nline",\xe2\x98\x83\nlast,1'
+        for size in [1, 3, len(body)]:
+            records = []
+            d = collect_csv(self.response, records.append)
+            self.deliver(*[body[i:i + size] for i in range(0, len(body), size)])
+            self.successResultOf(d)
+            self.assertEqual(
+                [
+                    ["a", "b"],
+                    ['x, "y"', ""],
+                    ["multi\nline", "\u2603"],
+                    ["last", "1"],
+                ],
+                records,
+            )
+
+    def test_fmtparams(self):
+        """
+        Format parameters are passed to :func:`csv.reader`.
+        """
+        records = []
+        d = collect_csv(
+            self.response, records.append, delimiter=";", quotechar="'"
+        )
+        self.deliver(b"'a;b';\"c\n")
+        self.successResultOf(d)
+        self.assertEqual([["a;b", '"c']], records)
+
+    def test_quote_in_unquoted_field(self):
+        """
+        A quote within a field that doesn't start with one is part of the
+        field, as for :func:`csv.reader`, and doesn't start a quoted field.
+        """
+        records = []
+        d = collect_csv(self.response, records.append)
+        self.deliver(b'a,b\n12" pipe,x\nc,d\n"multi\nline",e\n')
+        self.successResultOf(d)
+        self.assertEqual(
+            [["a", "b"], ['12" pipe', "x"], ["c", "d"], ["multi\nline", "e"]],
+            records,
+        )
+
+    def test_escapechar(self):
+        """
+        An escaped quote doesn't end a quoted field, and an escaped line
+        break doesn't end a record.
+        """
+        records = []
+        d = collect_csv(self.response, records.append, escapechar="\\")
+        self.deliver(b'"a\\"\nb",c\\\nd\ne\n')
+        self.successResultOf(d)
+        self.assertEqual([['a"\nb', "c\nd"], ["e"]], records)
+
+    def test_unterminated(self):
+        """
+        A quoted field which is not closed by the end of the body is an error.
+        """
+        d = collect_csv(self.response, lambda record: None)
+        self.deliver(b'a,"b\n')
+        self.failureResultOf(d, csv.Error)
+
+
+class _RecordingConsumer:
+    def __init__(self):
+        self.written = []
+        self.producer = None
+        self.streaming = None
+        self.unregistered = False
+
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+        self.streaming = streaming
+
+    def unregisterProducer(self):
+        self.unregistered = True
+
+    def write(self, data):
+        self.written.append(data)
+
+
+class TeeTests(_StreamingTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.consumers = [_RecordingConsumer(), _RecordingConsumer()]
+        self.finished = tee(self.response, self.consumers)
+        self.transport = mock.Mock(
+            ["pauseProducing", "resumeProducing", "stopProducing"]
+        )
+        self.protocol.makeConnection(self.transport)
+
+    def test_writes_to_all(self):
+        """
+        Each chunk is written to every consumer, and streaming producers are
+        registered for the duration of the body.
+        """
+        self.assertEqual([True, True], [c.streaming for c in self.consumers])
+        self.deliver(b"foo", b"bar")
+        self.assertIsNone(self.successResultOf(self.finished))
+        for consumer in self.consumers:
+            self.assertEqual([b"foo", b"bar"], consumer.written)
+            self.assertTrue(consumer.unregistered)
+
+    def test_slowest_consumer(self):
+        """
+        The transport is paused while any consumer is paused, and resumed
+        when all have resumed.
+        """
+        first, second = [c.producer for c in self.consumers]
+        first.pauseProducing()
+        second.pauseProducing()
+        first.pauseProducing()
+        self.transport.pauseProducing.assert_called_once_with()
+
+        first.resumeProducing()
+        self.transport.resumeProducing.assert_not_called()
+        second.resumeProducing()
+        second.resumeProducing()
+        self.transport.resumeProducing.assert_called_once_with()
+
+    def test_paused_before_connection(self):
+        """
+        A consumer which pauses as soon as its producer is registered pauses
+        the transport once it is available.
+        """
+        consumer = _RecordingConsumer()
+        consumer.registerProducer = lambda producer, streaming: (
+            producer.pauseProducing()
+        )
+        tee(self.response, [consumer])
+        self.protocol.makeConnection(self.transport)
+        self.transport.pauseProducing.assert_called_once_with()
+
+    def test_stop(self):
+        """
+        A consumer which stops its producer aborts the response.
+        """
+        self.consumers[0].producer.stopProducing()
+        self.transport.stopProducing.assert_called_once_with()
+
+    def test_write_error(self):
+        """
+        An exception from a consumer's write aborts the response and fails
+        the returned Deferred.
+        """
+        self.consumers[1].write = mock.Mock(side_effect=ZeroDivisionError())
+        self.protocol.dataReceived(b"foo")
+        self.transport.stopProducing.assert_called_once_with()
+        self.protocol.connectionLost(Failure(ResponseFailed([])))
+        self.failureResultOf(self.finished, ZeroDivisionError)
+        self.assertTrue(self.consumers[0].unregistered)
+
+    def test_failure(self):
+        """
+        A failure to receive the body fails the returned Deferred.
+        """
+        self.protocol.connectionLost(Failure(ResponseFailed([])))
+        self.failureResultOf(self.finished, ResponseFailed)
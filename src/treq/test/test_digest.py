@@ -0,0 +1,267 @@
+import base64
+import hashlib
+from unittest import mock
+
+from twisted.python.failure import Failure
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.client import GzipDecoder, ResponseDone, ResponseFailed
+from twisted.web.http_headers import Headers
+from twisted.web.iweb import UNKNOWN_LENGTH
+from twisted.web.resource import Resource
+
+from treq.content import collect, content
+from treq.digest import (DigestMismatch, _DigestingResponse,
+                         _parse_content_digest, _parse_instance_digest)
+from treq.testing import StubTreq
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+SHA256 = hashlib.sha256(b"foobar").digest()
+MD5 = hashlib.md5(b"foobar").digest()
+
+
+class FakeResponse:
+    def __init__(self, headers=None, body=(b"foo", b"bar"), code=200):
+        self.code = code
+        self.phrase = b"OK"
+        self.version = (b"HTTP", 1, 1)
+        self.headers = Headers(headers or {})
+        self.length = UNKNOWN_LENGTH
+        self.previousResponse = None
+        self.body = body
+        self.reason = Failure(ResponseDone())
+
+    def deliverBody(self, protocol):
+        for chunk in self.body:
+            protocol.dataReceived(chunk)
+        protocol.connectionLost(self.reason)
+
+
+class ParseTests(SynchronousTestCase):
+    def test_content_digest(self):
+        """
+        Content-Digest is a dictionary of byte sequences; unsupported
+        algorithms, parameters, and malformed members are skipped.
+        """
+        self.assertEqual(
+            [("sha256", SHA256), ("md5", MD5)],
+            _parse_content_digest(
+                [
+                    "unixsum=:AAA=:, sha-256=:{}:;p=1".format(_b64(SHA256)).encode(),
+                    "md5=:{}:, sha-512=:!!:".format(_b64(MD5)).encode(),
+                ]
+            ),
+        )
+
+    def test_instance_digest(self):
+        """
+        The obsolete Digest header has case-insensitive algorithm names and
+        unframed base64 values.
+        """
+        self.assertEqual(
+            [("sha256", SHA256), ("md5", MD5)],
+            _parse_instance_digest(
+                [
+                    "SHA-256={}, UNIXsum=30637".format(_b64(SHA256)).encode(),
+                    "MD5={}".format(_b64(MD5)).encode(),
+                ]
+            ),
+        )
+
+
+class DigestingResponseTests(SynchronousTestCase):
+    def test_digests(self):
+        """
+        The requested digests are computed as the body is delivered and are
+        available once it has been received.
+        """
+        response = _DigestingResponse(FakeResponse(), ["SHA256", "sha-512", "md5"])
+        d = response.digests()
+        self.assertNoResult(d)
+        self.assertEqual(b"foobar", self.successResultOf(content(response)))
+        expected = {
+            "sha256": SHA256,
+            "sha512": hashlib.sha512(b"foobar").digest(),
+            "md5": MD5,
+        }
+        self.assertEqual(expected, self.successResultOf(d))
+        self.assertEqual(expected, self.successResultOf(response.digests()))
+
+    def test_unknown_algorithm(self):
+        """
+        An unknown algorithm is rejected.
+        """
+        self.assertRaises(ValueError, _DigestingResponse, FakeResponse(), ["nope"])
+
+    def test_crc32c_missing(self):
+        """
+        The crc32c algorithm requires the crc32c package.
+        """
+        with mock.patch("treq.digest.crc32c", None):
+            self.assertRaises(
+                ImportError, _DigestingResponse, FakeResponse(), ["crc32c"]
+            )
+
+    def test_crc32c(self):
+        """
+        CRC32C checksums are computed incrementally with the crc32c package
+        and given as four big-endian bytes.
+        """
+        crc32c = mock.Mock(["crc32c"])
+        crc32c.crc32c.side_effect = lambda data, value: value + len(data)
+        with mock.patch("treq.digest.crc32c", crc32c):
+            response = _DigestingResponse(FakeResponse(), ["crc32c"])
+            self.successResultOf(content(response))
+        self.assertEqual(
+            {"crc32c": b"\x00\x00\x00\x06"}, self.successResultOf(response.digests())
+        )
+
+    def test_verified(self):
+        """
+        A body matching the Content-Digest header is delivered normally, and
+        the algorithms from the header are included in the digests.
+        """
+        original = FakeResponse(
+            {"Content-Digest": ["sha-256=:{}:".format(_b64(SHA256))]}
+        )
+        response = _DigestingResponse(original, [])
+        self.assertEqual(b"foobar", self.successResultOf(content(response)))
+        self.assertEqual({"sha256": SHA256}, self.successResultOf(response.digests()))
+
+    def test_mismatch(self):
+        """
+        A body which doesn't match a digest header fails to be delivered.
+        """
+        original = FakeResponse(
+            {
+                "Content-Digest": ["sha-256=:{}:".format(_b64(SHA256))],
+                "Digest": ["md5={}".format(_b64(b"x" * 16))],
+            }
+        )
+        response = _DigestingResponse(original, ["md5"])
+        f = self.failureResultOf(collect(response, lambda data: None), DigestMismatch)
+        self.assertEqual("md5", f.value.algorithm)
+        self.assertEqual(b"x" * 16, f.value.expected)
+        self.assertEqual(MD5, f.value.actual)
+        self.failureResultOf(response.digests(), DigestMismatch)
+
+    def test_partial_content(self):
+        """
+        The Digest header of a 206 response describes the whole
+        representation, so it is not compared with the body.
+        """
+        original = FakeResponse(
+            {"Digest": ["md5={}".format(_b64(b"x" * 16))]}, code=206
+        )
+        response = _DigestingResponse(original, [])
+        self.assertEqual(b"foobar", self.successResultOf(content(response)))
+
+    def test_head(self):
+        """
+        The digest headers of a response to a HEAD request aren't verified.
+        """
+        original = FakeResponse(
+            {"Content-Digest": ["md5=:{}:".format(_b64(MD5))]}, body=()
+        )
+        original.request = mock.Mock(method=b"HEAD")
+        response = _DigestingResponse(original, [])
+        self.assertEqual(b"", self.successResultOf(content(response)))
+
+    def test_content_coding(self):
+        """
+        The digest headers of a response decoded from gzip aren't verified,
+        as they apply to the encoded body.
+        """
+        original = FakeResponse(
+            {
+                "Content-Digest": ["md5=:{}:".format(_b64(b"x" * 16))],
+                "Content-Encoding": ["gzip"],
+            },
+            body=[],
+        )
+        response = _DigestingResponse(GzipDecoder(original), ["md5"])
+        self.successResultOf(content(response))
+        self.assertEqual(
+            {"md5": hashlib.md5().digest()}, self.successResultOf(response.digests())
+        )
+
+    def test_failure(self):
+        """
+        A failure to receive the body is passed through, and also fails
+        `_DigestingResponse.digests()`.
+        """
+        original = FakeResponse()
+        original.reason = Failure(ResponseFailed([]))
+        response = _DigestingResponse(original, ["md5"])
+        d = response.digests()
+        self.failureResultOf(content(response), ResponseFailed)
+        self.failureResultOf(d, ResponseFailed)
+
+
+class _DigestResource(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        request.setHeader(b"Content-Digest", request.args[b"digest"][0])
+        return b"foobar"
+
+
+class RequestDigestsTests(SynchronousTestCase):
+    def setUp(self):
+        self.treq = StubTreq(_DigestResource())
+
+    def test_digests(self):
+        """
+        The *digests* request argument makes digests available from the
+        response once the body has been read.
+        """
+        response = self.successResultOf(
+            self.treq.get(
+                "https://x.example/",
+                params={"digest": "sha-256=:{}:".format(_b64(SHA256))},
+                digests=["md5"],
+            )
+        )
+        self.assertEqual(b"foobar", self.successResultOf(response.content()))
+        self.assertEqual(
+            {"md5": MD5, "sha256": SHA256}, self.successResultOf(response.digests())
+        )
+
+    def test_mismatch(self):
+        """
+        A mismatch fails the response body.
+        """
+        response = self.successResultOf(
+            self.treq.get(
+                "https://x.example/",
+                params={"digest": "md5=:{}:".format(_b64(b"x" * 16))},
+                digests=[],
+            )
+        )
+        self.failureResultOf(response.content(), DigestMismatch)
+        self.failureResultOf(response.digests(), DigestMismatch)
+
+    def test_not_requested(self):
+        """
+        Without the *digests* argument, digest headers aren't verified and no
+        digests are available.
+        """
+        response = self.successResultOf(
+            self.treq.get(
+                "https://x.example/",
+                params={"digest": "md5=:{}:".format(_b64(b"x" * 16))},
+            )
+        )
+        self.assertEqual(b"foobar", self.successResultOf(response.content()))
+        self.failureResultOf(response.digests(), ValueError)
+
+    def test_invalid_algorithm(self):
+        """
+        An unknown algorithm is rejected before a request is made.
+        """
+        self.assertRaises(
+            ValueError, self.treq.get, "https://x.example/", digests=["nope"]
+        )
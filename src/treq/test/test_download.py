@@ -0,0 +1,766 @@
+import os
+from collections import deque
+from unittest import mock
+
+from twisted.internet.defer import CancelledError, Deferred, fail, maybeDeferred
+from twisted.internet.error import ConnectError
+from twisted.internet.task import Clock
+from twisted.python.failure import Failure
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.client import ResponseDone, ResponseFailed
+from twisted.web.error import Error
+from twisted.web.http_headers import Headers
+from twisted.web.resource import Resource
+
+from treq.download import (_Destination, _DownloadProtocol, _Retries,
+                           _SegmentedDownload, _Stream)
+from treq.testing import StubTreq
+
+
+class _Threads:
+    """
+    Stand in for a thread pool, running each job only when told to.
+    """
+
+    def __init__(self):
+        self.jobs = []
+
+    def inThread(self, f, *args):
+        d = maybeDeferred(lambda: None)
+        d.pause()
+        d.addCallback(lambda _: f(*args))
+        self.jobs.append(d)
+        return d
+
+    def runOne(self):
+        self.jobs.pop(0).unpause()
+
+    def run(self):
+        """
+        Run jobs until none are left.
+        """
+        while self.jobs:
+            self.runOne()
+
+
+class _ImmediateThreadPool:
+    def callInThreadWithCallback(self, onResult, f, *args, **kwargs):
+        try:
+            result = f(*args, **kwargs)
+        except BaseException:
+            onResult(False, Failure())
+        else:
+            onResult(True, result)
+
+
+class _FakeResponse:
+    def __init__(self, code=200, headers=None):
+        self.code = code
+        self.phrase = b"Phrase"
+        self.headers = Headers(headers or {})
+        self.protocol = None
+        self.transport = mock.Mock(
+            ["pauseProducing", "resumeProducing", "stopProducing"]
+        )
+
+    def deliverBody(self, protocol):
+        self.protocol = protocol
+        protocol.makeConnection(self.transport)
+
+    def finish(self, *chunks, reason=ResponseDone):
+        for chunk in chunks:
+            self.protocol.dataReceived(chunk)
+        self.protocol.connectionLost(Failure(reason()))
+
+
+class DownloadProtocolTests(SynchronousTestCase):
+    def setUp(self):
+        self.directory = self.mktemp()
+        os.mkdir(self.directory)
+        self.path = os.path.join(self.directory, "file")
+        self.threads = _Threads()
+        self.transport = mock.Mock(
+            ["pauseProducing", "resumeProducing", "stopProducing"]
+        )
+        self.destination = _Destination(self.path, False, self.threads.inThread)
+        self.destination.open()
+        self.threads.run()
+        self.finished = Deferred()
+
+    def connect(self, offset=0, maxQueued=8, end=None):
+        self.protocol = _DownloadProtocol(
+            self.destination, offset, maxQueued, self.finished, end
+        )
+        self.protocol.makeConnection(self.transport)
+
+    def test_write(self):
+        """
+        The body is written to the destination at the given offset, and the
+        protocol finishes once it has all been written.
+        """
+        self.connect(offset=3)
+        self.protocol.dataReceived(b"foo")
+        self.protocol.dataReceived(b"bar")
+        self.protocol.connectionLost(Failure(ResponseDone()))
+        self.assertNoResult(self.finished)
+        self.threads.run()
+        self.assertIsNone(self.successResultOf(self.finished))
+        d = self.destination.commit()
+        self.threads.run()
+        self.successResultOf(d)
+        with open(self.path, "rb") as f:
+            self.assertEqual(b"\0\0\0foobar", f.read())
+
+    def test_one_batch_at_a_time(self):
+        """
+        Data received while a batch is being written is queued for the next
+        batch.
+        """
+        self.connect(maxQueued=100)
+        self.protocol.dataReceived(b"a")
+        self.assertEqual(1, len(self.threads.jobs))
+        self.protocol.dataReceived(b"b")
+        self.protocol.dataReceived(b"c")
+        self.assertEqual(1, len(self.threads.jobs))
+        self.threads.runOne()
+        self.assertEqual(1, len(self.threads.jobs))
+
+    def test_backpressure(self):
+        """
+        The transport is paused while more than the maximum is waiting to be
+        written, and resumed when no more than half that is left.
+        """
+        self.connect(maxQueued=8)
+        self.protocol.dataReceived(b"12345")
+        self.protocol.dataReceived(b"6789")
+        self.transport.pauseProducing.assert_called_once_with()
+        self.protocol.dataReceived(b"abcde")
+        self.threads.runOne()  # 12345
+        self.transport.resumeProducing.assert_not_called()
+        self.threads.runOne()  # 6789abcde
+        self.transport.resumeProducing.assert_called_once_with()
+
+    def test_end(self):
+        """
+        Data beyond the end is discarded and the transport is stopped.
+        """
+        self.connect(end=4)
+        self.protocol.dataReceived(b"foo")
+        self.transport.stopProducing.assert_not_called()
+        self.protocol.dataReceived(b"bar")
+        self.transport.stopProducing.assert_called_once_with()
+        self.protocol.connectionLost(Failure(ResponseFailed([])))
+        self.threads.run()
+        self.successResultOf(self.finished)
+        d = self.destination.commit()
+        self.threads.run()
+        self.successResultOf(d)
+        with open(self.path, "rb") as f:
+            self.assertEqual(b"foob", f.read())
+
+    def test_exact_end(self):
+        """
+        A body which ends where expected is not stopped.
+        """
+        self.connect(end=3)
+        self.protocol.dataReceived(b"foo")
+        self.threads.run()
+        self.successResultOf(self.finished)
+        self.transport.stopProducing.assert_not_called()
+
+    def test_truncate(self):
+        """
+        A protocol truncated before the end of its range stops the transport
+        when it gets there.
+        """
+        self.connect(end=6)
+        self.protocol.dataReceived(b"fo")
+        self.protocol.truncate(3)
+        self.protocol.dataReceived(b"o")
+        self.transport.stopProducing.assert_called_once_with()
+
+    def test_short(self):
+        """
+        A body which ends before the expected end fails.
+        """
+        self.connect(end=6)
+        self.protocol.dataReceived(b"foo")
+        self.protocol.connectionLost(Failure(ResponseDone()))
+        self.threads.run()
+        self.failureResultOf(self.finished, Error)
+
+    def test_body_failure(self):
+        """
+        A failure to receive the body fails once pending writes are done.
+        """
+        self.connect()
+        self.protocol.dataReceived(b"foo")
+        self.protocol.connectionLost(Failure(ResponseFailed([])))
+        self.assertNoResult(self.finished)
+        self.threads.run()
+        self.failureResultOf(self.finished, ResponseFailed)
+        self.transport.stopProducing.assert_not_called()
+
+    def test_write_failure(self):
+        """
+        When a write fails the transport is stopped.
+        """
+        self.connect()
+        with mock.patch.object(
+            self.destination, "_write", side_effect=OSError(28, "Full")
+        ):
+            self.protocol.dataReceived(b"foo")
+            self.threads.run()
+        self.transport.stopProducing.assert_called_once_with()
+        self.failureResultOf(self.finished, OSError)
+
+    def test_failed_before_connection(self):
+        """
+        A protocol which fails before it is connected stops the transport
+        as soon as it is.
+        """
+        self.protocol = _DownloadProtocol(self.destination, 0, 8, self.finished)
+        self.protocol._fail(Failure(CancelledError()))
+        self.failureResultOf(self.finished, CancelledError)
+        self.protocol.makeConnection(self.transport)
+        self.transport.stopProducing.assert_called_once_with()
+
+
+class DestinationTests(SynchronousTestCase):
+    def setUp(self):
+        self.directory = self.mktemp()
+        os.mkdir(self.directory)
+        self.path = os.path.join(self.directory, "file")
+        self.threads = _Threads()
+
+    def listing(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_commit(self):
+        """
+        The file is written under a temporary name which is renamed once
+        committed.
+        """
+        destination = _Destination(self.path, False, self.threads.inThread)
+        destination.open(4)
+        self.threads.run()
+        [temporary] = self.listing()
+        self.assertTrue(temporary.startswith(".file."))
+        self.assertTrue(temporary.endswith(".part"))
+        destination.write(1, [b"ab", b"c"])
+        d = destination.commit()
+        self.threads.run()
+        self.successResultOf(d)
+        self.assertEqual(["file"], self.listing())
+        with open(self.path, "rb") as f:
+            self.assertEqual(b"\0abc", f.read())
+
+    def test_fsync(self):
+        """
+        With *fsync*, the file and its directory are synced.
+        """
+        destination = _Destination(self.path, True, self.threads.inThread)
+        destination.open()
+        d = destination.commit()
+        with mock.patch("os.fsync") as fsync:
+            self.threads.run()
+        self.successResultOf(d)
+        self.assertEqual(2 if hasattr(os, "O_DIRECTORY") else 1, fsync.call_count)
+
+    def test_discard_while_opening(self):
+        """
+        The file is discarded after it has been created.
+        """
+        destination = _Destination(self.path, False, self.threads.inThread)
+        destination.open()
+        d = destination.discard()
+        self.threads.run()
+        self.successResultOf(d)
+        self.assertEqual([], self.listing())
+
+
+class SegmentedDownloadTests(SynchronousTestCase):
+    def setUp(self):
+        self.requests = []
+        self.destination = mock.Mock(["write", "commit", "discard"])
+        self.destination.commit.return_value = Deferred()
+        self.destination.discard.return_value = Deferred()
+
+    def requestRange(self, start, end):
+        d = Deferred()
+        self.requests.append((start, end, d))
+        return d
+
+    def test_steal(self):
+        """
+        When no pieces are left, an idle segment takes over half of the
+        remainder of the piece with the most left to receive.
+        """
+        segmented = _SegmentedDownload(
+            self.requestRange,
+            self.destination,
+            100,
+            deque(),
+            3,
+            8,
+            _Retries(Clock(), 0, 1.0),
+        )
+        first = _FakeResponse()
+        with mock.patch("treq.download._MIN_STEAL", 10):
+            segmented.start(first, 100)
+        self.assertEqual(
+            [(50, 100), (25, 50)], [(s, e) for s, e, _ in self.requests]
+        )
+        self.assertEqual(25, first.protocol.end)
+
+    def test_small(self):
+        """
+        Pieces are not split when little of them remains.
+        """
+        segmented = _SegmentedDownload(
+            self.requestRange,
+            self.destination,
+            100,
+            deque(),
+            3,
+            8,
+            _Retries(Clock(), 0, 1.0),
+        )
+        segmented.start(_FakeResponse(), 100)
+        self.assertEqual([], self.requests)
+
+    def test_failure(self):
+        """
+        When one piece fails, outstanding requests are cancelled and the
+        destination is discarded.
+        """
+        segmented = _SegmentedDownload(
+            self.requestRange,
+            self.destination,
+            30,
+            deque([(10, 20), (20, 30)]),
+            3,
+            8,
+            _Retries(Clock(), 0, 1.0),
+        )
+        result = segmented.start(_FakeResponse(), 10)
+        self.assertEqual(2, len(self.requests))
+        self.requests[0][2].errback(ResponseFailed([]))
+        self.assertTrue(self.requests[1][2].called)
+        self.assertNoResult(result)
+        self.destination.discard.return_value.callback(None)
+        self.failureResultOf(result, ResponseFailed)
+
+    def test_retry(self):
+        """
+        When a piece fails, the rest of it is requested again after the
+        retry delay.
+        """
+        clock = Clock()
+        segmented = _SegmentedDownload(
+            self.requestRange,
+            self.destination,
+            20,
+            deque([(10, 20)]),
+            2,
+            8,
+            _Retries(clock, 1, 2.0),
+        )
+        segmented.start(_FakeResponse(), 10)
+        self.requests[0][2].errback(ConnectError())
+        clock.advance(1.9)
+        self.assertEqual(1, len(self.requests))
+        clock.advance(0.1)
+        self.assertEqual((10, 20), self.requests[1][:2])
+
+
+class RetriesTests(SynchronousTestCase):
+    def test_policy(self):
+        """
+        Connection failures are retried up to the limit, doubling the delay
+        each time.
+        """
+        retries = _Retries(Clock(), 2, 0.5)
+        self.assertIsNone(retries.next(Failure(OSError())))
+        self.assertEqual(0.5, retries.next(Failure(ResponseFailed([]))))
+        self.assertEqual(1.0, retries.next(Failure(ConnectError())))
+        self.assertIsNone(retries.next(Failure(ConnectError())))
+
+    def test_call(self):
+        """
+        `_Retries.call` requests again after each failure it may retry, and
+        fires with the first response.
+        """
+        clock = Clock()
+        attempts = []
+
+        def attempt():
+            attempts.append(Deferred())
+            return attempts[-1]
+
+        d = _Retries(clock, 2, 0.5).call(attempt)
+        attempts[0].errback(ConnectError())
+        clock.advance(0.4)
+        self.assertEqual(1, len(attempts))
+        clock.advance(0.1)
+        self.assertEqual(2, len(attempts))
+        self.assertNoResult(d)
+        response = object()
+        attempts[1].callback(response)
+        self.assertIs(response, self.successResultOf(d))
+
+    def test_call_exhausted(self):
+        """
+        `_Retries.call` fails once no retries remain.
+        """
+        clock = Clock()
+        d = _Retries(clock, 1, 1.0).call(lambda: fail(ConnectError()))
+        clock.advance(1.0)
+        self.failureResultOf(d, ConnectError)
+
+    def test_call_cancel(self):
+        """
+        Cancelling the `Deferred` returned by `_Retries.call` cancels the
+        attempt in progress and doesn't retry.
+        """
+        clock = Clock()
+        attempt = Deferred()
+        d = _Retries(clock, 2, 0.5).call(lambda: attempt)
+        d.cancel()
+        self.failureResultOf(d, CancelledError)
+        self.assertTrue(attempt.called)
+        self.assertEqual([], clock.getDelayedCalls())
+
+
+class StreamTests(SynchronousTestCase):
+    """
+    Tests for `_Stream`, which resumes interrupted downloads.
+    """
+
+    def setUp(self):
+        self.directory = self.mktemp()
+        os.mkdir(self.directory)
+        self.path = os.path.join(self.directory, "file")
+        self.threads = _Threads()
+        self.clock = Clock()
+        self.destination = _Destination(self.path, False, self.threads.inThread)
+        self.requests = []
+
+    def get(self, headers):
+        d = Deferred()
+        self.requests.append((headers, d))
+        return d
+
+    def start(self, response, retries=2):
+        stream = _Stream(
+            self.destination, 8, self.get, _Retries(self.clock, retries, 1.0)
+        )
+        d = stream.start(response)
+        self.threads.run()
+        return d
+
+    def contents(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_resume(self):
+        """
+        After a connection failure the rest of the body is requested with
+        a conditional range request, and written after the bytes already
+        received.
+        """
+        first = _FakeResponse(headers={"ETag": ['"abc"']})
+        d = self.start(first)
+        first.finish(b"foo", reason=lambda: ResponseFailed([]))
+        self.threads.run()
+        self.assertEqual([], self.requests)
+        self.clock.advance(1)
+        [(headers, request)] = self.requests
+        self.assertEqual({b"range": b"bytes=3-", b"if-range": b'"abc"'}, headers)
+
+        second = _FakeResponse(206, {"Content-Range": ["bytes 3-5/6"]})
+        request.callback(second)
+        second.finish(b"bar")
+        self.threads.run()
+        self.assertIs(first, self.successResultOf(d))
+        self.assertEqual(b"foobar", self.contents())
+
+    def test_restart_without_validator(self):
+        """
+        Without a validator the body is requested again from the start, and
+        the file is truncated to its final length.
+        """
+        first = _FakeResponse()
+        d = self.start(first)
+        first.finish(b"foobar", reason=lambda: ResponseFailed([]))
+        self.threads.run()
+        self.clock.advance(1)
+        [(headers, request)] = self.requests
+        self.assertEqual({}, headers)
+        second = _FakeResponse()
+        request.callback(second)
+        second.finish(b"baz")
+        self.threads.run()
+        self.successResultOf(d)
+        self.assertEqual(b"baz", self.contents())
+
+    def test_changed(self):
+        """
+        When the file has changed, the full body sent in response to the
+        range request replaces what was written.
+        """
+        first = _FakeResponse(headers={"Last-Modified": ["Tue, 1 Jan 2030"]})
+        d = self.start(first)
+        first.finish(b"foo", reason=lambda: ResponseFailed([]))
+        self.threads.run()
+        self.clock.advance(1)
+        second = _FakeResponse(200)
+        self.requests[0][1].callback(second)
+        second.finish(b"ab")
+        self.threads.run()
+        self.successResultOf(d)
+        self.assertEqual(b"ab", self.contents())
+
+    def test_request_failure(self):
+        """
+        A failed retry is retried again, with a longer delay.
+        """
+        first = _FakeResponse(headers={"ETag": ['"abc"']})
+        self.start(first)
+        first.finish(b"foo", reason=lambda: ResponseFailed([]))
+        self.threads.run()
+        self.clock.advance(1)
+        self.requests[0][1].errback(ConnectError())
+        self.clock.advance(1.9)
+        self.assertEqual(1, len(self.requests))
+        self.clock.advance(0.1)
+        self.assertEqual(b"bytes=3-", self.requests[1][0][b"range"])
+
+    def test_exhausted(self):
+        """
+        Once no retries are left the download fails and the file is removed.
+        """
+        first = _FakeResponse()
+        d = self.start(first, retries=0)
+        first.finish(b"foo", reason=lambda: ResponseFailed([]))
+        self.threads.run()
+        self.failureResultOf(d, ResponseFailed)
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_unexpected_status(self):
+        """
+        A response to a retry which is neither the requested range nor the
+        whole body fails the download.
+        """
+        first = _FakeResponse(headers={"ETag": ['"abc"']})
+        d = self.start(first)
+        first.finish(b"foo", reason=lambda: ResponseFailed([]))
+        self.threads.run()
+        self.clock.advance(1)
+        self.requests[0][1].callback(_FakeResponse(503))
+        self.threads.run()
+        self.failureResultOf(d, Error)
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_cancel_while_waiting(self):
+        """
+        Cancelling the download while waiting to retry stops retrying.
+        """
+        first = _FakeResponse()
+        d = self.start(first)
+        first.finish(b"foo", reason=lambda: ResponseFailed([]))
+        self.threads.run()
+        d.cancel()
+        self.failureResultOf(d, CancelledError)
+        self.assertEqual([], self.clock.getDelayedCalls())
+        self.threads.run()
+        self.assertEqual([], os.listdir(self.directory))
+
+
+class _RangeResource(Resource):
+    """
+    Serve *data*, honoring single-range Range headers unless *ranges* is
+    false, and record each request's Range header.
+    """
+
+    isLeaf = True
+
+    def __init__(self, ranges=True, data=b"0123456789"):
+        super().__init__()
+        self.ranges = ranges
+        self.data = data
+        self.requested = []
+
+    def render_GET(self, request):
+        self.requested.append(request.getHeader(b"range"))
+        if request.postpath != [b""]:
+            request.setResponseCode(404)
+            return b"Not found"
+        request.setHeader(b"etag", b'"v1"')
+        range = request.getHeader(b"range")
+        if not self.ranges or range is None:
+            return self.data
+        first, last = range.split(b"=")[1].split(b"-")
+        first, last = int(first), min(int(last), len(self.data) - 1)
+        if first >= len(self.data):
+            request.setResponseCode(416)
+            request.setHeader(b"content-range", b"bytes */%d" % len(self.data))
+            return b""
+        request.setResponseCode(206)
+        request.setHeader(
+            b"content-range", b"bytes %d-%d/%d" % (first, last, len(self.data))
+        )
+        return self.data[first:last + 1]
+
+
+class DownloadTests(SynchronousTestCase):
+    def setUp(self):
+        self.directory = self.mktemp()
+        os.mkdir(self.directory)
+        self.path = os.path.join(self.directory, "file")
+        self.resource = _RangeResource()
+        self.treq = StubTreq(self.resource)
+        self.reactor = mock.Mock(["callFromThread"])
+        self.reactor.callFromThread.side_effect = lambda f, *a, **kw: f(*a, **kw)
+
+    def download(self, url="https://x.example/", **kwargs):
+        return self.treq.download(
+            url,
+            self.path,
+            reactor=self.reactor,
+            threadpool=_ImmediateThreadPool(),
+            **kwargs
+        )
+
+    def contents(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_download(self):
+        """
+        `HTTPClient.download()` saves the body and fires with the response.
+        """
+        response = self.successResultOf(self.download())
+        self.assertEqual(200, response.code)
+        self.assertEqual(b"0123456789", self.contents())
+        self.assertEqual([None], self.resource.requested)
+
+    def test_error_status(self):
+        """
+        Nothing is written for a response with a status other than 2xx.
+        """
+        f = self.failureResultOf(self.download("https://x.example/missing/"), Error)
+        self.assertEqual(b"404", f.value.status)
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_headers(self):
+        """
+        Request headers are sent with every request.
+        """
+        self.resource.render_GET = mock.Mock(return_value=b"foo")
+        self.successResultOf(self.download(headers={"X-Foo": "bar"}))
+        [request] = self.resource.render_GET.call_args[0]
+        self.assertEqual(b"bar", request.getHeader(b"x-foo"))
+
+    def failFirst(self):
+        """
+        Fail the first request made through the stub's agent with
+        a `ConnectError`, and use a `Clock` as the reactor.
+        """
+        request = self.treq._agent.request
+        failures = [ConnectError()]
+
+        def failing(*args, **kwargs):
+            if failures:
+                return fail(failures.pop())
+            return request(*args, **kwargs)
+
+        self.treq._agent.request = failing
+        self.reactor = Clock()
+        self.reactor.callFromThread = lambda f, *a, **kw: f(*a, **kw)
+
+    def test_retry_first(self):
+        """
+        The first request is retried like any other when it fails to connect.
+        """
+        self.failFirst()
+        d = self.download(retries=1, retry_delay=1.0)
+        self.assertNoResult(d)
+        self.reactor.advance(1.0)
+        self.assertEqual(200, self.successResultOf(d).code)
+        self.assertEqual(b"0123456789", self.contents())
+
+    def test_retry_probe(self):
+        """
+        The probe for a segmented download is retried when it fails to
+        connect.
+        """
+        self.failFirst()
+        d = self.download(segments=2, segment_size=3, retries=1, retry_delay=1.0)
+        self.assertNoResult(d)
+        self.reactor.advance(1.0)
+        self.assertEqual(206, self.successResultOf(d).code)
+        self.assertEqual(b"0123456789", self.contents())
+
+    def test_no_retry_first(self):
+        """
+        Without retries, a first request which fails to connect fails the
+        download.
+        """
+        self.failFirst()
+        self.failureResultOf(self.download(), ConnectError)
+
+    def test_segmented(self):
+        """
+        A segmented download requests each range of the file.
+        """
+        response = self.successResultOf(self.download(segments=2, segment_size=3))
+        self.assertEqual(206, response.code)
+        self.assertEqual(b"0123456789", self.contents())
+        self.assertEqual(
+            [b"bytes=0-2", b"bytes=3-5", b"bytes=6-8", b"bytes=9-9"],
+            self.resource.requested,
+        )
+
+    def test_segmented_fallback(self):
+        """
+        When the server doesn't send a range, the body of the first response
+        is saved.
+        """
+        self.resource.ranges = False
+        response = self.successResultOf(self.download(segments=2, segment_size=3))
+        self.assertEqual(200, response.code)
+        self.assertEqual(b"0123456789", self.contents())
+        self.assertEqual([b"bytes=0-2"], self.resource.requested)
+
+    def test_segmented_empty(self):
+        """
+        An empty file, which has no ranges, is requested again without
+        a range.
+        """
+        self.resource.data = b""
+        self.successResultOf(self.download(segments=2, segment_size=3))
+        self.assertEqual(b"", self.contents())
+        self.assertEqual([b"bytes=0-2", None], self.resource.requested)
+
+    def test_segmented_changed(self):
+        """
+        A range which doesn't match the first response fails the download,
+        and nothing is written.
+        """
+        render_GET = self.resource.render_GET
+
+        def changed(request):
+            if request.getHeader(b"if-range") == b'"v1"':
+                request.requestHeaders.removeHeader(b"range")
+            return render_GET(request)
+
+        self.resource.render_GET = changed
+        self.failureResultOf(self.download(segments=2, segment_size=3), Error)
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_segmented_digests(self):
+        """
+        Digests can't be computed for a segmented download.
+        """
+        self.assertRaises(ValueError, self.download, segments=2, digests=["md5"])
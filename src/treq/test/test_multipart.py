@@ -4,6 +4,7 @@
 from typing import cast, AnyStr
 
 from io import BytesIO
+from unittest import mock
 
 from multipart import MultipartParser  # type: ignore
 from twisted.trial import unittest
@@ -14,7 +15,8 @@ from twisted.internet.testing import StringTransport
 from twisted.web.client import FileBodyProducer
 from twisted.web.iweb import UNKNOWN_LENGTH, IBodyProducer
 
-from treq.multipart import MultiPartProducer, _LengthConsumer
+from treq import multipart
+from treq.multipart import MultiPartProducer
 
 
 class MultiPartProducerTestCase(unittest.TestCase):
@@ -251,6 +253,56 @@ Hello, World
         self._scheduled.pop(0)()
         self.assertNoResult(complete)
 
+    def test_prefetchNextFile(self):
+        """
+        While a file is written, the producer of the next file is asked to
+        read ahead if it has a C{prefetch} method, and it is stopped along
+        with the current one.
+        """
+        events = []
+
+        class Prefetching(FileBodyProducer):
+            def __init__(self, name, data, cooperator):
+                super().__init__(BytesIO(data), cooperator=cooperator)
+                self.name = name
+
+            def prefetch(self):
+                events.append(("prefetch", self.name))
+
+            def startProducing(self, consumer):
+                events.append(("start", self.name))
+                return super().startProducing(consumer)
+
+            def stopProducing(self):
+                events.append(("stop", self.name))
+                if ("start", self.name) in events:
+                    super().stopProducing()
+
+        producer = MultiPartProducer({
+            "field": "string",
+            "a": ("a", "text/plain", Prefetching("a", b"a", self.cooperator)),
+            "b": ("b", "text/plain", Prefetching("b", b"b", self.cooperator)),
+        }, cooperator=self.cooperator, boundary=b"heyDavid")
+        self.assertEqual([], events)
+        producer.startProducing(BytesIO())
+        self._scheduled.pop(0)()
+        self.assertEqual([("prefetch", "a")], events)
+        self._scheduled.pop(0)()
+        self.assertEqual(
+            [("prefetch", "a"), ("prefetch", "b"), ("start", "a")], events
+        )
+        producer.stopProducing()
+        self.assertEqual(
+            [
+                ("prefetch", "a"),
+                ("prefetch", "b"),
+                ("start", "a"),
+                ("stop", "a"),
+                ("stop", "b"),
+            ],
+            events,
+        )
+
     def test_pauseProducing(self) -> None:
         """
         L{MultiPartProducer.pauseProducing} temporarily suspends writing bytes
@@ -627,33 +679,53 @@ my lovely bytes
         self.assertEqual(b'my lovely bytes219', form.get('xfield').raw)
         self.assertEqual(b'my lovely bytes22', form.get('afield').raw)
 
-
-class LengthConsumerTestCase(unittest.TestCase):
-    """
-    Tests for the _LengthConsumer, an L{IConsumer} which is used to compute
-    the length of a produced content.
-    """
-
-    def test_scalarsUpdateCounter(self):
+    def test_headersEncodedOnce(self):
         """
-        When an int is written, _LengthConsumer updates its internal
-        counter.
+        The headers of each part are encoded once, both to calculate the
+        length and to write the body.
         """
-        consumer = _LengthConsumer()
-        self.assertEqual(consumer.length, 0)
-        consumer.write(1)
-        self.assertEqual(consumer.length, 1)
-        consumer.write(2147483647)
-        self.assertEqual(consumer.length, 2147483648)
+        encoded = []
+        original = multipart._Header.__bytes__
+
+        def encode(header):
+            encoded.append(header.name)
+            return original(header)
+
+        self.patch(multipart._Header, "__bytes__", encode)
+        producer = MultiPartProducer(
+            [
+                ("a", "x"),
+                ("b", ("b.txt", "text/plain", FileBodyProducer(
+                    inputFile=BytesIO(b"yy"), cooperator=self.cooperator))),
+            ],
+            cooperator=self.cooperator,
+        )
+        output = self.getOutput(producer)
+        self.assertEqual(producer.length, len(output))
+        self.assertEqual(
+            [
+                b"Content-Disposition",
+                b"Content-Disposition",
+                b"Content-Type",
+                b"Content-Length",
+            ],
+            encoded,
+        )
 
-    def test_stringUpdatesCounter(self):
+    def test_emptyField(self):
         """
-        Use the written string length to update the internal counter
+        An empty field isn't written, as an empty write ends a chunked
+        body.
         """
-        a = (b"Cantami, o Diva, del Pelide Achille\n l'ira funesta che "
-             b"infiniti addusse\n lutti agli Achei")
-
-        consumer = _LengthConsumer()
-        self.assertEqual(consumer.length, 0)
-        consumer.write(a)
-        self.assertEqual(consumer.length, 89)
+        consumer = mock.Mock(["write"])
+        producer = MultiPartProducer(
+            [("a", "")], boundary=b"heyDavid", cooperator=self.cooperator
+        )
+        producer.startProducing(consumer)
+        while self._scheduled:
+            self._scheduled.pop(0)()
+        self.assertNotIn(mock.call(b""), consumer.write.call_args_list)
+        self.assertEqual(
+            producer.length,
+            sum(len(c.args[0]) for c in consumer.write.call_args_list),
+        )
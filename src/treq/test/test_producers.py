@@ -0,0 +1,1144 @@
+import array
+import gzip
+import json
+import mmap
+import zlib
+from io import BytesIO
+from unittest import mock
+
+from twisted.internet import task
+from twisted.internet.defer import CancelledError, Deferred
+from twisted.internet.task import Clock
+from twisted.python.failure import Failure
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.iweb import UNKNOWN_LENGTH, IBodyProducer
+from zope.interface.verify import verifyObject
+
+from treq import producers
+from treq.producers import (AsyncIterableProducer, BufferProducer,
+                            BytesProducer, CompressingProducer,
+                            ContinueProducer, FileProducer, IterableProducer,
+                            JSONProducer, ReplayableProducer,
+                            ThreadedFileProducer)
+
+
+class _Consumer:
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+
+class _PausingConsumer(_Consumer):
+    """
+    Pause the producer after each write, as a transport does when its
+    buffer is full.
+    """
+
+    def __init__(self, producer):
+        super().__init__()
+        self.producer = producer
+
+    def write(self, data):
+        super().write(data)
+        self.producer.pauseProducing()
+
+
+class _QueuedThreadPool:
+    """
+    Stand in for a thread pool, running each job only when told to.
+    """
+
+    def __init__(self):
+        self.jobs = []
+
+    def callInThreadWithCallback(self, onResult, f, *args, **kwargs):
+        self.jobs.append((onResult, f, args, kwargs))
+
+    def runOne(self):
+        onResult, f, args, kwargs = self.jobs.pop(0)
+        try:
+            result = f(*args, **kwargs)
+        except BaseException:
+            onResult(False, Failure())
+        else:
+            onResult(True, result)
+
+    def run(self):
+        while self.jobs:
+            self.runOne()
+
+
+class BytesProducerTests(SynchronousTestCase):
+    def test_interface(self):
+        """
+        `BytesProducer` provides `IBodyProducer`.
+        """
+        self.assertTrue(verifyObject(IBodyProducer, BytesProducer(b"")))
+
+    def test_write(self):
+        """
+        The body is written with one call, and the `Deferred` returned by
+        `startProducing` has already fired.
+        """
+        consumer = _Consumer()
+        producer = BytesProducer(b"hello")
+        self.assertEqual(5, producer.length)
+        self.assertIsNone(self.successResultOf(producer.startProducing(consumer)))
+        self.assertEqual([b"hello"], consumer.written)
+
+    def test_empty(self):
+        """
+        Nothing is written for an empty body.
+        """
+        consumer = _Consumer()
+        producer = BytesProducer(b"")
+        self.assertEqual(0, producer.length)
+        self.successResultOf(producer.startProducing(consumer))
+        self.assertEqual([], consumer.written)
+
+    def test_buffers(self):
+        """
+        A `bytearray` or `memoryview` is written as `bytes`, as transports
+        require, with the length in bytes.
+        """
+        data = bytearray(b"hello")
+        producer = BytesProducer(data)
+        data[0:1] = b"j"
+        consumer = _Consumer()
+        producer.startProducing(consumer)
+        self.assertEqual([b"jello"], consumer.written)
+        self.assertIs(bytes, type(consumer.written[0]))
+
+        view = memoryview(bytes(range(8))).cast("H")
+        producer = BytesProducer(view)
+        self.assertEqual(8, producer.length)
+        consumer = _Consumer()
+        producer.startProducing(consumer)
+        self.assertEqual([bytes(range(8))], consumer.written)
+
+
+class BufferProducerTests(SynchronousTestCase):
+    def test_interface(self):
+        """
+        `BufferProducer` provides `IBodyProducer`.
+        """
+        self.assertTrue(verifyObject(IBodyProducer, BufferProducer(bytearray())))
+
+    def test_chunks(self):
+        """
+        The body is written as `bytes` in chunks of at most *chunk_size*
+        until it ends.
+        """
+        consumer = _Consumer()
+        producer = BufferProducer(bytearray(b"abcdefg"), chunk_size=3)
+        self.assertEqual(7, producer.length)
+        self.assertIsNone(self.successResultOf(producer.startProducing(consumer)))
+        self.assertEqual([b"abc", b"def", b"g"], consumer.written)
+        self.assertIs(bytes, type(consumer.written[0]))
+
+    def test_empty(self):
+        """
+        Nothing is written for an empty body.
+        """
+        consumer = _Consumer()
+        producer = BufferProducer(memoryview(b""))
+        self.assertEqual(0, producer.length)
+        self.successResultOf(producer.startProducing(consumer))
+        self.assertEqual([], consumer.written)
+
+    def test_pause(self):
+        """
+        Nothing more is written while the producer is paused.
+        """
+        producer = BufferProducer(bytearray(b"abcde"), chunk_size=2)
+        consumer = _PausingConsumer(producer)
+        d = producer.startProducing(consumer)
+        self.assertEqual([b"ab"], consumer.written)
+        self.assertNoResult(d)
+        producer.resumeProducing()
+        self.assertEqual([b"ab", b"cd"], consumer.written)
+        producer.resumeProducing()
+        self.assertEqual([b"ab", b"cd", b"e"], consumer.written)
+        self.assertIsNone(self.successResultOf(d))
+
+    def test_resume_during_write(self):
+        """
+        A consumer which pauses and resumes the producer within a write
+        doesn't cause chunks to be written out of order.
+        """
+        producer = BufferProducer(bytearray(b"abcde"), chunk_size=2)
+        consumer = _Consumer()
+
+        def write(data):
+            consumer.written.append(data)
+            producer.pauseProducing()
+            producer.resumeProducing()
+
+        consumer.write = write
+        self.successResultOf(producer.startProducing(consumer))
+        self.assertEqual([b"ab", b"cd", b"e"], consumer.written)
+
+    def test_stop(self):
+        """
+        Nothing more is written once the producer is stopped, and the
+        `Deferred` doesn't fire.
+        """
+        producer = BufferProducer(bytearray(b"abcde"), chunk_size=2)
+        consumer = _PausingConsumer(producer)
+        d = producer.startProducing(consumer)
+        producer.stopProducing()
+        producer.resumeProducing()
+        self.assertEqual([b"ab"], consumer.written)
+        self.assertNoResult(d)
+
+    def test_buffers(self):
+        """
+        Any object supporting the buffer protocol is written as bytes, and
+        its length is in bytes.
+        """
+        numbers = array.array("H", [1, 2])
+        producer = BufferProducer(numbers)
+        self.assertEqual(4, producer.length)
+        consumer = _Consumer()
+        producer.startProducing(consumer)
+        self.assertEqual([numbers.tobytes()], consumer.written)
+
+        m = mmap.mmap(-1, 5)
+        self.addCleanup(m.close)
+        m.write(b"hello")
+        consumer = _Consumer()
+        BufferProducer(m).startProducing(consumer)
+        self.assertEqual([b"hello"], consumer.written)
+
+
+class FileProducerTests(SynchronousTestCase):
+    def open(self, data):
+        path = self.mktemp()
+        with open(path, "wb") as f:
+            f.write(data)
+        f = open(path, "rb")
+        self.addCleanup(f.close)
+        return f
+
+    def test_interface(self):
+        """
+        `FileProducer` provides `IBodyProducer`.
+        """
+        self.assertTrue(verifyObject(IBodyProducer, FileProducer(self.open(b"x"))))
+
+    def test_position(self):
+        """
+        The body is the file from its current position, and the file is
+        closed once it has been written.
+        """
+        f = self.open(b"abcdefg")
+        f.read(2)
+        producer = FileProducer(f, chunk_size=2)
+        self.assertEqual(5, producer.length)
+        consumer = _Consumer()
+        self.successResultOf(producer.startProducing(consumer))
+        self.assertEqual([b"cd", b"ef", b"g"], consumer.written)
+        self.assertTrue(f.closed)
+
+    def test_chunk_size(self):
+        """
+        Once paused, the producer writes chunks as large as the amount the
+        consumer accepted, up to *max_chunk_size*.
+        """
+        f = self.open(bytes(range(40)))
+        producer = FileProducer(f, chunk_size=2, max_chunk_size=8)
+        consumer = _Consumer()
+        pauseAt = [6, 18]
+
+        def write(data):
+            consumer.written.append(data)
+            if pauseAt and sum(map(len, consumer.written)) == pauseAt[0]:
+                del pauseAt[0]
+                producer.pauseProducing()
+
+        consumer.write = write
+        producer.startProducing(consumer)
+        self.assertEqual([2, 2, 2], [len(c) for c in consumer.written])
+        producer.resumeProducing()
+        self.assertEqual([2, 2, 2, 6, 6], [len(c) for c in consumer.written])
+        producer.resumeProducing()
+        self.assertEqual(
+            [2, 2, 2, 6, 6, 8, 8, 6], [len(c) for c in consumer.written]
+        )
+        self.assertEqual(bytes(range(40)), b"".join(consumer.written))
+
+    def test_stop(self):
+        """
+        The file is closed when production is stopped.
+        """
+        f = self.open(b"abcde")
+        producer = FileProducer(f, chunk_size=2)
+        consumer = _PausingConsumer(producer)
+        d = producer.startProducing(consumer)
+        producer.stopProducing()
+        self.assertEqual([b"ab"], consumer.written)
+        self.assertNoResult(d)
+        self.assertTrue(f.closed)
+
+    def test_empty(self):
+        """
+        An empty file can't be mapped.
+        """
+        self.assertRaises(ValueError, FileProducer, self.open(b""))
+
+
+class ThreadedFileProducerTests(SynchronousTestCase):
+    def setUp(self):
+        self.reactor = mock.Mock(["callFromThread"])
+        self.reactor.callFromThread.side_effect = lambda f, *a, **kw: f(*a, **kw)
+        self.threadpool = _QueuedThreadPool()
+
+    def producer(self, file, **kwargs):
+        return ThreadedFileProducer(
+            file, reactor=self.reactor, threadpool=self.threadpool, **kwargs
+        )
+
+    def test_interface(self):
+        """
+        `ThreadedFileProducer` provides `IBodyProducer`.
+        """
+        self.assertTrue(verifyObject(IBodyProducer, self.producer(BytesIO())))
+
+    def test_length(self):
+        """
+        The length is that of the file from its current position, or unknown
+        if it can't seek.
+        """
+        f = BytesIO(b"abcde")
+        f.read(1)
+        self.assertEqual(4, self.producer(f).length)
+        self.assertEqual(1, f.tell())
+
+        class Unseekable:
+            def read(self, n):
+                return b""
+
+        self.assertIs(UNKNOWN_LENGTH, self.producer(Unseekable()).length)
+
+    def test_write(self):
+        """
+        Chunks are read in the thread pool and written in order, and the file
+        is closed in the thread pool once it has all been read.
+        """
+        f = BytesIO(b"abcde")
+        consumer = _Consumer()
+        d = self.producer(f, chunk_size=2).startProducing(consumer)
+        self.assertEqual([], consumer.written)
+        self.threadpool.runOne()
+        self.assertEqual([b"ab"], consumer.written)
+        self.threadpool.run()
+        self.assertEqual([b"ab", b"cd", b"e"], consumer.written)
+        self.assertIsNone(self.successResultOf(d))
+        self.assertTrue(f.closed)
+
+    def test_read_ahead(self):
+        """
+        While paused, the producer reads ahead until two chunks are waiting
+        to be written.
+        """
+        producer = self.producer(BytesIO(b"abcdefgh"), chunk_size=2)
+        consumer = _PausingConsumer(producer)
+        d = producer.startProducing(consumer)
+        self.threadpool.run()
+        self.assertEqual([b"ab"], consumer.written)
+        self.assertEqual(2, len(producer._chunks))
+        producer.resumeProducing()
+        self.assertEqual([b"ab", b"cd"], consumer.written)
+        self.assertEqual(1, len(self.threadpool.jobs))
+        producer.resumeProducing()
+        producer.resumeProducing()
+        self.threadpool.run()
+        producer.resumeProducing()
+        self.threadpool.run()
+        self.assertEqual([b"ab", b"cd", b"ef", b"gh"], consumer.written)
+        self.successResultOf(d)
+
+    def test_prefetch(self):
+        """
+        `prefetch` starts reading before the body is written.
+        """
+        producer = self.producer(BytesIO(b"abc"), chunk_size=2)
+        producer.prefetch()
+        self.threadpool.run()
+        self.assertEqual(2, len(producer._chunks))
+        consumer = _Consumer()
+        d = producer.startProducing(consumer)
+        self.assertEqual([b"ab", b"c"], consumer.written)
+        self.threadpool.run()
+        self.successResultOf(d)
+
+    def test_stop(self):
+        """
+        Once stopped nothing more is written, the `Deferred` doesn't fire,
+        and the file is closed after any read in progress.
+        """
+        f = BytesIO(b"abcde")
+        producer = self.producer(f, chunk_size=2)
+        consumer = _Consumer()
+        d = producer.startProducing(consumer)
+        producer.stopProducing()
+        self.assertFalse(f.closed)
+        self.threadpool.run()
+        self.assertEqual([], consumer.written)
+        self.assertNoResult(d)
+        self.assertTrue(f.closed)
+
+    def test_read_failure(self):
+        """
+        If reading fails, the `Deferred` fails and the file is closed.
+        """
+        f = BytesIO(b"abcde")
+        f.read = mock.Mock(side_effect=OSError("bad disk"))
+        d = self.producer(f).startProducing(_Consumer())
+        self.threadpool.run()
+        self.failureResultOf(d, OSError)
+        self.assertTrue(f.closed)
+
+    def test_prefetch_failure(self):
+        """
+        If reading fails before the body is written, writing it fails.
+        """
+        f = BytesIO(b"abcde")
+        f.read = mock.Mock(side_effect=OSError("bad disk"))
+        producer = self.producer(f)
+        producer.prefetch()
+        self.threadpool.run()
+        self.failureResultOf(producer.startProducing(_Consumer()), OSError)
+
+
+class IterableProducerTests(SynchronousTestCase):
+    def setUp(self):
+        self.scheduled = []
+        self.cooperator = task.Cooperator(
+            terminationPredicateFactory=lambda: lambda: True,
+            scheduler=self.scheduled.append,
+        )
+
+    def runAll(self):
+        while self.scheduled:
+            self.scheduled.pop(0)()
+
+    def test_interface(self):
+        """
+        `IterableProducer` provides `IBodyProducer`, with an unknown length.
+        """
+        producer = IterableProducer([], self.cooperator)
+        self.assertTrue(verifyObject(IBodyProducer, producer))
+        self.assertIs(UNKNOWN_LENGTH, producer.length)
+
+    def test_write(self):
+        """
+        Chunks are written as `bytes` one per iteration of the cooperator,
+        skipping empty chunks.
+        """
+        consumer = _Consumer()
+        producer = IterableProducer(
+            [b"a", b"", bytearray(b"b"), memoryview(b"c")], self.cooperator
+        )
+        d = producer.startProducing(consumer)
+        self.assertEqual([], consumer.written)
+        self.scheduled.pop(0)()
+        self.assertEqual([b"a"], consumer.written)
+        self.runAll()
+        self.assertEqual([b"a", b"b", b"c"], consumer.written)
+        self.assertIs(bytes, type(consumer.written[1]))
+        self.assertIsNone(self.successResultOf(d))
+
+    def test_pause(self):
+        """
+        No more chunks are taken from the iterable while the producer is
+        paused.
+        """
+        taken = []
+
+        def chunks():
+            for chunk in [b"a", b"b"]:
+                taken.append(chunk)
+                yield chunk
+
+        producer = IterableProducer(chunks(), self.cooperator)
+        consumer = _PausingConsumer(producer)
+        d = producer.startProducing(consumer)
+        self.runAll()
+        self.assertEqual([b"a"], taken)
+        producer.resumeProducing()
+        self.runAll()
+        self.assertEqual([b"a", b"b"], consumer.written)
+        producer.resumeProducing()
+        self.runAll()
+        self.successResultOf(d)
+
+    def test_stop(self):
+        """
+        Stopping the producer closes a generator, and the `Deferred` doesn't
+        fire.
+        """
+        closed = []
+
+        def chunks():
+            try:
+                yield b"a"
+                yield b"b"
+            finally:
+                closed.append(True)
+
+        producer = IterableProducer(chunks(), self.cooperator)
+        consumer = _Consumer()
+        d = producer.startProducing(consumer)
+        self.scheduled.pop(0)()
+        producer.stopProducing()
+        self.runAll()
+        self.assertEqual([b"a"], consumer.written)
+        self.assertEqual([True], closed)
+        self.assertNoResult(d)
+
+    def test_failure(self):
+        """
+        If the iterable raises an exception the `Deferred` fails.
+        """
+
+        def chunks():
+            yield b"a"
+            raise ValueError()
+
+        d = IterableProducer(chunks(), self.cooperator).startProducing(_Consumer())
+        self.runAll()
+        self.failureResultOf(d, ValueError)
+
+
+class AsyncIterableProducerTests(SynchronousTestCase):
+    def test_interface(self):
+        """
+        `AsyncIterableProducer` provides `IBodyProducer`, with an unknown
+        length.
+        """
+
+        async def chunks():
+            yield b""
+
+        producer = AsyncIterableProducer(chunks())
+        self.assertTrue(verifyObject(IBodyProducer, producer))
+        self.assertIs(UNKNOWN_LENGTH, producer.length)
+
+    def test_write(self):
+        """
+        Each chunk is awaited and written as `bytes`, skipping empty chunks.
+        """
+        waiting = []
+
+        async def chunks():
+            yield b"a"
+            yield b""
+            d = Deferred()
+            waiting.append(d)
+            yield await d
+
+        consumer = _Consumer()
+        d = AsyncIterableProducer(chunks()).startProducing(consumer)
+        self.assertEqual([b"a"], consumer.written)
+        self.assertNoResult(d)
+        waiting[0].callback(bytearray(b"b"))
+        self.assertEqual([b"a", b"b"], consumer.written)
+        self.assertIs(bytes, type(consumer.written[1]))
+        self.assertIsNone(self.successResultOf(d))
+
+    def test_many_chunks(self):
+        """
+        Chunks which are available immediately don't cause recursion.
+        """
+
+        async def chunks():
+            for _ in range(5000):
+                yield b"x"
+
+        consumer = _Consumer()
+        d = AsyncIterableProducer(chunks()).startProducing(consumer)
+        self.successResultOf(d)
+        self.assertEqual(5000, len(consumer.written))
+
+    def test_pause(self):
+        """
+        The next chunk isn't awaited while the producer is paused.
+        """
+        taken = []
+
+        async def chunks():
+            for chunk in [b"a", b"b"]:
+                taken.append(chunk)
+                yield chunk
+
+        producer = AsyncIterableProducer(chunks())
+        consumer = _PausingConsumer(producer)
+        d = producer.startProducing(consumer)
+        self.assertEqual([b"a"], taken)
+        producer.resumeProducing()
+        self.assertEqual([b"a", b"b"], consumer.written)
+        producer.resumeProducing()
+        self.successResultOf(d)
+
+    def test_stop(self):
+        """
+        Stopping the producer cancels the `Deferred` being awaited, and the
+        `Deferred` returned by `startProducing` doesn't fire.
+        """
+        waiting = []
+        cancelled = []
+
+        async def chunks():
+            yield b"a"
+            d = Deferred()
+            waiting.append(d)
+            try:
+                yield await d
+            except CancelledError:
+                cancelled.append(True)
+                raise
+
+        producer = AsyncIterableProducer(chunks())
+        consumer = _Consumer()
+        d = producer.startProducing(consumer)
+        producer.stopProducing()
+        self.assertEqual([True], cancelled)
+        self.assertEqual([b"a"], consumer.written)
+        self.assertNoResult(d)
+
+    def test_stop_paused(self):
+        """
+        Stopping a paused producer closes an async generator.
+        """
+        closed = []
+
+        async def chunks():
+            try:
+                yield b"a"
+                yield b"b"
+            finally:
+                closed.append(True)
+
+        producer = AsyncIterableProducer(chunks())
+        consumer = _PausingConsumer(producer)
+        d = producer.startProducing(consumer)
+        producer.stopProducing()
+        self.assertEqual([True], closed)
+        self.assertNoResult(d)
+
+    def test_failure(self):
+        """
+        If the iterable raises an exception the `Deferred` fails.
+        """
+
+        async def chunks():
+            yield b"a"
+            raise ValueError()
+
+        d = AsyncIterableProducer(chunks()).startProducing(_Consumer())
+        self.failureResultOf(d, ValueError)
+
+
+class JSONProducerTests(SynchronousTestCase):
+    def encode(self, value, chunk_size=7):
+        scheduled = []
+        cooperator = task.Cooperator(scheduler=scheduled.append)
+        consumer = _Consumer()
+        d = JSONProducer(value, chunk_size, cooperator).startProducing(consumer)
+        while scheduled:
+            scheduled.pop(0)()
+        self.successResultOf(d)
+        return consumer.written
+
+    def test_same_as_codec(self):
+        """
+        The encoding is the same as that of `JSONCodec`, whether containers
+        are encoded at once or an item at a time.
+        """
+        values = [
+            None,
+            "\u00e9",
+            1.5,
+            [],
+            {},
+            {"a": [1, {"b": None}], 2: 2, 2.5: 3, True: 4, None: 5},
+            {**{n: n for n in range(2, 2000)}, 2.5: 3, True: 4, None: 5},
+            (1, [2, [3]]),
+            {str(n): list(range(n % 3)) for n in range(3000)},
+            [{"n": n} for n in range(3000)],
+            [*range(1500), list(range(2000)), *range(1500)],
+            {**{str(n): n for n in range(1500)}, "big": list(range(2000))},
+        ]
+        for value in values:
+            expected = json.dumps(value, separators=(",", ":")).encode("utf-8")
+            self.assertEqual(expected, b"".join(self.encode(value)))
+
+    def test_chunks(self):
+        """
+        Chunks of at least *chunk_size* bytes are written.
+        """
+        written = self.encode(list(range(2000)))
+        self.assertGreater(len(written), 1)
+        self.assertTrue(all(len(chunk) >= 7 for chunk in written[:-1]))
+
+    def test_iterator(self):
+        """
+        An iterator is encoded as an array, taking items as they are
+        encoded.
+        """
+        taken = []
+
+        def records():
+            for n in range(3):
+                taken.append(n)
+                yield {"n": n}
+
+        producer = JSONProducer(records(), chunk_size=1, cooperator=task)
+        self.assertEqual([], taken)
+        self.assertEqual(
+            b'[{"n":0},{"n":1},{"n":2}]', b"".join(producer._iterator)
+        )
+        self.assertEqual(b"[]", b"".join(self.encode(iter([]))))
+        self.assertEqual(
+            b'{"a":[0,1]}', b"".join(self.encode({"a": iter(range(2))}))
+        )
+
+    def test_bad_key(self):
+        """
+        Keys which :mod:`json` can't encode are rejected.
+        """
+        scheduled = []
+        cooperator = task.Cooperator(scheduler=scheduled.append)
+        d = JSONProducer({(1,): n for n in range(2000)}, 7, cooperator).startProducing(
+            _Consumer()
+        )
+        while scheduled:
+            scheduled.pop(0)()
+        self.failureResultOf(d, TypeError)
+
+
+class _FakeProducer:
+    """
+    A producer which writes what the test says, and records how it is
+    paused and stopped.
+    """
+
+    length = 10
+
+    def __init__(self):
+        self.paused = False
+        self.stopped = False
+
+    def startProducing(self, consumer):
+        self.consumer = consumer
+        self.finished = Deferred()
+        return self.finished
+
+    def pauseProducing(self):
+        assert not self.paused
+        self.paused = True
+
+    def resumeProducing(self):
+        assert self.paused
+        self.paused = False
+
+    def stopProducing(self):
+        self.stopped = True
+
+
+class CompressingProducerTests(SynchronousTestCase):
+    def test_interface(self):
+        """
+        `CompressingProducer` provides `IBodyProducer`, with an unknown
+        length.
+        """
+        producer = CompressingProducer(_FakeProducer())
+        self.assertTrue(verifyObject(IBodyProducer, producer))
+        self.assertIs(UNKNOWN_LENGTH, producer.length)
+
+    def test_gzip(self):
+        """
+        The body is compressed with gzip as it is written, without empty
+        writes.
+        """
+        data = b"hello world " * 10000
+        consumer = _Consumer()
+        producer = CompressingProducer(BufferProducer(data, chunk_size=1000))
+        self.assertEqual("gzip", producer.encoding)
+        self.successResultOf(producer.startProducing(consumer))
+        self.assertEqual(data, gzip.decompress(b"".join(consumer.written)))
+        self.assertTrue(all(consumer.written))
+        self.assertLess(sum(map(len, consumer.written)), len(data) // 10)
+
+    def test_deflate(self):
+        """
+        The deflate coding is the zlib format.
+        """
+        consumer = _Consumer()
+        producer = CompressingProducer(BytesProducer(b"hello"), "deflate", level=9)
+        self.successResultOf(producer.startProducing(consumer))
+        self.assertEqual(b"hello", zlib.decompress(b"".join(consumer.written)))
+
+    def test_zstd(self):
+        """
+        The zstd coding uses the zstandard package.
+        """
+        compressobj = mock.Mock(
+            compress=mock.Mock(return_value=b"c"), flush=mock.Mock(return_value=b"f")
+        )
+        zstandard = mock.Mock()
+        zstandard.ZstdCompressor.return_value.compressobj.return_value = compressobj
+        with mock.patch.object(producers, "zstandard", zstandard):
+            producer = CompressingProducer(BytesProducer(b"hello"), "zstd")
+        zstandard.ZstdCompressor.assert_called_once_with(level=3)
+        consumer = _Consumer()
+        self.successResultOf(producer.startProducing(consumer))
+        compressobj.compress.assert_called_once_with(b"hello")
+        self.assertEqual([b"c", b"f"], consumer.written)
+
+    def test_unavailable(self):
+        """
+        zstd requires the zstandard package, and unknown codings are
+        rejected.
+        """
+        with mock.patch.object(producers, "zstandard", None):
+            self.assertRaises(
+                ImportError, CompressingProducer, _FakeProducer(), "zstd"
+            )
+        self.assertRaises(ValueError, CompressingProducer, _FakeProducer(), "br")
+
+    def test_pause(self):
+        """
+        The wrapped producer is paused and resumed with the compressing one.
+        """
+        wrapped = _FakeProducer()
+        producer = CompressingProducer(wrapped)
+        producer.startProducing(_Consumer())
+        producer.pauseProducing()
+        self.assertTrue(wrapped.paused)
+        producer.resumeProducing()
+        self.assertFalse(wrapped.paused)
+
+    def test_stop(self):
+        """
+        Stopping the producer stops the wrapped one, and the `Deferred`
+        doesn't fire.
+        """
+        wrapped = _FakeProducer()
+        producer = CompressingProducer(wrapped)
+        d = producer.startProducing(_Consumer())
+        producer.stopProducing()
+        self.assertTrue(wrapped.stopped)
+        self.assertNoResult(d)
+
+    def test_failure(self):
+        """
+        If the wrapped producer fails, so does the compressing one.
+        """
+        wrapped = _FakeProducer()
+        d = CompressingProducer(wrapped).startProducing(_Consumer())
+        wrapped.finished.errback(ValueError())
+        self.failureResultOf(d, ValueError)
+        self.assertFalse(wrapped.stopped)
+
+    def test_threadpool(self):
+        """
+        With a thread pool chunks are compressed in it in order, and the
+        wrapped producer is paused while more than two are waiting.
+        """
+        reactor = mock.Mock(["callFromThread"])
+        reactor.callFromThread.side_effect = lambda f, *a, **kw: f(*a, **kw)
+        threadpool = _QueuedThreadPool()
+        wrapped = _FakeProducer()
+        consumer = _Consumer()
+        producer = CompressingProducer(
+            wrapped, level=0, reactor=reactor, threadpool=threadpool
+        )
+        d = producer.startProducing(consumer)
+        for chunk in [b"a", b"b", b"c"]:
+            wrapped.consumer.write(chunk)
+        self.assertTrue(wrapped.paused)
+        self.assertEqual([], consumer.written)
+        threadpool.runOne()
+        self.assertFalse(wrapped.paused)
+        wrapped.consumer.write(b"d")
+        wrapped.finished.callback(None)
+        self.assertNoResult(d)
+        threadpool.run()
+        self.successResultOf(d)
+        self.assertEqual(b"abcd", gzip.decompress(b"".join(consumer.written)))
+
+    def test_threadpool_pause(self):
+        """
+        With a thread pool the wrapped producer stays paused while the
+        consumer is, however many chunks are waiting.
+        """
+        reactor = mock.Mock(["callFromThread"])
+        reactor.callFromThread.side_effect = lambda f, *a, **kw: f(*a, **kw)
+        threadpool = _QueuedThreadPool()
+        wrapped = _FakeProducer()
+        producer = CompressingProducer(wrapped, reactor=reactor, threadpool=threadpool)
+        producer.startProducing(_Consumer())
+        producer.pauseProducing()
+        for chunk in [b"a", b"b", b"c"]:
+            wrapped.consumer.write(chunk)
+        threadpool.run()
+        self.assertTrue(wrapped.paused)
+        producer.resumeProducing()
+        self.assertFalse(wrapped.paused)
+
+
+class ContinueProducerTests(SynchronousTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.wrapped = _FakeProducer()
+        self.producer = ContinueProducer(self.wrapped, reactor=self.clock, timeout=2)
+        self.consumer = _Consumer()
+
+    def test_interface(self):
+        """
+        `ContinueProducer` provides `IBodyProducer`, with the length of the
+        wrapped producer.
+        """
+        self.assertTrue(verifyObject(IBodyProducer, self.producer))
+        self.assertEqual(10, self.producer.length)
+
+    def test_delayed(self):
+        """
+        The wrapped producer is started once the timeout has passed, and
+        the `Deferred` fires with its result.
+        """
+        d = self.producer.startProducing(self.consumer)
+        self.clock.advance(1.9)
+        self.assertFalse(hasattr(self.wrapped, "consumer"))
+        self.clock.advance(0.1)
+        self.assertIs(self.consumer, self.wrapped.consumer)
+        self.producer.pauseProducing()
+        self.assertTrue(self.wrapped.paused)
+        self.producer.resumeProducing()
+        self.assertFalse(self.wrapped.paused)
+        self.producer.cancel()
+        self.assertFalse(self.wrapped.stopped)
+        self.wrapped.finished.callback(None)
+        self.assertIsNone(self.successResultOf(d))
+
+    def test_paused(self):
+        """
+        If the producer is paused when the timeout passes the wrapped
+        producer is started once it is resumed.
+        """
+        self.producer.startProducing(self.consumer)
+        self.producer.pauseProducing()
+        self.clock.advance(2)
+        self.assertFalse(hasattr(self.wrapped, "consumer"))
+        self.producer.resumeProducing()
+        self.assertIs(self.consumer, self.wrapped.consumer)
+        self.assertFalse(self.wrapped.paused)
+
+    def test_cancel(self):
+        """
+        Cancelling the producer before the timeout passes means the wrapped
+        producer is never started, and the `Deferred` never fires.
+        """
+        d = self.producer.startProducing(self.consumer)
+        self.producer.cancel()
+        self.clock.advance(2)
+        self.producer.resumeProducing()
+        self.assertFalse(hasattr(self.wrapped, "consumer"))
+        self.assertFalse(self.wrapped.stopped)
+        self.assertEqual([], self.clock.getDelayedCalls())
+        self.assertNoResult(d)
+
+    def test_stop(self):
+        """
+        Stopping the producer stops the wrapped producer once started.
+        """
+        d = self.producer.startProducing(self.consumer)
+        self.clock.advance(2)
+        self.producer.stopProducing()
+        self.assertTrue(self.wrapped.stopped)
+        self.assertNoResult(d)
+
+    def test_cancelDeferred(self):
+        """
+        Cancelling the `Deferred` stops the producer.
+        """
+        d = self.producer.startProducing(self.consumer)
+        d.cancel()
+        self.failureResultOf(d, CancelledError)
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+
+class _Unseekable:
+    """
+    A binary stream which can't be seeked.
+    """
+
+    def __init__(self, data):
+        self._file = BytesIO(data)
+        self.read = self._file.read
+        self.closed = False
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self.closed = True
+
+
+class ReplayableProducerTests(SynchronousTestCase):
+    def setUp(self):
+        self.scheduled = []
+        self.cooperator = task.Cooperator(
+            terminationPredicateFactory=lambda: lambda: True,
+            scheduler=self.scheduled.append,
+        )
+
+    def produce(self, producer):
+        consumer = _Consumer()
+        d = producer.startProducing(consumer)
+        while self.scheduled:
+            self.scheduled.pop(0)()
+        self.successResultOf(d)
+        return b"".join(consumer.written)
+
+    def replayable(self, body, **kwargs):
+        return ReplayableProducer(body, cooperator=self.cooperator, **kwargs)
+
+    def test_interface(self):
+        """
+        `ReplayableProducer` provides `IBodyProducer`.
+        """
+        self.assertTrue(verifyObject(IBodyProducer, self.replayable(b"x")))
+
+    def test_buffer(self):
+        """
+        Bytes and other buffers are written again for each production.
+        """
+        for data in [b"hello", bytearray(b"hello"), memoryview(b"hello")]:
+            producer = self.replayable(data)
+            self.assertEqual(5, producer.length)
+            self.assertEqual(b"hello", self.produce(producer))
+            self.assertTrue(producer.replayable)
+            self.assertEqual(b"hello", self.produce(producer))
+
+    def test_regularFile(self):
+        """
+        A regular file is produced from the position it had when the
+        producer was made, and closed by `close`.
+        """
+        path = self.mktemp()
+        with open(path, "wb") as f:
+            f.write(b"abcdefg")
+        f = open(path, "rb")
+        f.seek(2)
+        producer = self.replayable(f)
+        self.assertEqual(5, producer.length)
+        self.assertEqual(b"cdefg", self.produce(producer))
+        self.assertFalse(f.closed)
+        self.assertEqual(b"cdefg", self.produce(producer))
+        producer.close()
+        self.assertTrue(f.closed)
+        self.assertFalse(producer.replayable)
+
+    def test_seekableFile(self):
+        """
+        Any seekable file is rewound and read again.
+        """
+        f = BytesIO(b"abcdefg")
+        f.seek(3)
+        producer = self.replayable(f)
+        self.assertEqual(4, producer.length)
+        self.assertEqual(b"defg", self.produce(producer))
+        f.seek(0)
+        self.assertEqual(b"defg", self.produce(producer))
+
+    def test_spooled(self):
+        """
+        Any other producer is spooled as it is first produced, to a
+        temporary file once it outgrows *max_memory*, and the spool produced
+        again.
+        """
+        data = [b"a" * 10, b"b" * 10]
+        producer = self.replayable(
+            IterableProducer(iter(data), self.cooperator), max_memory=15
+        )
+        self.addCleanup(producer.close)
+        self.assertIs(UNKNOWN_LENGTH, producer.length)
+        self.assertTrue(producer.replayable)
+        self.assertEqual(b"".join(data), self.produce(producer))
+        self.assertTrue(producer.replayable)
+        self.assertEqual(b"".join(data), self.produce(producer))
+        self.assertEqual(b"".join(data), self.produce(producer))
+
+    def test_unseekableFile(self):
+        """
+        A file which can't be seeked is read and spooled.
+        """
+        f = _Unseekable(b"hello")
+        producer = self.replayable(f)
+        self.assertIs(UNKNOWN_LENGTH, producer.length)
+        self.assertEqual(b"hello", self.produce(producer))
+        self.assertEqual(b"hello", self.produce(producer))
+        producer.close()
+        self.assertTrue(f.closed)
+
+    def test_tooLarge(self):
+        """
+        A body larger than *max_spool* is produced once, and then can't be
+        produced again.
+        """
+        producer = self.replayable(
+            IterableProducer(iter([b"abc", b"def"]), self.cooperator), max_spool=5
+        )
+        self.assertEqual(b"abcdef", self.produce(producer))
+        self.assertFalse(producer.replayable)
+        self.failureResultOf(producer.startProducing(_Consumer()), ValueError)
+
+    def test_unfinished(self):
+        """
+        A spooled body can't be produced again until its first production
+        has finished, nor if that was stopped.
+        """
+        producer = self.replayable(
+            IterableProducer(iter([b"abc", b"def"]), self.cooperator)
+        )
+        d = producer.startProducing(_Consumer())
+        self.assertFalse(producer.replayable)
+        producer.stopProducing()
+        self.scheduled.clear()
+        self.assertNoResult(d)
+        self.assertFalse(producer.replayable)
+        self.assertIsNone(producer._spool)
+
+    def test_restart(self):
+        """
+        Starting the producer while it is producing stops the previous
+        production.
+        """
+        producer = self.replayable(BytesIO(b"abcdef"))
+        first = _Consumer()
+        d = producer.startProducing(first)
+        self.assertEqual(b"abcdef", self.produce(producer))
+        self.assertEqual([], first.written)
+        self.assertNoResult(d)
+
+    def test_pause(self):
+        """
+        Pausing and resuming the producer pauses and resumes the current
+        production.
+        """
+        producer = self.replayable(BytesIO(b"abcdef"))
+        consumer = _Consumer()
+        d = producer.startProducing(consumer)
+        producer.pauseProducing()
+        self.scheduled.pop(0)()
+        self.assertEqual([], consumer.written)
+        producer.resumeProducing()
+        while self.scheduled:
+            self.scheduled.pop(0)()
+        self.assertEqual(b"abcdef", b"".join(consumer.written))
+        self.successResultOf(d)
@@ -0,0 +1,260 @@
+import gzip
+from unittest import mock
+
+from twisted.internet.defer import Deferred
+from twisted.internet.error import ConnectionRefusedError
+from twisted.internet.task import Clock
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.python.failure import Failure
+from twisted.web.client import ResponseDone, ResponseFailed
+from twisted.web.http_headers import Headers
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET
+
+from treq.content import content
+from treq.proxy import ReverseProxyResource, _end_to_end, _RelayProtocol
+from treq.testing import RequestTraversalAgent, StubTreq
+
+
+class _UpstreamResource(Resource):
+    """
+    Record each request, and respond to it with a body written piece by
+    piece when the test says.
+    """
+
+    isLeaf = True
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def render(self, request):
+        request.setHeader(b"keep-alive", b"timeout=5")
+        request.setHeader(b"x-upstream", b"yes")
+        request.setHeader(b"set-cookie", b"session=1")
+        self.requests.append((request, request.content.read()))
+        return NOT_DONE_YET
+
+
+class _RefusingAgent:
+    def request(self, method, uri, headers=None, bodyProducer=None):
+        d = Deferred()
+        d.errback(ConnectionRefusedError())
+        return d
+
+
+class _HangingAgent:
+    def request(self, method, uri, headers=None, bodyProducer=None):
+        return Deferred()
+
+
+class RelayProtocolTests(SynchronousTestCase):
+    def test_backpressure(self):
+        """
+        The upstream transport is registered as the producer for the
+        downstream request, so it is paused while the downstream connection
+        can't keep up, until the body ends.
+        """
+        request = mock.Mock(
+            ["channel", "registerProducer", "unregisterProducer", "write"]
+        )
+        finished = Deferred()
+        protocol = _RelayProtocol(request, finished)
+        transport = object()
+        protocol.makeConnection(transport)
+        request.registerProducer.assert_called_once_with(transport, True)
+        protocol.dataReceived(b"x")
+        request.write.assert_called_once_with(b"x")
+        protocol.connectionLost(Failure(ResponseDone()))
+        request.unregisterProducer.assert_called_once_with()
+        self.assertIsNone(self.successResultOf(finished))
+
+
+class EndToEndTests(SynchronousTestCase):
+    def test_hop_by_hop(self):
+        """
+        Hop-by-hop headers and those named by Connection are not forwarded.
+        """
+        headers = Headers(
+            {
+                b"Connection": [b"close, X-Private"],
+                b"Keep-Alive": [b"timeout=5"],
+                b"Transfer-Encoding": [b"chunked"],
+                b"X-Private": [b"secret"],
+                b"Content-Type": [b"text/plain"],
+            }
+        )
+        self.assertEqual(
+            {b"Content-Type": [b"text/plain"]},
+            dict(_end_to_end(headers).getAllRawHeaders()),
+        )
+
+
+class ReverseProxyResourceTests(SynchronousTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.upstream = _UpstreamResource()
+        self.agent = RequestTraversalAgent(self.upstream)
+        self.proxy = ReverseProxyResource(
+            "https://backend.example/v1/", self.agent, reactor=self.clock
+        )
+        self.root = Resource()
+        self.root.putChild(b"api", self.proxy)
+        self.treq = StubTreq(self.root)
+
+    def flush(self):
+        for _ in range(3):
+            self.clock.advance(0)
+            self.agent.flush()
+            self.treq.flush()
+
+    def request(self, method, url, **kwargs):
+        d = self.treq.request(method, url, unbuffered=True, **kwargs)
+        self.flush()
+        return d
+
+    def test_forward(self):
+        """
+        The request is forwarded to the corresponding upstream URL with its
+        body and end-to-end headers, and the response is relayed.
+        """
+        d = self.request(
+            "POST",
+            "http://proxy.example/api/a%2Fb/c?x=1",
+            data=b"hello",
+            headers={"Connection": "x-private", "X-Private": "secret"},
+        )
+        [(upstreamRequest, body)] = self.upstream.requests
+        self.assertEqual(b"POST", upstreamRequest.method)
+        self.assertEqual(b"/v1/a%2Fb/c?x=1", upstreamRequest.uri)
+        self.assertEqual(b"hello", body)
+        headers = upstreamRequest.requestHeaders
+        self.assertEqual([b"backend.example"], headers.getRawHeaders(b"host"))
+        self.assertEqual([b"proxy.example"], headers.getRawHeaders(b"x-forwarded-host"))
+        self.assertEqual([b"http"], headers.getRawHeaders(b"x-forwarded-proto"))
+        self.assertEqual([b"1.1 treq"], headers.getRawHeaders(b"via"))
+        self.assertIsNone(headers.getRawHeaders(b"x-private"))
+
+        upstreamRequest.setResponseCode(201)
+        upstreamRequest.write(b"wor")
+        self.flush()
+        response = self.successResultOf(d)
+        self.assertEqual(201, response.code)
+        self.assertEqual([b"yes"], response.headers.getRawHeaders(b"x-upstream"))
+        self.assertIsNone(response.headers.getRawHeaders(b"keep-alive"))
+        self.assertEqual([b"session=1"], response.headers.getRawHeaders(b"set-cookie"))
+        body = response.content()
+        upstreamRequest.write(b"ld")
+        upstreamRequest.finish()
+        self.flush()
+        self.assertEqual(b"world", self.successResultOf(body))
+
+    def test_content_encoding(self):
+        """
+        The client's Accept-Encoding header is forwarded as it is, and
+        a compressed response is relayed without being decoded.
+        """
+        downstream = RequestTraversalAgent(self.root)
+        d = downstream.request(
+            b"GET",
+            b"http://proxy.example/api/",
+            Headers({b"accept-encoding": [b"br, gzip"]}),
+        )
+        self.flush()
+        [(upstreamRequest, _)] = self.upstream.requests
+        self.assertEqual(
+            [b"br, gzip"],
+            upstreamRequest.requestHeaders.getRawHeaders(b"accept-encoding"),
+        )
+
+        compressed = gzip.compress(b"hello")
+        upstreamRequest.setHeader(b"content-encoding", b"gzip")
+        upstreamRequest.setHeader(b"content-length", b"%d" % (len(compressed),))
+        upstreamRequest.setHeader(b"etag", b'"v1-gzip"')
+        upstreamRequest.write(compressed)
+        upstreamRequest.finish()
+        self.flush()
+        downstream.flush()
+        response = self.successResultOf(d)
+        self.assertEqual(
+            [b"gzip"], response.headers.getRawHeaders(b"content-encoding")
+        )
+        self.assertEqual([b'"v1-gzip"'], response.headers.getRawHeaders(b"etag"))
+        self.assertEqual(len(compressed), response.length)
+        body = content(response)
+        downstream.flush()
+        self.assertEqual(compressed, self.successResultOf(body))
+
+    def test_cookies_not_stored(self):
+        """
+        Cookies set by the upstream server aren't sent with later requests.
+        """
+        self.request("GET", "http://proxy.example/api/")
+        self.upstream.requests[0][0].finish()
+        self.flush()
+        # A different downstream client.
+        self.treq = StubTreq(self.root)
+        self.request("GET", "http://proxy.example/api/")
+        self.assertIsNone(
+            self.upstream.requests[1][0].requestHeaders.getRawHeaders(b"cookie")
+        )
+
+    def test_disconnect(self):
+        """
+        When the downstream client disconnects the upstream response is
+        closed.
+        """
+        d = self.request("GET", "http://proxy.example/api/")
+        upstreamRequest = self.upstream.requests[0][0]
+        upstreamRequest.write(b"x")
+        self.flush()
+        self.successResultOf(d)
+        [downstreamPump] = self.treq._agent._pumps
+        downstreamPump.clientIO.loseConnection()
+        self.flush()
+        self.assertTrue(upstreamRequest._disconnected)
+
+    def test_unreachable(self):
+        """
+        The response is 502 Bad Gateway when the upstream server can't be
+        reached.
+        """
+        proxy = ReverseProxyResource(
+            "https://backend.example/", _RefusingAgent(), reactor=self.clock
+        )
+        response = self.successResultOf(StubTreq(proxy).get("http://proxy.example/"))
+        self.assertEqual(502, response.code)
+        self.assertEqual(b"Bad Gateway", self.successResultOf(response.content()))
+        self.assertEqual(1, len(self.flushLoggedErrors(ConnectionRefusedError)))
+
+    def test_timeout(self):
+        """
+        The response is 504 Gateway Timeout when the upstream server doesn't
+        respond in time.
+        """
+        proxy = ReverseProxyResource(
+            "https://backend.example/", _HangingAgent(), reactor=self.clock, timeout=2
+        )
+        treq = StubTreq(proxy)
+        d = treq.get("http://proxy.example/")
+        self.clock.advance(2)
+        treq.flush()
+        response = self.successResultOf(d)
+        self.assertEqual(504, response.code)
+
+    def test_failed_body(self):
+        """
+        If the upstream response fails partway the downstream connection is
+        closed.
+        """
+        d = self.request("GET", "http://proxy.example/api/")
+        upstreamRequest = self.upstream.requests[0][0]
+        upstreamRequest.setHeader(b"content-length", b"10")
+        upstreamRequest.write(b"x")
+        self.flush()
+        response = self.successResultOf(d)
+        body = response.content()
+        upstreamRequest.loseConnection()
+        self.flush()
+        self.failureResultOf(body, ResponseFailed)
+        self.assertTrue(self.flushLoggedErrors())
@@ -0,0 +1,195 @@
+import os
+
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.error import Error
+from twisted.web.resource import Resource
+
+from treq.remote import RemoteFile
+from treq.testing import StubTreq
+
+
+class _BlobResource(Resource):
+    """
+    Serve *data* with an entity tag, honoring single Range headers
+    (including suffix ranges) and If-Match, and record each request's Range
+    header.
+    """
+
+    isLeaf = True
+
+    def __init__(self, data=bytes(range(100)), etag=b'"v1"'):
+        super().__init__()
+        self.data = data
+        self.etag = etag
+        self.ranges = True
+        self.requested = []
+
+    def render_GET(self, request):
+        range = request.getHeader(b"range")
+        self.requested.append(range)
+        ifMatch = request.getHeader(b"if-match")
+        if ifMatch is not None and ifMatch != self.etag:
+            request.setResponseCode(412)
+            return b""
+        request.setHeader(b"etag", self.etag)
+        if not self.ranges or range is None:
+            return self.data
+        first, last = range.split(b"=")[1].split(b"-")
+        size = len(self.data)
+        if not first:
+            first, last = max(size - int(last), 0), size - 1
+        first, last = int(first), min(int(last), size - 1)
+        if first >= size:
+            request.setResponseCode(416)
+            request.setHeader(b"content-range", b"bytes */%d" % size)
+            return b""
+        request.setResponseCode(206)
+        request.setHeader(b"content-range", b"bytes %d-%d/%d" % (first, last, size))
+        return self.data[first:last + 1]
+
+
+class RemoteFileTests(SynchronousTestCase):
+    def setUp(self):
+        self.resource = _BlobResource()
+        self.treq = StubTreq(self.resource)
+
+    def open(self, **kwargs):
+        kwargs.setdefault("block_size", 10)
+        kwargs.setdefault("max_read_ahead", 0)
+        kwargs.setdefault("max_gap", 0)
+        return RemoteFile(self.treq, "https://x.example/", **kwargs)
+
+    def test_read(self):
+        """
+        Reads fetch the aligned blocks they cover, and advance the position.
+        """
+        f = self.open()
+        self.assertIsNone(f.size)
+        self.assertEqual(5, self.successResultOf(f.seek(5)))
+        self.assertEqual(bytes(range(5, 25)), self.successResultOf(f.read(20)))
+        self.assertEqual([b"bytes=0-29"], self.resource.requested)
+        self.assertEqual(25, f.tell())
+        self.assertEqual(100, f.size)
+
+    def test_cache(self):
+        """
+        Cached blocks aren't fetched again until they are evicted, least
+        recently used first.
+        """
+        f = self.open(cache_size=20)
+        self.successResultOf(f.read(5))
+        self.successResultOf(f.seek(50))
+        self.successResultOf(f.read(5))
+        self.successResultOf(f.seek(0))
+        self.successResultOf(f.read(5))
+        self.successResultOf(f.seek(70))
+        self.successResultOf(f.read(5))
+        self.assertEqual(3, len(self.resource.requested))
+        self.successResultOf(f.seek(50))
+        self.successResultOf(f.read(5))
+        self.assertEqual(
+            [b"bytes=0-9", b"bytes=50-59", b"bytes=70-79", b"bytes=50-59"],
+            self.resource.requested,
+        )
+
+    def test_seek_end(self):
+        """
+        Seeking relative to the end requests the last block, which is then
+        cached.
+        """
+        f = self.open()
+        self.assertEqual(92, self.successResultOf(f.seek(-8, os.SEEK_END)))
+        self.assertEqual(bytes(range(92, 100)), self.successResultOf(f.read()))
+        self.assertEqual(b"", self.successResultOf(f.read(1)))
+        self.assertEqual([b"bytes=-10"], self.resource.requested)
+
+    def test_seek_invalid(self):
+        """
+        Seeking before the start of the file fails.
+        """
+        f = self.open()
+        self.failureResultOf(f.seek(-1), ValueError)
+        self.assertRaises(ValueError, f.seek, 0, 3)
+
+    def test_read_past_end(self):
+        """
+        Reading beyond the end of the file gives what remains, and then
+        nothing.
+        """
+        f = self.open()
+        self.successResultOf(f.seek(95))
+        self.assertEqual(bytes(range(95, 100)), self.successResultOf(f.read(50)))
+        self.successResultOf(f.seek(200))
+        self.assertEqual(b"", self.successResultOf(f.read(50)))
+
+    def test_read_past_end_unknown_size(self):
+        """
+        Reading beyond the end before the size is known gives nothing.
+        """
+        f = self.open()
+        self.successResultOf(f.seek(200))
+        self.assertEqual(b"", self.successResultOf(f.read(50)))
+        self.assertEqual(100, f.size)
+
+    def test_merge(self):
+        """
+        Missing blocks separated by no more than *max_gap* bytes are fetched
+        with one request.
+        """
+        f = self.open(max_gap=10)
+        self.successResultOf(f.seek(10))
+        self.successResultOf(f.read(5))
+        self.successResultOf(f.seek(0))
+        self.assertEqual(bytes(range(0, 30)), self.successResultOf(f.read(30)))
+        self.successResultOf(f.seek(50))
+        self.successResultOf(f.read(30))
+        self.assertEqual(
+            [b"bytes=10-19", b"bytes=0-29", b"bytes=50-79"], self.resource.requested
+        )
+
+    def test_read_ahead(self):
+        """
+        Sequential reads fetch blocks ahead once those already fetched run
+        out, doubling the amount up to *max_read_ahead*, and a random read
+        resets it.
+        """
+        f = self.open(max_read_ahead=30)
+        for _ in range(7):
+            self.successResultOf(f.read(10))
+        self.successResultOf(f.seek(0))
+        self.successResultOf(f.read(1))
+        self.assertEqual(
+            [
+                b"bytes=0-9",
+                b"bytes=10-29",
+                b"bytes=30-49",
+                b"bytes=50-79",
+            ],
+            self.resource.requested,
+        )
+
+    def test_conditional(self):
+        """
+        Requests after the first must match its entity tag, so a read of a
+        file which has changed fails.
+        """
+        f = self.open()
+        self.successResultOf(f.read(5))
+        self.resource.etag = b'"v2"'
+        self.resource.data = b"x" * 100
+        self.successResultOf(f.seek(50))
+        failure = self.failureResultOf(f.read(5), Error)
+        self.assertEqual(b"412", failure.value.status)
+        self.assertEqual(50, f.tell())
+
+    def test_no_ranges(self):
+        """
+        A server that responds to a range request with the whole file fails
+        the read, and the failed blocks can be fetched again.
+        """
+        f = self.open()
+        self.resource.ranges = False
+        failure = self.failureResultOf(f.read(5), Error)
+        self.assertEqual(b"200", failure.value.status)
+        self.resource.ranges = True
+        self.assertEqual(bytes(range(5)), self.successResultOf(f.read(5)))
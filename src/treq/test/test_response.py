@@ -1,13 +1,16 @@
 from decimal import Decimal
+from unittest import mock
 
 from twisted.trial.unittest import SynchronousTestCase
 
 from twisted.python.failure import Failure
-from twisted.web.client import ResponseDone
+from twisted.web.client import ResponseDone, ResponseFailed
 from twisted.web.iweb import UNKNOWN_LENGTH
 from twisted.web.http_headers import Headers
 
+from treq.codec import CodecRegistry
 from treq.response import _Response
+from treq.test.test_codec import _ReversingCodec
 
 
 class FakeResponse:
@@ -103,6 +106,88 @@ class ResponseTests(SynchronousTestCase):
             Decimal("1.0000000000000001")
         )
 
+    def test_json_codec(self):
+        """
+        The JSON codec of the client's registry decodes the body bytes.
+        """
+        json_codec = mock.Mock(media_type="application/json")
+        original = FakeResponse(200, Headers(), body=[b'{}'])
+        response = _Response(original, None, CodecRegistry([json_codec]))
+
+        self.assertIs(
+            self.successResultOf(response.json(strict=False)),
+            json_codec.decode.return_value,
+        )
+        json_codec.decode.assert_called_once_with(b'{}', strict=False)
+
+    def test_decode_default(self):
+        """
+        Without a codec registry JSON bodies may be decoded.
+        """
+        headers = Headers({b'content-type': [b'application/problem+json']})
+        original = FakeResponse(400, headers, body=[b'{"title":', b'"no"}'])
+        self.assertEqual(
+            {'title': 'no'},
+            self.successResultOf(_Response(original, None).decode()),
+        )
+
+    def test_decode_content_type(self):
+        """
+        The body is decoded by the codec registered for its Content-Type.
+        """
+        headers = Headers({b'content-type': [b'application/reversed']})
+        original = FakeResponse(200, headers, body=[b'oof'])
+        response = _Response(
+            original, None, CodecRegistry([_ReversingCodec()])
+        )
+        self.assertEqual(b'foo', self.successResultOf(response.decode()))
+
+    def test_decode_unknown(self):
+        """
+        Decoding fails with `ValueError` when no codec handles the response's
+        Content-Type.
+        """
+        for headers in [Headers(), Headers({'content-type': ['text/plain']})]:
+            original = FakeResponse(200, headers, body=[b'x'])
+            self.failureResultOf(
+                _Response(original, None).decode(), ValueError
+            )
+
+    def test_collect_json_items(self):
+        original = FakeResponse(200, Headers(), body=[b'{"a": [1, {', b'}]}'])
+        items = []
+        d = _Response(original, None).collect_json_items(items.append, "a.item")
+        self.assertIsNone(self.successResultOf(d))
+        self.assertEqual([1, {}], items)
+
+    def test_collect_lines(self):
+        original = FakeResponse(200, Headers(), body=[b'a\nb', b'\r\n'])
+        lines = []
+        self.successResultOf(_Response(original, None).collect_lines(lines.append))
+        self.assertEqual(["a", "b"], lines)
+
+    def test_collect_ndjson(self):
+        original = FakeResponse(200, Headers(), body=[b'1\n', b'{}\n'])
+        values = []
+        self.successResultOf(
+            _Response(original, None).collect_ndjson(values.append)
+        )
+        self.assertEqual([1, {}], values)
+
+    def test_collect_csv(self):
+        original = FakeResponse(200, Headers(), body=[b'a,b\n', b'c,d\n'])
+        records = []
+        self.successResultOf(_Response(original, None).collect_csv(records.append))
+        self.assertEqual([["a", "b"], ["c", "d"]], records)
+
+    def test_tee(self):
+        original = FakeResponse(200, Headers(), body=[b'foo', b'bar'])
+        consumers = [mock.Mock(), mock.Mock()]
+        self.successResultOf(_Response(original, None).tee(*consumers))
+        for consumer in consumers:
+            consumer.write.assert_has_calls([mock.call(b'foo'), mock.call(b'bar')])
+            consumer.unregisterProducer.assert_called_once_with()
+
     def test_text(self):
         headers = Headers({b'content-type': [b'text/plain;charset=utf-8']})
         original = FakeResponse(200, headers, body=[b'\xe2\x98', b'\x83'])
@@ -137,3 +222,149 @@ class ResponseTests(SynchronousTestCase):
     def test_no_history(self):
         wrapper = _Response(FakeResponse(200, Headers({})), None)
         self.assertEqual(wrapper.history(), [])
+
+
+class StreamingResponse:
+    """
+    A response whose body is delivered piece by piece when the test says.
+    """
+
+    def __init__(self, length=UNKNOWN_LENGTH):
+        self.code = 200
+        self.headers = Headers()
+        self.length = length
+        self.previousResponse = None
+        self.protocol = None
+        self.transport = mock.Mock(
+            ['pauseProducing', 'resumeProducing', 'stopProducing']
+        )
+
+    def deliverBody(self, protocol):
+        self.protocol = protocol
+        protocol.makeConnection(self.transport)
+
+    def finish(self, reason=None):
+        self.protocol.connectionLost(Failure(reason or ResponseDone()))
+
+
+class PeekTests(SynchronousTestCase):
+    def test_peek(self):
+        """
+        Peeking receives only as much of the body as was asked for, and the
+        whole body can still be read afterwards.
+        """
+        original = StreamingResponse()
+        response = _Response(original, None)
+        d = response.peek(4)
+        original.protocol.dataReceived(b'ab')
+        self.assertNoResult(d)
+        original.protocol.dataReceived(b'cdef')
+        self.assertEqual(b'abcd', self.successResultOf(d))
+        original.transport.pauseProducing.assert_called_once_with()
+        self.assertEqual(b'ab', self.successResultOf(response.peek(2)))
+
+        body = response.content()
+        original.transport.resumeProducing.assert_called_once_with()
+        original.protocol.dataReceived(b'gh')
+        original.finish()
+        self.assertEqual(b'abcdefgh', self.successResultOf(body))
+
+    def test_peek_short(self):
+        """
+        Peeking at more than the whole body gives the whole body.
+        """
+        original = StreamingResponse()
+        d = _Response(original, None).peek(10)
+        original.protocol.dataReceived(b'abc')
+        original.finish()
+        self.assertEqual(b'abc', self.successResultOf(d))
+
+    def test_peek_failure(self):
+        """
+        Peeking fails if the body fails before enough has been received.
+        """
+        original = StreamingResponse()
+        d = _Response(original, None).peek(10)
+        original.protocol.dataReceived(b'abc')
+        original.finish(ResponseFailed([]))
+        self.failureResultOf(d, ResponseFailed)
+
+    def test_peek_while_reading(self):
+        """
+        Peeking fails once the body is being read.
+        """
+        original = StreamingResponse()
+        response = _Response(original, None)
+        response.peek(1)
+        response.content()
+        self.failureResultOf(response.peek(1), RuntimeError)
+
+    def test_consumer_pause(self):
+        """
+        The protocol reading the body after peeking can keep the transport
+        paused.
+        """
+        original = StreamingResponse()
+        response = _Response(original, None)
+        response.peek(1)
+        original.protocol.dataReceived(b'a')
+        protocol = mock.Mock()
+        protocol.dataReceived.side_effect = (
+            lambda data: protocol.makeConnection.call_args[0][0].pauseProducing()
+        )
+        response.deliverBody(protocol)
+        protocol.dataReceived.assert_called_once_with(b'a')
+        original.transport.resumeProducing.assert_not_called()
+        protocol.makeConnection.call_args[0][0].resumeProducing()
+        original.transport.resumeProducing.assert_called_once_with()
+
+
+class AbortTests(SynchronousTestCase):
+    def test_close(self):
+        """
+        A body longer than the drain limit is not received; the connection
+        is closed.
+        """
+        original = StreamingResponse(length=100)
+        d = _Response(original, None).abort(drain=10)
+        original.transport.stopProducing.assert_called_once_with()
+        self.assertNoResult(d)
+        original.finish(ResponseFailed([]))
+        self.assertIsNone(self.successResultOf(d))
+
+    def test_drain(self):
+        """
+        A short body is received and discarded.
+        """
+        original = StreamingResponse(length=10)
+        d = _Response(original, None).abort(drain=10)
+        original.protocol.dataReceived(b'x' * 10)
+        original.finish()
+        original.transport.stopProducing.assert_not_called()
+        self.assertIsNone(self.successResultOf(d))
+
+    def test_drain_unknown_length(self):
+        """
+        A body of unknown length is drained until it is longer than the
+        limit.
+        """
+        original = StreamingResponse()
+        _Response(original, None).abort(drain=10)
+        original.protocol.dataReceived(b'x' * 10)
+        original.transport.stopProducing.assert_not_called()
+        original.protocol.dataReceived(b'x')
+        original.transport.stopProducing.assert_called_once_with()
+
+    def test_after_peek(self):
+        """
+        A body can be aborted after peeking at it.
+        """
+        original = StreamingResponse(length=100)
+        response = _Response(original, None)
+        peeked = response.peek(2)
+        original.protocol.dataReceived(b'abc')
+        self.assertEqual(b'ab', self.successResultOf(peeked))
+        d = response.abort(drain=10)
+        original.transport.stopProducing.assert_called_once_with()
+        original.finish(ResponseFailed([]))
+        self.assertIsNone(self.successResultOf(d))
@@ -0,0 +1,256 @@
+from unittest import mock
+
+from twisted.internet.task import Clock
+from twisted.python.failure import Failure
+from twisted.trial.unittest import SynchronousTestCase
+from twisted.web.client import ResponseDone, ResponseFailed
+from twisted.web.http_headers import Headers
+from twisted.web.iweb import UNKNOWN_LENGTH
+
+from treq._agentspy import agent_spy
+from treq.client import HTTPClient
+from treq.sse import Event, EventSource, EventStreamError, _EventParser
+
+
+class FakeResponse:
+    def __init__(self, code=200, content_type=b"text/event-stream"):
+        self.code = code
+        self.phrase = b"OK"
+        self.version = (b"HTTP", 1, 1)
+        self.headers = Headers({b"Content-Type": [content_type]})
+        self.length = UNKNOWN_LENGTH
+        self.previousResponse = None
+        self.protocol = None
+        self.transport = mock.Mock(["stopProducing"])
+
+    def deliverBody(self, protocol):
+        self.protocol = protocol
+        protocol.makeConnection(self.transport)
+
+
+class EventParserTests(SynchronousTestCase):
+    def setUp(self):
+        self.events = []
+        self.retries = []
+        self.parser = _EventParser(self.events.append, self.retries.append)
+
+    def feed(self, data):
+        for i in range(len(data)):
+            self.parser.feed(data[i:i + 1])
+
+    def test_events(self):
+        """
+        Events are dispatched at blank lines, with multiple data fields
+        joined by newlines and lines ending in any of CRLF, LF, or CR.
+        """
+        self.feed(
+            b"\xef\xbb\xbfdata: a\r\ndata:b\n\n: comment\r"
+            b"event: ping\rid: 7\rdata:  c\r\r"
+            b"data\n\n"
+        )
+        self.assertEqual(
+            [
+                Event("a\nb"),
+                Event(" c", "ping", "7"),
+                Event("", "message", "7"),
+            ],
+            self.events,
+        )
+
+    def test_incremental(self):
+        """
+        Events are dispatched as soon as their terminating blank line has
+        been received.
+        """
+        self.parser.feed(b"data: 1\n\ndata: 2\n")
+        self.assertEqual([Event("1")], self.events)
+        self.parser.feed(b"\n")
+        self.assertEqual([Event("1"), Event("2")], self.events)
+
+    def test_no_data(self):
+        """
+        Events without data are not dispatched, but update the last event ID.
+        """
+        self.feed(b"event: x\nid: 3\n\n")
+        self.assertEqual([], self.events)
+        self.assertEqual("3", self.parser.lastEventId)
+
+    def test_id_committed_at_dispatch(self):
+        """
+        An ``id`` field only becomes the last event ID once its event ends.
+        """
+        self.feed(b"id: 3\n\nid: 4\n")
+        self.assertEqual("3", self.parser.lastEventId)
+
+    def test_retry(self):
+        """
+        ``retry`` fields with an integer value set the reconnection time.
+        """
+        self.feed(b"retry: 1500\nretry: x\nretry: 1.5\n\n")
+        self.assertEqual([1500], self.retries)
+
+    def test_max_size(self):
+        """
+        Buffering more than the maximum event size is an error.
+        """
+        parser = _EventParser(self.events.append, self.retries.append, maxSize=8)
+        parser.feed(b"data: 1234\n")
+        self.assertRaises(EventStreamError, parser.feed, b"data: 1234")
+
+
+class EventSourceTests(SynchronousTestCase):
+    def setUp(self):
+        agent, self.requests = agent_spy()
+        self.clock = Clock()
+        self.client = HTTPClient(agent)
+        self.events = []
+
+    def open(self, **kwargs):
+        source = EventSource(
+            self.client,
+            "http://example.com/stream",
+            self.events.append,
+            reactor=self.clock,
+            **kwargs
+        )
+        return source, source.start()
+
+    def respond(self, response=None):
+        response = response or FakeResponse()
+        self.requests[-1].deferred.callback(response)
+        return response
+
+    def test_request(self):
+        """
+        The stream is requested with headers that ask for an event stream.
+        """
+        self.open(headers=Headers({b"X-Foo": [b"bar"]}))
+        [request] = self.requests
+        self.assertEqual(b"GET", request.method)
+        self.assertEqual(b"http://example.com/stream", request.uri)
+        self.assertEqual(
+            [b"text/event-stream"], request.headers.getRawHeaders(b"Accept")
+        )
+        self.assertEqual([b"bar"], request.headers.getRawHeaders(b"X-Foo"))
+        self.assertIsNone(request.headers.getRawHeaders(b"Last-Event-ID"))
+
+    def test_events(self):
+        """
+        Events are passed to the handler as they are received.
+        """
+        source, _ = self.open()
+        response = self.respond()
+        response.protocol.dataReceived(b"id: 1\ndata: hello\n\ndata: w")
+        self.assertEqual([Event("hello", id="1")], self.events)
+        self.assertEqual("1", source.last_event_id)
+
+    def test_handler_exception(self):
+        """
+        Exceptions raised by the handler are logged, and the stream
+        continues.
+        """
+        events = []
+
+        def handler(event):
+            events.append(event)
+            raise ZeroDivisionError()
+
+        source = EventSource(
+            self.client, "http://example.com/", handler, reactor=self.clock
+        )
+        source.start()
+        response = self.respond()
+        response.protocol.dataReceived(b"data: 1\n\ndata: 2\n\n")
+        self.assertEqual(2, len(events))
+        self.assertEqual(2, len(self.flushLoggedErrors(ZeroDivisionError)))
+
+    def test_reconnect(self):
+        """
+        When the stream ends the source reconnects after the retry interval
+        set by the server, resuming from the last event ID.
+        """
+        source, _ = self.open()
+        response = self.respond()
+        response.protocol.dataReceived(b"retry: 500\nid: 9\ndata: x\n\nid: 10\n\n")
+        response.protocol.connectionLost(Failure(ResponseDone()))
+
+        self.assertEqual(1, len(self.requests))
+        self.clock.advance(0.5)
+        self.assertEqual(2, len(self.requests))
+        self.assertEqual(
+            [b"10"], self.requests[-1].headers.getRawHeaders(b"Last-Event-ID")
+        )
+
+    def test_reconnect_after_error(self):
+        """
+        Connection failures are logged and followed by a reconnection.
+        """
+        self.open(retry=1.0)
+        self.requests[-1].deferred.errback(ResponseFailed([]))
+        self.assertEqual(1, len(self.flushLoggedErrors(ResponseFailed)))
+
+        self.clock.advance(1.0)
+        self.assertEqual(2, len(self.requests))
+
+    def test_oversized_event(self):
+        """
+        An event larger than the limit aborts the connection, which is
+        retried.
+        """
+        self.open(max_event_size=4)
+        response = self.respond()
+        response.protocol.dataReceived(b"data: 12345")
+        response.transport.stopProducing.assert_called_once_with()
+        self.assertEqual(1, len(self.flushLoggedErrors(EventStreamError)))
+
+        self.clock.advance(3.0)
+        self.assertEqual(2, len(self.requests))
+
+    def test_refused(self):
+        """
+        A response which isn't an event stream stops the source for good.
+        """
+        for response in [FakeResponse(204), FakeResponse(200, b"text/plain")]:
+            del self.requests[:]
+            _, done = self.open()
+            self.respond(response)
+            self.failureResultOf(done, EventStreamError)
+            self.clock.advance(60)
+            self.assertEqual(1, len(self.requests))
+
+    def test_close_connected(self):
+        """
+        Closing the source disconnects the stream without reconnecting.
+        """
+        source, done = self.open()
+        response = self.respond()
+        source.close()
+        response.transport.stopProducing.assert_called_once_with()
+        response.protocol.dataReceived(b"data: late\n\n")
+        response.protocol.connectionLost(Failure(ResponseFailed([])))
+
+        self.assertIsNone(self.successResultOf(done))
+        self.assertEqual([], self.events)
+        self.assertEqual([], self.clock.getDelayedCalls())
+        self.assertEqual([], self.flushLoggedErrors())
+
+    def test_close_connecting(self):
+        """
+        Closing the source while connecting cancels the request.
+        """
+        source, done = self.open()
+        source.close()
+        self.assertTrue(self.requests[0].deferred.called)
+        self.assertIsNone(self.successResultOf(done))
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def test_close_waiting(self):
+        """
+        Closing the source while waiting to reconnect cancels the
+        reconnection.
+        """
+        source, done = self.open()
+        self.respond().protocol.connectionLost(Failure(ResponseDone()))
+        source.close()
+        self.assertEqual([], self.clock.getDelayedCalls())
+        self.assertIsNone(self.successResultOf(done))